@@ -0,0 +1,64 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.synthetic_data import synthetic_csv_lines
+from llm_agents.crunchbase_index import CrunchbaseIndex, read_csv_batches
+from llm_agents.embedding_service import EmbeddingService, FakeEmbedder
+from llm_agents.hybrid_retrieval import HybridRetriever
+from llm_agents.tracing import percentile
+
+
+def csv_lines(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from f
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and recall of dense vs hybrid retrieval over Crunchbase rows.")
+    parser.add_argument("--csv", help="Local Crunchbase CSV; synthetic rows are generated when omitted")
+    parser.add_argument("--rows", type=int, default=20000, help="Synthetic row count")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        service = EmbeddingService(FakeEmbedder(dim=256), cache_dir=os.path.join(workdir, "embeddings"))
+        index = CrunchbaseIndex(os.path.join(workdir, "index"), service)
+        if args.csv:
+            batches = read_csv_batches(csv_lines(args.csv))
+        else:
+            batches = read_csv_batches(synthetic_csv_lines(args.rows))
+        start = time.perf_counter()
+        index.update(batches)
+        print(f"Indexed {len(index)} rows in {time.perf_counter() - start:.1f}s")
+
+        # Exact company-name lookups: the query should return that company's row
+        rng = random.Random(1)
+        targets = rng.sample(range(len(index)), min(args.queries, len(index)))
+        documents = [index.document(row) for row in targets]
+        queries = [document["metadata"]["name"] for document in documents]
+        vectors = service.embed(queries)
+
+        modes = {
+            "dense": lambda q, v, d: index.search(v, args.top_k),
+            "hybrid": lambda q, v, d: HybridRetriever(index, args.top_k).search_rows(q, v),
+            "hybrid+category": lambda q, v, d: HybridRetriever(
+                index, args.top_k, category=d["metadata"]["category"]).search_rows(q, v),
+        }
+        print(f"{'mode':<16} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, search in modes.items():
+            latencies, hits = [], 0
+            for row, query, vector, document in zip(targets, queries, vectors, documents):
+                start = time.perf_counter()
+                results = search(query, vector, document)
+                latencies.append((time.perf_counter() - start) * 1000)
+                hits += any(result_row == row for result_row, _ in results)
+            print(f"{name:<16} {hits / len(targets):>9.3f} {percentile(latencies, 0.5):>8.2f} "
+                  f"{percentile(latencies, 0.99):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
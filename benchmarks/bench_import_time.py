@@ -0,0 +1,73 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from llm_agents.tracing import percentile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = (
+    "chunking", "company_lookup", "crunchbase_index", "embedding_service", "hybrid_retrieval", "job_queue",
+    "langchain_comprehension", "llm_cache", "map_reduce", "multi_crew_agents", "ner_bulk", "ner_server",
+    "pdf_extraction", "rag_sample", "search_cache", "spacy_models", "spacy_token_generation",
+    "summary_planner", "tracing", "vector_neighbors",
+)
+
+
+def parse_importtime(stderr):
+    # "import time: self [us] | cumulative | imported package" lines -> [(name, self us, cumulative us)]
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        imports.append((name.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def profile_import(module, env):
+    # Imports the module in a fresh interpreter, as a cold worker would; returns (seconds, imports, error)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], env=env, cwd=REPO_DIR,
+                            capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    error = None
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"exit {result.returncode}"
+    return seconds, parse_importtime(result.stderr), error
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold import time of each llm_agents module, with -X importtime.")
+    parser.add_argument("--modules", nargs="+", choices=MODULES, default=list(MODULES))
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per module; the median is shown")
+    parser.add_argument("--top", type=int, default=5, help="Heaviest imports listed per module")
+    args = parser.parse_args()
+
+    # No API key, so modules that still need one at import time show up as errors
+    env = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}
+    baseline, startup_imports, _ = profile_import("os", env)
+    # Modules the interpreter loads before any of ours (site, .pth hooks) are not charged to them
+    startup = {module for module, _, _ in startup_imports}
+    print(f"Bare interpreter start: {baseline:.3f}s")
+
+    print(f"\n{'module':<24} {'wall s':>8} {'import s':>9} {'modules':>8}  heaviest imports (cumulative ms)")
+    for name in args.modules:
+        runs = [profile_import(f"llm_agents.{name}", env) for _ in range(args.repeat)]
+        _, imports, error = runs[-1]
+        wall = percentile([run[0] for run in runs], 0.5)
+        if error:
+            print(f"{name:<24} {wall:>8.3f} {'-':>9} {'-':>8}  failed: {error}")
+            continue
+        target = next((cumulative for module, _, cumulative in imports if module == f"llm_agents.{name}"), 0)
+        # Third-party and stdlib top-level packages only, so numpy and its submodules count once
+        top_level = [(module, cumulative) for module, _, cumulative in imports
+                     if "." not in module and module != "llm_agents" and module not in startup]
+        heaviest = sorted(top_level, key=lambda item: item[1], reverse=True)[:args.top]
+        print(f"{name:<24} {wall:>8.3f} {target / 1e6:>9.3f} {len(imports):>8}  "
+              + ", ".join(f"{module} {cumulative / 1000:.0f}" for module, cumulative in heaviest))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import argparse
+import time
+
+from llm_agents.ner_bulk import extract_entities_bulk
+from llm_agents.spacy_test_chatbot import get_named_entities, load_spacy_model
+
+SENTENCES = [
+    "Apple is looking at buying a U.K. startup for $1 billion.",
+    "Sequoia Capital led a $40 million Series B in Stripe on March 3, 2014.",
+    "The patient was admitted to Massachusetts General Hospital in Boston last Tuesday.",
+    "Angela Merkel met Emmanuel Macron in Paris to discuss the European Union budget.",
+    "Microsoft reported revenue of $56 billion for the third quarter of 2023.",
+]
+
+
+def sample_texts(count):
+    return [f"{SENTENCES[i % len(SENTENCES)]} Filing {i}." for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Docs/sec of per-call NER vs bulk nlp.pipe NER.")
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[64, 256, 1024])
+    parser.add_argument("--n-process", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    nlp = load_spacy_model()
+    texts = sample_texts(args.docs)
+
+    # The per-call path runs the whole pipeline, so it is timed on a slice to keep the run short
+    per_call = texts[: max(1, args.docs // 10)]
+    start = time.perf_counter()
+    for text in per_call:
+        get_named_entities(text, nlp, "")
+    elapsed = time.perf_counter() - start
+    print(f"{'mode':<28} {'docs/sec':>10}")
+    print(f"{'per-call nlp(text)':<28} {len(per_call) / elapsed:>10.0f}")
+
+    for n_process in args.n_process:
+        for batch_size in args.batch_sizes:
+            records = ((str(i), text) for i, text in enumerate(texts))
+            start = time.perf_counter()
+            count = sum(1 for _ in extract_entities_bulk(records, nlp, batch_size, n_process))
+            elapsed = time.perf_counter() - start
+            print(f"{f'pipe batch={batch_size} n_process={n_process}':<28} {count / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import asyncio
+import contextlib
+import functools
+import io
+import os
+import tempfile
+import time
+
+from benchmarks.stub_llm import StubChatModel
+from llm_agents import langchain_comprehension, map_reduce
+from llm_agents.pdf_extraction import extract_pdf_text_async
+
+SAMPLE_PDF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lookup_data", "Ch9Leleux.pdf")
+
+# Budgets far above anything a run can spend, so the timings show document overlap, not the token bucket
+UNLIMITED = 1e12
+
+
+def run_batch(document_count, latency, max_concurrency):
+    stub = StubChatModel(latency=latency)
+    langchain_comprehension.get_llm = lambda: stub
+    map_reduce.default_limiter = map_reduce.RateLimiter(UNLIMITED, UNLIMITED)
+    urls = [SAMPLE_PDF] * document_count
+
+    # Every batch parses from a cold page cache of its own instead of reusing .cache/pdf_pages
+    with tempfile.TemporaryDirectory() as cache_dir:
+        langchain_comprehension.extract_pdf_text_async = functools.partial(extract_pdf_text_async,
+                                                                           cache_dir=cache_dir)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(langchain_comprehension.main(urls=urls, max_concurrency=max_concurrency))
+        elapsed = time.perf_counter() - start
+    return elapsed, stub.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the PDF summarization pipeline against a stub LLM.")
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per stub LLM call")
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{'docs':>5} {'seconds':>9} {'sec/doc':>9} {'llm calls':>10} {'vs linear':>10}")
+    baseline = None
+    for count in args.counts:
+        elapsed, calls = run_batch(count, args.latency, args.max_concurrency)
+        if baseline is None:
+            baseline = elapsed / count
+        # Below 1.0 means documents overlapped instead of running back to back
+        scaling = elapsed / (baseline * count)
+        print(f"{count:>5} {elapsed:>9.2f} {elapsed / count:>9.2f} {calls:>10} {scaling:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
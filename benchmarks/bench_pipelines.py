@@ -0,0 +1,215 @@
+import argparse
+import csv
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.fake_openai import BackgroundServer, FakeOpenAI, create_file_app
+from benchmarks.synthetic_data import synthetic_csv_lines
+from llm_agents.tracing import percentile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_PDF = os.path.join(REPO_DIR, "lookup_data", "Ch9Leleux.pdf")
+DEFAULT_BASELINE = os.path.join(REPO_DIR, "benchmarks", "baselines", "pipelines.json")
+PIPELINES = ("pdf", "rag", "company", "crew")
+
+
+def write_fixtures(directory, args):
+    # Files served by the local file server in place of the PDF hosts and the Crunchbase gist
+    shutil.copy(SAMPLE_PDF, os.path.join(directory, "sample.pdf"))
+    with open(os.path.join(directory, "crunchbase.csv"), "w", newline="", encoding="utf-8") as f:
+        f.writelines(synthetic_csv_lines(args.rows))
+    with open(os.path.join(directory, "companies.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "url"])
+        writer.writerows([f"Company {i}", f"company{i}.example.com"] for i in range(args.companies))
+    with open(os.path.join(directory, "startups.txt"), "w", encoding="utf-8") as f:
+        f.writelines(f"Startup {i}\n" for i in range(args.startups))
+
+
+def pipeline_command(name, files_url, fixtures_dir, run_dir, args):
+    # (module arguments, extra environment, items processed per run)
+    if name == "pdf":
+        urls = [f"{files_url}/sample.pdf?copy={i}" for i in range(args.documents)]
+        return ["llm_agents.langchain_comprehension", *urls], {}, args.documents
+    if name == "rag":
+        return ["llm_agents.rag_sample"], {"CRUNCHBASE_CSV": f"{files_url}/crunchbase.csv"}, args.rows
+    if name == "company":
+        return (["llm_agents.company_lookup", "--batch", os.path.join(fixtures_dir, "companies.csv"),
+                 "--output", os.path.join(run_dir, "company_lookups.jsonl")], {}, args.companies)
+    if name == "crew":
+        return (["llm_agents.multi_crew_agents", "--parallel", "--batch", os.path.join(fixtures_dir, "startups.txt"),
+                 "--output", os.path.join(run_dir, "startup_analyses.jsonl")], {}, args.startups)
+    raise ValueError(f"Unknown pipeline {name!r}")
+
+
+def run_process(command, env, log_path, timeout):
+    # Runs one pipeline process; returns (seconds, peak RSS in MB, exit code)
+    start = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        process = subprocess.Popen([sys.executable, "-m", *command], env=env, cwd=REPO_DIR,
+                                   stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL)
+        timer = threading.Timer(timeout, process.kill)
+        timer.start()
+        try:
+            # wait4 gives the resource usage of this child alone, unlike getrusage(RUSAGE_CHILDREN)
+            _, status, usage = os.wait4(process.pid, 0)
+        finally:
+            timer.cancel()
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return time.perf_counter() - start, peak_rss_mb, process.returncode
+
+
+def count_item_errors(run_dir):
+    # Batch pipelines keep going when one item fails and record it in their JSONL output instead:
+    # company_lookup under "errors", multi_crew_agents under "error"
+    errors = 0
+    for filename in os.listdir(run_dir):
+        if not filename.endswith(".jsonl"):
+            continue
+        with open(os.path.join(run_dir, filename), encoding="utf-8") as f:
+            errors += sum(1 for line in f if line.strip() and ({"error", "errors"} & json.loads(line).keys()))
+    return errors
+
+
+def run_failure(name, run, repeat, args):
+    # Why a run does not count as a success, or None; a clean exit alone is not enough
+    if run["returncode"] != 0:
+        return f"exited with {run['returncode']}"
+    if run["item_errors"]:
+        return f"had {run['item_errors']} failed items"
+    # Later runs may be served entirely from a warm cache; otherwise no LLM calls means nothing ran
+    if run["llm_calls"] == 0 and not (args.warm_cache and repeat > 0):
+        return "made no LLM calls"
+    return None
+
+
+def benchmark_pipeline(name, fake, api_url, files_url, fixtures_dir, workdir, args):
+    runs = []
+    for repeat in range(args.repeat):
+        run_dir = os.path.join(workdir, f"{name}-{repeat}")
+        os.makedirs(run_dir)
+        command, extra_env, items = pipeline_command(name, files_url, fixtures_dir, run_dir, args)
+        # Caches live in the run directory, so every run starts cold unless --warm-cache shares them
+        cache_dir = os.path.join(workdir, "shared-cache") if args.warm_cache else os.path.join(run_dir, "cache")
+        env = dict(
+            os.environ,
+            OPENAI_API_KEY="fake",
+            OPENAI_BASE_URL=api_url,
+            OPENAI_API_BASE=api_url,
+            LLM_CACHE="1" if args.warm_cache else "0",
+            LLM_CACHE_PATH=os.path.join(cache_dir, "llm_responses.sqlite3"),
+            PDF_PAGE_CACHE_DIR=os.path.join(cache_dir, "pdf_pages"),
+            EMBEDDING_CACHE_DIR=os.path.join(cache_dir, "embeddings"),
+            CRUNCHBASE_INDEX_DIR=os.path.join(cache_dir, "crunchbase_index"),
+            OTEL_SDK_DISABLED="true",
+            **extra_env,
+        )
+        os.makedirs(cache_dir, exist_ok=True)
+        before = fake.snapshot()
+        seconds, peak_rss_mb, returncode = run_process(command, env, os.path.join(run_dir, "output.log"),
+                                                       args.timeout)
+        after = fake.snapshot()
+        llm_calls = sum(after["calls"].values()) - sum(before["calls"].values())
+        tokens = (after["prompt_tokens"] + after["completion_tokens"]
+                  - before["prompt_tokens"] - before["completion_tokens"])
+        run = {"seconds": seconds, "peak_rss_mb": peak_rss_mb, "returncode": returncode, "llm_calls": llm_calls,
+               "tokens": tokens, "items": items, "item_errors": count_item_errors(run_dir)}
+        run["failure"] = run_failure(name, run, repeat, args)
+        runs.append(run)
+        if run["failure"]:
+            print(f"{name} run {repeat} {run['failure']}; see {os.path.join(run_dir, 'output.log')}")
+
+    seconds = [run["seconds"] for run in runs]
+    return {
+        "runs": len(runs),
+        "failures": sum(run["failure"] is not None for run in runs),
+        "item_errors": sum(run["item_errors"] for run in runs),
+        "p50_seconds": percentile(seconds, 0.5),
+        "p95_seconds": percentile(seconds, 0.95),
+        "items_per_second": sum(run["items"] for run in runs) / sum(seconds),
+        "peak_rss_mb": max(run["peak_rss_mb"] for run in runs),
+        "llm_calls_per_run": sum(run["llm_calls"] for run in runs) / len(runs),
+        "tokens_per_run": sum(run["tokens"] for run in runs) / len(runs),
+    }
+
+
+def print_results(results, baseline=None):
+    print(f"\n{'pipeline':<9} {'runs':>5} {'fail':>5} {'p50 s':>8} {'p95 s':>8} {'items/s':>9} {'RSS MB':>8} "
+          f"{'LLM calls':>10} {'tokens':>9}")
+    for name, result in results.items():
+        print(f"{name:<9} {result['runs']:>5} {result['failures']:>5} {result['p50_seconds']:>8.2f} "
+              f"{result['p95_seconds']:>8.2f} {result['items_per_second']:>9.2f} {result['peak_rss_mb']:>8.0f} "
+              f"{result['llm_calls_per_run']:>10.1f} {result['tokens_per_run']:>9.0f}")
+
+    if not baseline:
+        return
+    print("\nChange vs baseline (negative is better for time, RSS and calls):")
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        changes = []
+        for key in ("p50_seconds", "items_per_second", "peak_rss_mb", "llm_calls_per_run"):
+            if previous[key]:
+                changes.append(f"{key} {100 * (result[key] - previous[key]) / previous[key]:+.1f}%")
+        print(f"{name:<9} " + ", ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the pipelines end to end against a local fake LLM and file server.")
+    parser.add_argument("--pipelines", nargs="+", choices=PIPELINES, default=list(PIPELINES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds before a run is killed")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake LLM seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Fake LLM generation speed")
+    parser.add_argument("--reply-tokens", type=int, default=64)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--documents", type=int, default=4, help="PDFs per langchain_comprehension run")
+    parser.add_argument("--rows", type=int, default=2000, help="Crunchbase rows per rag_sample run")
+    parser.add_argument("--companies", type=int, default=10, help="Companies per company_lookup batch")
+    parser.add_argument("--startups", type=int, default=2, help="Startups per multi_crew_agents batch")
+    parser.add_argument("--warm-cache", action="store_true", help="Share the response and data caches across runs")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="JSON baseline to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Write these results to --baseline")
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(args.latency, args.tokens_per_second, args.reply_tokens, args.embedding_latency)
+    with tempfile.TemporaryDirectory() as workdir:
+        fixtures_dir = os.path.join(workdir, "files")
+        os.makedirs(fixtures_dir)
+        write_fixtures(fixtures_dir, args)
+        with BackgroundServer(fake.create_app()) as api, BackgroundServer(create_file_app(fixtures_dir)) as files:
+            results = {}
+            for name in args.pipelines:
+                print(f"Running {name} x{args.repeat}...")
+                results[name] = benchmark_pipeline(name, fake, f"{api.url}/v1", files.url, fixtures_dir, workdir, args)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        config = {key: value for key, value in vars(args).items() if key not in ("baseline", "save_baseline")}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "config": config, "results": results}, f,
+                      indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+
+    failed = [name for name, result in results.items() if result["failures"]]
+    if failed:
+        sys.exit(f"\nFailed runs in: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
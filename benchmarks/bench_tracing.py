@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from llm_agents import tracing
+
+
+def plain():
+    return 1
+
+
+@tracing.traced("bench")
+def decorated():
+    return 1
+
+
+def with_span():
+    with tracing.span("bench") as s:
+        s.set(tokens_in=1)
+        return 1
+
+
+async def async_call():
+    return 1
+
+
+@tracing.traced("bench")
+async def async_decorated():
+    return 1
+
+
+def per_call_ns(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def async_per_call_ns(func, iterations):
+    async def run():
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await func()
+        return (time.perf_counter() - start) / iterations * 1e9
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-call cost of tracing spans, disabled and enabled.")
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+
+    cases = [
+        ("plain function", lambda n: per_call_ns(plain, n)),
+        ("@traced", lambda n: per_call_ns(decorated, n)),
+        ("with span()", lambda n: per_call_ns(with_span, n)),
+        ("plain coroutine", lambda n: async_per_call_ns(async_call, n)),
+        ("@traced coroutine", lambda n: async_per_call_ns(async_decorated, n)),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "trace.jsonl")
+        print(f"{'case':<20} {'disabled ns':>12} {'enabled ns':>12}")
+        for name, run in cases:
+            tracing.enable("")
+            disabled = run(args.iterations)
+            # Enabled spans write a line each, so fewer iterations keep the trace file small
+            tracing.enable(path)
+            enabled = run(max(1, args.iterations // 20))
+            print(f"{name:<20} {disabled:>12.0f} {enabled:>12.0f}")
+        tracing.enable("")
+
+
+if __name__ == "__main__":
+    main()
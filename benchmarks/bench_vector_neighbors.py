@@ -0,0 +1,51 @@
+import argparse
+import time
+
+import numpy as np
+
+from llm_agents.spacy_models import get_model
+from llm_agents.vector_neighbors import get_index
+
+
+def per_query_search(index, queries, top_k):
+    # One matrix-vector product and full sort per query, as a naive loop would do
+    for query in queries:
+        scores = index.matrix @ (query / (np.linalg.norm(query) or 1))
+        np.argsort(-scores)[:top_k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queries/sec of nearest-neighbour search over spaCy vocab vectors.")
+    parser.add_argument("--models", nargs="+", default=["en_core_web_sm", "en_core_web_md", "en_core_web_lg"])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 64, 256])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'model':<18} {'mode':<20} {'queries/sec':>12}")
+    for model_name in args.models:
+        nlp = get_model(model_name)
+        if nlp.vocab.vectors.size == 0:
+            print(f"{model_name:<18} skipped: no static vectors")
+            continue
+
+        start = time.perf_counter()
+        index = get_index(nlp)
+        print(f"{model_name:<18} {'index ready':<20} {time.perf_counter() - start:>11.2f}s ({len(index)} rows)")
+        queries = np.asarray(index.matrix[rng.integers(0, len(index), args.queries)])
+
+        # The naive loop is timed on a slice to keep the run short
+        naive = queries[: max(1, args.queries // 10)]
+        start = time.perf_counter()
+        per_query_search(index, naive, args.top_k)
+        print(f"{model_name:<18} {'per-query argsort':<20} {len(naive) / (time.perf_counter() - start):>12.0f}")
+
+        for batch_size in args.batch_sizes:
+            start = time.perf_counter()
+            index.search(queries, args.top_k, batch_size=batch_size)
+            print(f"{model_name:<18} {f'batch={batch_size}':<20} {len(queries) / (time.perf_counter() - start):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import base64
+import json
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from aiohttp import web
+
+from llm_agents.embedding_service import FakeEmbedder
+
+# crewAI agents parse ReAct output, so prompts asking for a "Final Answer:" get one
+REACT_REPLY = "Thought: I now know the final answer\nFinal Answer: {text}"
+REPLY_WORDS = ("The company focuses on software for venture investors and reports steady growth across "
+               "its core markets while competition from larger incumbents increases").split()
+
+
+def reply_text(tokens):
+    return " ".join(REPLY_WORDS[i % len(REPLY_WORDS)] for i in range(tokens))
+
+
+def rough_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class FakeOpenAI:
+    # OpenAI-compatible endpoints with configurable latency: chat completions (plain and streamed),
+    # legacy completions and embeddings. Call counts and token totals are kept for the harness.
+    def __init__(self, latency=0.2, tokens_per_second=50.0, reply_tokens=64, embedding_latency=0.05,
+                 embedding_dim=1536):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.embedding_latency = embedding_latency
+        self.embedder = FakeEmbedder(dim=embedding_dim)
+        self.calls = Counter()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def snapshot(self):
+        return {"calls": dict(self.calls), "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens}
+
+    def _reply(self, prompt):
+        self.prompt_tokens += rough_tokens(prompt)
+        self.completion_tokens += self.reply_tokens
+        text = reply_text(self.reply_tokens)
+        return REACT_REPLY.format(text=text) if "Final Answer:" in prompt else text
+
+    def _usage(self, prompt, text):
+        prompt_tokens = rough_tokens(prompt)
+        completion_tokens = rough_tokens(text)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    async def _generation_delay(self):
+        await asyncio.sleep(self.latency + self.reply_tokens / self.tokens_per_second)
+
+    async def chat_completions(self, request):
+        body = await request.json()
+        prompt = "\n".join(str(message.get("content") or "") for message in body.get("messages", []))
+        text = self._reply(prompt)
+        model = body.get("model", "gpt-4o")
+        created = int(time.time())
+        if not body.get("stream"):
+            self.calls["chat"] += 1
+            await self._generation_delay()
+            return web.json_response({
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop", "logprobs": None}],
+                "usage": self._usage(prompt, text),
+            })
+
+        self.calls["chat_stream"] += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await asyncio.sleep(self.latency)
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            delta = {"role": "assistant", "content": word if i == 0 else " " + word}
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(1 / self.tokens_per_second)
+        final = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        await response.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+        await response.write_eof()
+        return response
+
+    async def completions(self, request):
+        body = await request.json()
+        prompt = body.get("prompt", "")
+        prompt = "\n".join(prompt) if isinstance(prompt, list) else str(prompt)
+        self.calls["completions"] += 1
+        text = self._reply(prompt)
+        await self._generation_delay()
+        return web.json_response({
+            "id": "cmpl-fake", "object": "text_completion", "created": int(time.time()),
+            "model": body.get("model", "gpt-3.5-turbo-instruct"),
+            "choices": [{"index": 0, "text": text, "finish_reason": "stop", "logprobs": None}],
+            "usage": self._usage(prompt, text),
+        })
+
+    async def embeddings(self, request):
+        body = await request.json()
+        inputs = body.get("input", [])
+        # A single string, a list of strings, or token id lists (as LangChain sends)
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        self.calls["embeddings"] += 1
+        self.prompt_tokens += sum(rough_tokens(str(item)) for item in inputs)
+        await asyncio.sleep(self.embedding_latency)
+        data = []
+        for i, item in enumerate(inputs):
+            vector = self.embedder.embed_text(item if isinstance(item, str) else " ".join(map(str, item)))
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+            else:
+                embedding = vector.astype(np.float64).tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        tokens = sum(rough_tokens(str(item)) for item in inputs)
+        return web.json_response({"object": "list", "data": data, "model": body.get("model"),
+                                  "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    async def stats(self, request):
+        return web.json_response(self.snapshot())
+
+    def create_app(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_post("/v1/completions", self.completions)
+        app.router.add_post("/v1/embeddings", self.embeddings)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+
+def create_file_app(directory):
+    # Static files (PDFs, CSVs) served with ETags, standing in for the remote hosts
+    app = web.Application()
+    app.router.add_static("/", directory)
+    return app
+
+
+class BackgroundServer:
+    # Runs an aiohttp app on its own event loop in a daemon thread; port 0 picks a free port
+    def __init__(self, app, host="127.0.0.1", port=0):
+        self.app = app
+        self.host = host
+        self.port = port
+        self._loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+        self._runner = None
+
+    def __enter__(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        self._started.wait()
+        return self
+
+    def __exit__(self, *exc_info):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(self.app)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, self.host, self.port)
+        self._loop.run_until_complete(site.start())
+        self.port = self._runner.addresses[0][1]
+        self._started.set()
+        self._loop.run_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI-compatible server for local benchmarks.")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--reply-tokens", type=int, default=64)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(args.latency, args.tokens_per_second, args.reply_tokens, args.embedding_latency)
+    print(f"Set OPENAI_BASE_URL=http://127.0.0.1:{args.port}/v1 (and OPENAI_API_BASE) to use it")
+    web.run_app(fake.create_app(), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import asyncio
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class StubChatModel(BaseChatModel):
+    # Local stand-in for ChatOpenAI: sleeps for a fixed latency and returns a canned reply
+    latency: float = 0.2
+    reply: str = "This is a stub summary."
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "stub-chat"
+
+    def get_num_tokens(self, text):
+        # Rough 4-characters-per-token estimate, so the map_reduce collapse step needs no tokenizer
+        return len(text) // 4
+
+    def _result(self):
+        self.calls += 1
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.reply))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return self._result()
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._result()
@@ -0,0 +1,34 @@
+import csv
+import io
+import random
+
+CATEGORIES = ["web", "software", "mobile", "enterprise", "ecommerce", "games_video", "advertising", "biotech"]
+WORDS = ("platform data cloud social network mobile app analytics marketing video search payments health "
+         "security commerce learning music travel games media open source startup service tools").split()
+
+
+def synthetic_rows(count, seed=0):
+    rng = random.Random(seed)
+    for i in range(count):
+        name = "".join(rng.choice("bcdfghklmnprstvz") + rng.choice("aeiou") for _ in range(3)) + str(i)
+        yield {
+            "permalink": f"company-{i}",
+            "name": name.capitalize(),
+            "category": rng.choice(CATEGORIES),
+            "description": " ".join(rng.choice(WORDS) for _ in range(12)),
+        }
+
+
+def synthetic_csv_lines(count, seed=0):
+    # The rows as Crunchbase-style CSV lines, with their line endings
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=["permalink", "name", "category", "description"])
+    writer.writeheader()
+    for row in synthetic_rows(count, seed):
+        writer.writerow(row)
+        buffer.seek(0)
+        yield from buffer.readlines()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
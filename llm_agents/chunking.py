@@ -0,0 +1,114 @@
+import os
+from functools import lru_cache
+
+# Encoding used when no model is given, or the model is unknown to tiktoken
+DEFAULT_ENCODING = "o200k_base"
+
+# Context windows (prompt + completion tokens) of the models used in this repo
+CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4": 8192,
+    "gpt-4-turbo": 128000,
+    "gpt-3.5-turbo": 16385,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Map-step chunk size and the overlap carried between neighbouring chunks, in tokens
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "1000"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "100"))
+
+# Documents up to this many tokens are summarized in one "stuff" call, if the context allows it
+STUFF_MAX_TOKENS = int(os.getenv("STUFF_MAX_TOKENS", "12000"))
+
+# Tokens kept free for the prompt template and the completion
+PROMPT_RESERVE_TOKENS = 256
+OUTPUT_RESERVE_TOKENS = 1024
+
+# A chunk may end this fraction of its budget early to finish on a line or sentence
+BOUNDARY_LOOKBACK = 0.1
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model=None):
+    # One encoder per model for the whole process; tiktoken is imported on first use
+    import tiktoken
+
+    if model:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            pass
+    return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+
+def count_tokens(text, model=None):
+    return len(get_encoding(model).encode(text, disallowed_special=()))
+
+
+def context_window(model):
+    return CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+
+def chunk_budget(model, chunk_tokens=CHUNK_TOKENS):
+    # Largest chunk that fits in one call next to the prompt and the reserved completion
+    return max(1, min(chunk_tokens, context_window(model) - PROMPT_RESERVE_TOKENS - OUTPUT_RESERVE_TOKENS))
+
+
+def _is_boundary(encoding, token):
+    piece = encoding.decode_single_token_bytes(token)
+    return piece.endswith((b"\n", b".", b"?", b"!"))
+
+
+def chunk_offsets(encoding, tokens, chunk_tokens, overlap_tokens):
+    # (start, end) token offsets of each chunk. Chunks are packed up to chunk_tokens, end early on a
+    # line or sentence break when one is close, and repeat the last overlap_tokens of the previous chunk.
+    overlap_tokens = min(overlap_tokens, chunk_tokens // 2)
+    lookback = int(chunk_tokens * BOUNDARY_LOOKBACK)
+    offsets = []
+    start = 0
+    while start < len(tokens):
+        end = min(start + chunk_tokens, len(tokens))
+        if end < len(tokens):
+            for candidate in range(end, max(end - lookback, start + overlap_tokens + 1), -1):
+                if _is_boundary(encoding, tokens[candidate - 1]):
+                    end = candidate
+                    break
+        offsets.append((start, end))
+        if end == len(tokens):
+            break
+        start = end - overlap_tokens
+    return offsets
+
+
+def _split(text, model, chunk_tokens, overlap_tokens):
+    # Tokenizes the text once and decodes each chunk from its token offsets
+    encoding = get_encoding(model)
+    tokens = encoding.encode(text, disallowed_special=())
+    offsets = chunk_offsets(encoding, tokens, chunk_budget(model, chunk_tokens), overlap_tokens)
+    return [encoding.decode(tokens[start:end]) for start, end in offsets], offsets, len(tokens)
+
+
+def split_text(text, chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS, model=None):
+    return _split(text, model, chunk_tokens, overlap_tokens)[0]
+
+
+class ChunkPlan:
+    def __init__(self, method, chunks, chunk_tokens, total_tokens):
+        self.method = method  # "stuff" or "map_reduce"
+        self.chunks = chunks
+        self.chunk_tokens = chunk_tokens  # Token count of each chunk
+        self.total_tokens = total_tokens
+
+
+def stuff_limit(model, stuff_max_tokens=STUFF_MAX_TOKENS):
+    return min(stuff_max_tokens, context_window(model) - PROMPT_RESERVE_TOKENS - OUTPUT_RESERVE_TOKENS)
+
+
+def plan_chunks(text, model=None, chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                stuff_max_tokens=STUFF_MAX_TOKENS):
+    # "stuff" when the whole text fits in one call, otherwise "map_reduce" over token-sized chunks.
+    # The map_reduce chunks are always computed so callers can run both methods on a small document.
+    chunks, offsets, total_tokens = _split(text, model, chunk_tokens, overlap_tokens)
+    method = "stuff" if total_tokens <= stuff_limit(model, stuff_max_tokens) else "map_reduce"
+    return ChunkPlan(method, chunks, [end - start for start, end in offsets], total_tokens)
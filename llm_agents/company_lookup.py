@@ -1,64 +1,217 @@
+import argparse
+import asyncio
+import csv
+import json
 import os
-import openai
+import sys
+import time
+from functools import lru_cache
+
 from dotenv import load_dotenv
 
+from llm_agents.llm_cache import acreate_chat_completion, create_chat_completion
+from llm_agents.map_reduce import call_with_limits
+from llm_agents.tracing import span
+
 # Load environment variables
 script_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(script_dir)
 dotenv_path = os.path.join(parent_dir, '.env')
 load_dotenv(dotenv_path)
 
-# Set up OpenAI client
-openai_api_key = os.getenv('OPENAI_API_KEY')
-if not openai_api_key:
-    raise ValueError(f"No OpenAI API key found. Make sure it's set in your .env file at {dotenv_path}")
-client = openai.OpenAI(api_key=openai_api_key)
+MODEL = os.getenv("COMPANY_LOOKUP_MODEL", "gpt-4")
+
+# Client settings: seconds before a request times out, and retries on connection errors, 429s and 5xx.
+# Batch requests also go through call_with_limits, which backs off further on 429s that outlast these retries.
+REQUEST_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+
+# Sampling temperature; unset keeps the provider default. The response cache only stores temperature 0
+# answers unless LLM_CACHE_ZERO_TEMPERATURE_ONLY=0.
+TEMPERATURE = os.getenv("COMPANY_LOOKUP_TEMPERATURE")
+
+# Questions answered at once in batch mode
+MAX_CONCURRENT_QUESTIONS = int(os.getenv("COMPANY_LOOKUP_CONCURRENCY", "8"))
+
+SYSTEM_CONTENT = "You are a helpful assistant that provides concise and accurate information about companies."
+
+# Menu choice -> (batch result key, menu label, question template)
+QUESTIONS = {
+    "1": ("products", "Main product(s)/lines",
+          "What are the main product(s) or product lines of {name} (URL: {url})?"),
+    "2": ("industry", "Industry/sectors they operate in",
+          "In which industry/sectors does {name} (URL: {url}) operate?"),
+    "3": ("competition", "Current level(s) of competition",
+          "What is the current level of competition for {name} (URL: {url})?"),
+    "4": ("prospects", "Expected future prospects over the next 5 years",
+          "What are the expected future prospects over the next 5 years for {name} (URL: {url})?"),
+}
+
+
+def _api_key():
+    openai_api_key = os.getenv('OPENAI_API_KEY')
+    if not openai_api_key:
+        raise ValueError(f"No OpenAI API key found. Make sure it's set in your .env file at {dotenv_path}")
+    return openai_api_key
+
+
+# One client of each kind per process, created on first use, so the connection pool is reused across requests
+@lru_cache(maxsize=None)
+def get_client():
+    import openai
+
+    return openai.OpenAI(api_key=_api_key(), timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES)
+
+
+@lru_cache(maxsize=None)
+def get_async_client():
+    import openai
+
+    return openai.AsyncOpenAI(api_key=_api_key(), timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES)
+
+
+def _sampling():
+    return {"temperature": float(TEMPERATURE)} if TEMPERATURE else {}
+
+
+def _messages(message, system_content):
+    return [
+        {"role": "system", "content": system_content},
+        {"role": "user", "content": message},
+    ]
 
 
 def chat(message, system_content):
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": system_content},
-            {"role": "user", "content": message},
-        ]
+    response = create_chat_completion(
+        get_client(),
+        model=MODEL,
+        messages=_messages(message, system_content),
+        **_sampling(),
     )
     return response.choices[0].message.content
 
 
+def stream_chat(message, system_content, out=sys.stdout):
+    # Writes tokens to `out` as they arrive; returns (full text, time to first token, total seconds)
+    start = time.perf_counter()
+    first_token = None
+    parts = []
+    with span("llm", model=MODEL, stream=True) as s:
+        stream = get_client().chat.completions.create(model=MODEL, messages=_messages(message, system_content),
+                                                      stream=True, **_sampling())
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                parts.append(delta)
+                out.write(delta)
+                out.flush()
+        s.set(ttft=first_token)
+    out.write("\n")
+    return "".join(parts), first_token, time.perf_counter() - start
+
+
+async def achat(message, system_content=SYSTEM_CONTENT):
+    response = await acreate_chat_completion(
+        get_async_client(),
+        model=MODEL,
+        messages=_messages(message, system_content),
+        **_sampling(),
+    )
+    return response.choices[0].message.content
+
+
+def build_query(choice, company_name, company_url):
+    return QUESTIONS[choice][2].format(name=company_name, url=company_url)
+
+
+def read_companies(path):
+    # CSV with `name` and `url` columns; rows without a name are skipped
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            name = (row.get("name") or "").strip()
+            if name:
+                yield name, (row.get("url") or "").strip()
+
+
+async def lookup_batch(companies, output_path, max_concurrency=MAX_CONCURRENT_QUESTIONS):
+    # Answers every question for every company, at most max_concurrency requests at once. Each company
+    # is appended to output_path as one JSON line as soon as its four answers are in.
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def answer(query):
+        async with semaphore:
+            start = time.perf_counter()
+            text = await call_with_limits(achat, query)
+            return text, time.perf_counter() - start
+
+    async def lookup(name, url):
+        keys = [key for key, _, _ in QUESTIONS.values()]
+        with span("company", company=name):
+            results = await asyncio.gather(*(answer(build_query(choice, name, url)) for choice in QUESTIONS),
+                                           return_exceptions=True)
+        record = {"company": name, "url": url, "answers": {}, "seconds": {}}
+        for key, result in zip(keys, results):
+            if isinstance(result, Exception):
+                record.setdefault("errors", {})[key] = str(result)
+            else:
+                record["answers"][key], record["seconds"][key] = result
+        return record
+
+    start = time.perf_counter()
+    count = 0
+    with open(output_path, "a", encoding="utf-8") as output:
+        for finished in asyncio.as_completed([lookup(name, url) for name, url in companies]):
+            record = await finished
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            count += 1
+            print(f"Finished {record['company']}" + (" (with errors)" if "errors" in record else ""))
+    elapsed = time.perf_counter() - start
+    print(f"Looked up {count} companies in {elapsed:.1f}s")
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Ask about a company's products, industry, competition and prospects.")
+    parser.add_argument("--no-stream", action="store_true", help="Wait for the full answer instead of streaming it")
+    parser.add_argument("--batch", metavar="CSV", help="CSV with name and url columns; answers all four questions")
+    parser.add_argument("--output", default="company_lookups.jsonl", help="JSONL file for batch results")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_QUESTIONS,
+                        help="Maximum questions answered at once in batch mode")
+    args = parser.parse_args()
+    _api_key()  # Fail on a missing API key before asking anything
+
+    if args.batch:
+        asyncio.run(lookup_batch(list(read_companies(args.batch)), args.output, args.concurrency))
+        return
+
     # Begin script with identification of company
     company_name = input("What company do you want to learn about? ")
     company_url = input("What is their URL (to make sure we're talking about the same company)? ")
 
     # Ask the user what information they want to retrieve
     print("\nWhat would you like to know about the company?")
-    print("1. Main product(s)/lines")
-    print("2. Industry/sectors they operate in")
-    print("3. Current level(s) of competition")
-    print("4. Expected future prospects over the next 5 years")
+    for choice, (_, label, _) in QUESTIONS.items():
+        print(f"{choice}. {label}")
     choice = input("Enter your choice (1-4): ")
 
     # Assemble the query based on user's choices
-    if choice == '1':
-        query = f"What are the main product(s) or product lines of {company_name} (URL: {company_url})?"
-    elif choice == '2':
-        query = f"In which industry/sectors does {company_name} (URL: {company_url}) operate?"
-    elif choice == '3':
-        query = f"What is the current level of competition for {company_name} (URL: {company_url})?"
-    elif choice == '4':
-        query = f"What are the expected future prospects over the next 5 years for {company_name} (URL: {company_url})?"
-    else:
+    if choice not in QUESTIONS:
         print("Invalid choice. Exiting.")
         return
+    query = build_query(choice, company_name, company_url)
 
     # Get information from OpenAI
-    system_content = "You are a helpful assistant that provides concise and accurate information about companies."
-    response = chat(query, system_content)
-
-    # Print the response
     print("\nHere's the information you requested:")
-    print(response)
+    if args.no_stream:
+        print(chat(query, SYSTEM_CONTENT))
+        return
+    _, first_token, total = stream_chat(query, SYSTEM_CONTENT)
+    if first_token is not None:
+        print(f"\n(time to first token {first_token:.2f}s, total {total:.2f}s)")
 
 
 if __name__ == "__main__":
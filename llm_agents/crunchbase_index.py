@@ -0,0 +1,301 @@
+import csv
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+
+import numpy as np
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from llm_agents.embedding_service import EmbeddingService
+from llm_agents.hybrid_retrieval import HybridRetriever, InvertedIndex, build_inverted_index
+from llm_agents.tracing import traced
+
+# Persisted Crunchbase index: row-aligned vectors and documents plus a manifest of row hashes
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+INDEX_DIR = os.getenv("CRUNCHBASE_INDEX_DIR", os.path.join(parent_dir, ".cache", "crunchbase_index"))
+
+# CSV rows handed to the index builder at a time; peak memory follows this, not the export size
+INGEST_BATCH_SIZE = int(os.getenv("CRUNCHBASE_INGEST_BATCH_SIZE", "1000"))
+
+MANIFEST_FILE = "manifest.json"
+ROWS_FILE = "rows.sqlite3"
+VECTORS_FILE = "vectors.f32"
+DOCUMENTS_FILE = "documents.jsonl"
+OFFSETS_FILE = "offsets.i64"
+CATEGORIES_FILE = "categories.i32"
+BM25_DIR = "bm25"
+# Version 2 added the category codes and BM25 postings; older indexes get them rebuilt on load
+FORMAT_VERSION = 2
+
+
+def row_document(row):
+    # (doc id, text, metadata) for one CSV row; the permalink is stable across exports when present
+    doc_id = row.get("permalink") or row["name"]
+    text = f"Company: {row['name']}\nCategory: {row['category']}\nDescription: {row['description']}"
+    metadata = {"name": row["name"], "category": row["category"]}
+    return doc_id, text, metadata
+
+
+def row_hash(text, metadata):
+    payload = json.dumps({"text": text, "metadata": metadata}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def read_csv_batches(lines, batch_size=INGEST_BATCH_SIZE):
+    # Parse CSV lines (kept with their line endings) lazily and yield lists of at most batch_size rows
+    batch = []
+    for row in csv.DictReader(lines):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def _open_rows_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS rows (doc_id TEXT PRIMARY KEY, hash TEXT NOT NULL, row INTEGER NOT NULL)")
+    return conn
+
+
+class CrunchbaseIndex:
+    def __init__(self, index_dir=INDEX_DIR, embedding_service=None):
+        self.index_dir = index_dir
+        self.embedding_service = embedding_service or EmbeddingService()
+        self.etag = None
+        self.count = 0
+        self.vectors = None
+        self.offsets = None
+        self._rows_db = None  # doc id -> (row hash, row number)
+        self.categories = None  # category code per row
+        self.category_names = []
+        self.bm25 = None
+        self._category_masks = {}
+        self.load()
+
+    def __len__(self):
+        return self.count
+
+    def load(self):
+        # Vectors and document offsets are memory-mapped and row hashes stay in SQLite,
+        # so startup cost does not grow with the index
+        manifest_path = os.path.join(self.index_dir, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return False
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version", 1) < FORMAT_VERSION:
+            manifest = self._upgrade(manifest)
+        self.etag = manifest.get("etag")
+        self.count, dim = manifest["count"], manifest["dim"]
+        self.category_names = manifest.get("categories", [])
+        self._category_masks = {}
+        self._rows_db = _open_rows_db(os.path.join(self.index_dir, ROWS_FILE))
+        if self.count:
+            self.vectors = np.memmap(os.path.join(self.index_dir, VECTORS_FILE), dtype=np.float32, mode="r",
+                                     shape=(self.count, dim))
+            self.offsets = np.memmap(os.path.join(self.index_dir, OFFSETS_FILE), dtype=np.int64, mode="r",
+                                     shape=(self.count,))
+            self.categories = np.memmap(os.path.join(self.index_dir, CATEGORIES_FILE), dtype=np.int32, mode="r",
+                                        shape=(self.count,))
+        else:
+            self.vectors = np.zeros((0, dim), dtype=np.float32)
+            self.offsets = np.zeros(0, dtype=np.int64)
+            self.categories = np.zeros(0, dtype=np.int32)
+        self.bm25 = InvertedIndex(os.path.join(self.index_dir, BM25_DIR))
+        return True
+
+    def _upgrade(self, manifest):
+        # Category codes and BM25 postings derive from the document file, so an index written
+        # before they existed is brought up to date without re-embedding anything
+        category_codes = {}
+        with open(os.path.join(self.index_dir, DOCUMENTS_FILE), encoding="utf-8") as documents_file:
+            categories = [category_codes.setdefault(json.loads(line)["metadata"]["category"], len(category_codes))
+                          for line in documents_file]
+        with open(os.path.join(self.index_dir, CATEGORIES_FILE), "wb") as f:
+            f.write(np.asarray(categories, dtype=np.int32).tobytes())
+        bm25_dir = os.path.join(self.index_dir, BM25_DIR)
+        shutil.rmtree(bm25_dir, ignore_errors=True)
+        with open(os.path.join(self.index_dir, DOCUMENTS_FILE), encoding="utf-8") as documents_file:
+            build_inverted_index((json.loads(line)["text"] for line in documents_file), bm25_dir)
+        manifest = dict(manifest, version=FORMAT_VERSION, categories=sorted(category_codes, key=category_codes.get))
+        # Written last, so an interrupted upgrade is simply redone on the next load
+        with open(os.path.join(self.index_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        return manifest
+
+    def category_mask(self, category):
+        # Boolean mask of the rows in `category`, or None when no row has it
+        if category not in self.category_names:
+            return None
+        if category not in self._category_masks:
+            self._category_masks[category] = np.asarray(self.categories) == self.category_names.index(category)
+        return self._category_masks[category]
+
+    def close(self):
+        if self._rows_db is not None:
+            self._rows_db.close()
+        self._rows_db = self.vectors = self.offsets = self.categories = self.bm25 = None
+
+    def _previous_row(self, doc_id):
+        if self._rows_db is None:
+            return None
+        return self._rows_db.execute("SELECT hash, row FROM rows WHERE doc_id = ?", (doc_id,)).fetchone()
+
+    def document(self, row_number):
+        with open(os.path.join(self.index_dir, DOCUMENTS_FILE), "rb") as f:
+            f.seek(int(self.offsets[row_number]))
+            return json.loads(f.readline())
+
+    @traced("index")
+    def update(self, batches, etag=None):
+        # Rebuild the index files from batches of CSV rows, streaming each batch to disk.
+        # Rows whose hash is unchanged copy their vector from the current index; only new or
+        # changed rows are embedded. Returns counts of what happened.
+        build_dir = f"{self.index_dir}.building"
+        shutil.rmtree(build_dir, ignore_errors=True)
+        os.makedirs(build_dir)
+
+        stats = {"reused": 0, "embedded": 0, "kept": 0, "duplicates": 0}
+        count = 0
+        dim = self.vectors.shape[1] if self.vectors is not None else 0
+        new_rows = _open_rows_db(os.path.join(build_dir, ROWS_FILE))
+        category_codes = {}
+
+        with open(os.path.join(build_dir, VECTORS_FILE), "wb") as vectors_file, \
+                open(os.path.join(build_dir, DOCUMENTS_FILE), "wb") as documents_file, \
+                open(os.path.join(build_dir, OFFSETS_FILE), "wb") as offsets_file, \
+                open(os.path.join(build_dir, CATEGORIES_FILE), "wb") as categories_file:
+            for batch in batches:
+                documents = {}
+                for row in batch:
+                    doc_id, text, metadata = row_document(row)
+                    # Rows sharing an id (e.g. companies with the same name and no permalink) are all kept:
+                    # repeats get "#2", "#3", ... in file order, so their ids stay stable across exports
+                    base_id, repeat = doc_id, 1
+                    while doc_id in documents or new_rows.execute(
+                            "SELECT 1 FROM rows WHERE doc_id = ?", (doc_id,)).fetchone():
+                        repeat += 1
+                        doc_id = f"{base_id}#{repeat}"
+                    stats["duplicates"] += repeat > 1
+                    documents[doc_id] = (text, metadata)
+                if not documents:
+                    continue
+
+                digests, vectors, to_embed = [], [], []
+                for doc_id, (text, metadata) in documents.items():
+                    digest = row_hash(text, metadata)
+                    previous = self._previous_row(doc_id)
+                    stats["kept"] += previous is not None
+                    if previous and previous[0] == digest:
+                        vectors.append(self.vectors[previous[1]])
+                    else:
+                        vectors.append(None)
+                        to_embed.append(text)
+                    digests.append(digest)
+
+                embedded = iter(_normalize(self.embedding_service.embed(to_embed))) if to_embed else iter(())
+                vectors = np.asarray([next(embedded) if v is None else v for v in vectors], dtype=np.float32)
+                dim = vectors.shape[1]
+                stats["embedded"] += len(to_embed)
+                stats["reused"] += len(documents) - len(to_embed)
+
+                offsets, categories = [], []
+                for doc_id, (text, metadata) in documents.items():
+                    offsets.append(documents_file.tell())
+                    categories.append(category_codes.setdefault(metadata["category"], len(category_codes)))
+                    line = json.dumps({"id": doc_id, "text": text, "metadata": metadata}) + "\n"
+                    documents_file.write(line.encode("utf-8"))
+                vectors_file.write(vectors.tobytes())
+                offsets_file.write(np.asarray(offsets, dtype=np.int64).tobytes())
+                categories_file.write(np.asarray(categories, dtype=np.int32).tobytes())
+                new_rows.executemany(
+                    "INSERT INTO rows (doc_id, hash, row) VALUES (?, ?, ?)",
+                    [(doc_id, digest, count + i) for i, (doc_id, digest) in enumerate(zip(documents, digests))],
+                )
+                count += len(documents)
+
+        new_rows.commit()
+        new_rows.close()
+        stats["removed"] = self.count - stats.pop("kept")
+
+        # The BM25 postings are built from the finished document file, one line at a time
+        with open(os.path.join(build_dir, DOCUMENTS_FILE), encoding="utf-8") as documents_file:
+            build_inverted_index((json.loads(line)["text"] for line in documents_file),
+                                 os.path.join(build_dir, BM25_DIR))
+
+        categories = sorted(category_codes, key=category_codes.get)
+        manifest = {"version": FORMAT_VERSION, "etag": etag, "count": count, "dim": dim, "categories": categories}
+        with open(os.path.join(build_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+
+        # Release the old memory maps and manifest before swapping directories
+        self.close()
+        old_dir = f"{self.index_dir}.old"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.exists(self.index_dir):
+            os.replace(self.index_dir, old_dir)
+        os.replace(build_dir, self.index_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        self.load()
+        return stats
+
+    @traced("retrieve", mode="dense")
+    def search(self, query_vector, top_k):
+        # Cosine similarity against the normalized vectors, with a partial sort for the top k
+        if not self.count:
+            return []
+        query = _normalize(np.asarray(query_vector, dtype=np.float32)[None, :])[0]
+        scores = self.vectors @ query
+        top_k = min(top_k, len(scores))
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        ranked = candidates[np.argsort(-scores[candidates])]
+        return [(int(row), float(scores[row])) for row in ranked]
+
+    def as_retriever(self, similarity_top_k=2):
+        return CrunchbaseRetriever(self, similarity_top_k)
+
+    def as_hybrid_retriever(self, similarity_top_k=2, category=None, **kwargs):
+        return HybridRetriever(self, similarity_top_k, category, **kwargs)
+
+    def as_query_engine(self, similarity_top_k=2, hybrid=True, category=None, **kwargs):
+        # Hybrid BM25 + vector retrieval by default; hybrid=False gives pure dense retrieval
+        if hybrid:
+            retriever = self.as_hybrid_retriever(similarity_top_k, category)
+        else:
+            retriever = self.as_retriever(similarity_top_k)
+        return RetrieverQueryEngine.from_args(retriever, **kwargs)
+
+
+class CrunchbaseRetriever(BaseRetriever):
+    def __init__(self, index, similarity_top_k=2):
+        super().__init__()
+        self._index = index
+        self._similarity_top_k = similarity_top_k
+
+    def _retrieve(self, query_bundle):
+        return self._nodes(self._index.embedding_service.embed_query(query_bundle.query_str))
+
+    async def _aretrieve(self, query_bundle):
+        vectors = await self._index.embedding_service.aembed([query_bundle.query_str])
+        return self._nodes(vectors[0])
+
+    def _nodes(self, query_vector):
+        results = []
+        for row, score in self._index.search(query_vector, self._similarity_top_k):
+            document = self._index.document(row)
+            node = TextNode(text=document["text"], id_=document["id"], metadata=document["metadata"])
+            results.append(NodeWithScore(node=node, score=score))
+        return results
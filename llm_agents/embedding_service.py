@@ -0,0 +1,237 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential
+
+from llm_agents.chunking import count_tokens
+from llm_agents.map_reduce import is_rate_limit_error
+from llm_agents.tracing import count_retry, span, wrap_context
+
+# Embeddings are cached per model as an append-only float32 matrix plus one text hash per row
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(parent_dir, ".cache", "embeddings"))
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+MAX_BATCH_ITEMS = int(os.getenv("EMBEDDING_MAX_BATCH_ITEMS", "256"))
+MAX_BATCH_TOKENS = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", "8000"))
+MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", "4"))
+
+VECTORS_FILE = "vectors.f32"
+KEYS_FILE = "keys.txt"
+DIM_FILE = "dim.txt"
+
+
+def text_key(model, text):
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    # Rows are appended to vectors.f32 and their hashes to keys.txt (row number = line number).
+    # Reads go through a memory map that is re-opened when the file has grown.
+    # Only one process should write to a cache directory at a time.
+    def __init__(self, model, cache_dir=CACHE_DIR):
+        self.directory = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", model))
+        os.makedirs(self.directory, exist_ok=True)
+        self._vectors_path = os.path.join(self.directory, VECTORS_FILE)
+        self._keys_path = os.path.join(self.directory, KEYS_FILE)
+        self._dim_path = os.path.join(self.directory, DIM_FILE)
+        self._matrix = None
+
+        # The dimension is unknown until the first vectors are stored
+        self.dim = None
+        self.rows = {}
+        if os.path.exists(self._dim_path):
+            with open(self._dim_path, encoding="ascii") as f:
+                self.dim = int(f.read())
+        if self.dim and os.path.exists(self._keys_path):
+            with open(self._keys_path, encoding="ascii") as f:
+                keys = f.read().split()
+            # A crash between the two appends can leave the files out of step; keep the rows both hold
+            size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+            stored = min(len(keys), size // (4 * self.dim))
+            self.rows = {key: row for row, key in enumerate(keys[:stored])}
+            if stored != len(keys) or size != stored * 4 * self.dim:
+                self._truncate(stored)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _truncate(self, count):
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(count * 4 * self.dim)
+        with open(self._keys_path, "w", encoding="ascii") as f:
+            f.writelines(f"{key}\n" for key, _ in sorted(self.rows.items(), key=lambda item: item[1]))
+
+    def _map(self):
+        if self._matrix is None or len(self._matrix) < len(self.rows):
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(len(self.rows), self.dim))
+        return self._matrix
+
+    def get(self, keys):
+        # Returns {key: vector} for the keys that are cached
+        found = [(key, self.rows[key]) for key in keys if key in self.rows]
+        if not found:
+            return {}
+        matrix = self._map()
+        return {key: matrix[row] for key, row in found}
+
+    def put(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with open(self._dim_path, "w", encoding="ascii") as f:
+                f.write(str(self.dim))
+        with open(self._vectors_path, "ab") as f:
+            f.write(vectors.tobytes())
+        with open(self._keys_path, "a", encoding="ascii") as f:
+            for key in keys:
+                self.rows[key] = len(self.rows)
+                f.write(f"{key}\n")
+
+
+class OpenAIEmbedder:
+    def __init__(self, model=EMBEDDING_MODEL, client=None):
+        from openai import AsyncOpenAI
+
+        self.model = model
+        self.client = client or AsyncOpenAI()
+
+    async def aembed_batch(self, texts):
+        retrying = AsyncRetrying(
+            retry=retry_if_exception(is_rate_limit_error),
+            wait=wait_exponential(multiplier=1, min=4, max=60),
+            stop=stop_after_attempt(6),
+            before_sleep=count_retry,
+            reraise=True,
+        )
+        with span("embed_batch", model=self.model, texts=len(texts)) as s:
+            async for attempt in retrying:
+                with attempt:
+                    response = await self.client.embeddings.create(model=self.model, input=texts)
+                    s.set(tokens_in=response.usage.prompt_tokens)
+                    return [item.embedding for item in response.data]
+
+
+class FakeEmbedder:
+    # Deterministic local embedder for tests and benchmarks: a hashed bag of words, so texts
+    # sharing words land close together. Costs no API calls.
+    def __init__(self, dim=64, latency=0.0):
+        self.model = f"fake-{dim}"
+        self.dim = dim
+        self.latency = latency
+        self.calls = 0
+
+    def _word_vector(self, word):
+        seed = int.from_bytes(hashlib.sha256(word.encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+
+    def embed_text(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            vector += self._word_vector(word)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def aembed_batch(self, texts):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self.embed_text(text) for text in texts]
+
+
+def pack_batches(texts, max_items=MAX_BATCH_ITEMS, max_tokens=MAX_BATCH_TOKENS):
+    batches = []
+    current, current_tokens = [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and (len(current) >= max_items or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+class EmbeddingService:
+    # Embeds texts through the cache: repeats are served from disk, the rest are packed into
+    # batches by item and token limits with several batches in flight at once
+    def __init__(self, embedder=None, cache_dir=CACHE_DIR, max_batch_items=MAX_BATCH_ITEMS,
+                 max_batch_tokens=MAX_BATCH_TOKENS, max_in_flight=MAX_IN_FLIGHT):
+        self.embedder = embedder or OpenAIEmbedder()
+        self.max_batch_items = max_batch_items
+        self.max_batch_tokens = max_batch_tokens
+        self.max_in_flight = max_in_flight
+        self.cache = EmbeddingCache(self.embedder.model, cache_dir)
+        self.texts_embedded = 0
+        self.cache_hits = 0
+        self.seconds = 0.0
+
+    async def aembed(self, texts):
+        with span("embed", texts=len(texts)) as s:
+            return await self._aembed(texts, s)
+
+    async def _aembed(self, texts, s):
+        start = time.perf_counter()
+        model = self.embedder.model
+        keys = [text_key(model, text) for text in texts]
+        found = self.cache.get(keys)
+        hits = sum(1 for key in keys if key in found)
+        self.cache_hits += hits
+        s.set(cache_hits=hits)
+
+        # Each distinct missing text is embedded once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+
+        if missing:
+            semaphore = asyncio.Semaphore(self.max_in_flight)
+
+            async def run(batch):
+                async with semaphore:
+                    return await self.embedder.aembed_batch(batch)
+
+            batches = pack_batches(list(missing.values()), self.max_batch_items, self.max_batch_tokens)
+            results = await asyncio.gather(*(run(batch) for batch in batches))
+            vectors = np.asarray([vector for batch in results for vector in batch], dtype=np.float32)
+            self.cache.put(list(missing), vectors)
+            found.update(zip(missing, vectors))
+            self.texts_embedded += len(missing)
+            s.set(embedded=len(missing), batches=len(batches))
+
+        self.seconds += time.perf_counter() - start
+        if not texts:
+            return np.zeros((0, self.cache.dim or 0), dtype=np.float32)
+        return np.stack([found[key] for key in keys])
+
+    def embed(self, texts):
+        # Synchronous callers inside a running event loop (a sync retriever called from async code) cannot
+        # use asyncio.run, so the embedding then runs on its own loop in a worker thread; async code should
+        # await aembed instead
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.aembed(texts))
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(wrap_context(asyncio.run), self.aembed(texts)).result()
+
+    def embed_query(self, text):
+        return self.embed([text])[0]
+
+    def stats(self):
+        total = self.texts_embedded + self.cache_hits
+        return {
+            "texts_embedded": self.texts_embedded,
+            "cache_hits": self.cache_hits,
+            "seconds": self.seconds,
+            "texts_per_sec": total / self.seconds if self.seconds else 0.0,
+        }
@@ -0,0 +1,167 @@
+import json
+import math
+import os
+import re
+from array import array
+from collections import Counter
+
+import numpy as np
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from llm_agents.tracing import traced
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Candidates kept from each of the lexical and dense rankings before fusion
+CANDIDATE_POOL = int(os.getenv("HYBRID_CANDIDATE_POOL", "100"))
+
+# Weight of the dense score in the fused score (the lexical score gets the rest)
+VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", "0.5"))
+
+VOCAB_FILE = "vocab.json"
+INDPTR_FILE = "indptr.npy"
+POSTING_DOCS_FILE = "posting_docs.npy"
+POSTING_TFS_FILE = "posting_tfs.npy"
+DOC_LENGTHS_FILE = "doc_lengths.npy"
+
+
+def tokenize(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def build_inverted_index(texts, directory):
+    # Postings are stored CSR-style: the postings of term t are posting_docs[indptr[t]:indptr[t + 1]],
+    # with doc ids ascending and matching term frequencies in posting_tfs
+    vocab = {}
+    term_ids, doc_ids, tfs, lengths = array("I"), array("I"), array("I"), array("I")
+    for doc, text in enumerate(texts):
+        counts = Counter(tokenize(text))
+        lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+            doc_ids.append(doc)
+            tfs.append(tf)
+
+    term_ids = np.frombuffer(term_ids, dtype=np.uint32)
+    order = np.argsort(term_ids, kind="stable")  # stable, so doc ids stay ascending within a term
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=indptr[1:])
+
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, INDPTR_FILE), indptr)
+    np.save(os.path.join(directory, POSTING_DOCS_FILE), np.frombuffer(doc_ids, dtype=np.uint32)[order])
+    np.save(os.path.join(directory, POSTING_TFS_FILE), np.frombuffer(tfs, dtype=np.uint32)[order])
+    np.save(os.path.join(directory, DOC_LENGTHS_FILE), np.frombuffer(lengths, dtype=np.uint32))
+    with open(os.path.join(directory, VOCAB_FILE), "w", encoding="utf-8") as f:
+        json.dump(sorted(vocab, key=vocab.get), f)
+
+
+class InvertedIndex:
+    def __init__(self, directory):
+        with open(os.path.join(directory, VOCAB_FILE), encoding="utf-8") as f:
+            self.vocab = {term: term_id for term_id, term in enumerate(json.load(f))}
+        self.indptr = np.load(os.path.join(directory, INDPTR_FILE), mmap_mode="r")
+        self.posting_docs = np.load(os.path.join(directory, POSTING_DOCS_FILE), mmap_mode="r")
+        self.posting_tfs = np.load(os.path.join(directory, POSTING_TFS_FILE), mmap_mode="r")
+        self.doc_lengths = np.load(os.path.join(directory, DOC_LENGTHS_FILE), mmap_mode="r")
+        self.doc_count = len(self.doc_lengths)
+        self.average_length = float(np.mean(self.doc_lengths)) if self.doc_count else 0.0
+
+    def scores(self, terms, mask=None):
+        # BM25 over the postings of the query terms only. Returns (doc ids, scores) for matching
+        # documents, restricted to docs where `mask` is True when a mask is given.
+        docs, contributions = [], []
+        for term, query_tf in Counter(terms).items():
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            term_docs = np.asarray(self.posting_docs[start:end])
+            tfs = np.asarray(self.posting_tfs[start:end], dtype=np.float32)
+            idf = math.log(1 + (self.doc_count - len(term_docs) + 0.5) / (len(term_docs) + 0.5))
+            if mask is not None:
+                keep = mask[term_docs]
+                term_docs, tfs = term_docs[keep], tfs[keep]
+            norm = K1 * (1 - B + B * self.doc_lengths[term_docs] / self.average_length)
+            docs.append(term_docs)
+            contributions.append(query_tf * idf * tfs * (K1 + 1) / (tfs + norm))
+
+        if not docs:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        unique_docs, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+        return unique_docs, np.bincount(inverse, weights=np.concatenate(contributions)).astype(np.float32)
+
+
+def top_k(rows, scores, k):
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k - 1)[:k]
+        rows, scores = rows[keep], scores[keep]
+    order = np.argsort(-scores)
+    return rows[order], scores[order]
+
+
+def _min_max(scores):
+    if not len(scores):
+        return scores
+    low, high = scores.min(), scores.max()
+    return np.ones_like(scores) if high == low else (scores - low) / (high - low)
+
+
+class HybridRetriever(BaseRetriever):
+    # Fuses BM25 and dense scores over a CrunchbaseIndex, after an optional category pre-filter.
+    # With a category, BM25 and vector scoring only ever touch rows in that category.
+    def __init__(self, index, similarity_top_k=2, category=None, vector_weight=VECTOR_WEIGHT,
+                 candidate_pool=CANDIDATE_POOL):
+        super().__init__()
+        self._index = index
+        self._similarity_top_k = similarity_top_k
+        self._category = category
+        self._vector_weight = vector_weight
+        self._candidate_pool = candidate_pool
+
+    @traced("retrieve", mode="hybrid")
+    def search_rows(self, query_str, query_vector):
+        index = self._index
+        mask = candidates = None
+        if self._category is not None:
+            mask = index.category_mask(self._category)
+            if mask is None:
+                return []
+            candidates = np.flatnonzero(mask)
+
+        lexical_rows, lexical_scores = top_k(*index.bm25.scores(tokenize(query_str), mask), self._candidate_pool)
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        if candidates is None:
+            dense_rows, dense_scores = top_k(np.arange(len(index)), index.vectors @ query, self._candidate_pool)
+        else:
+            dense_rows, dense_scores = top_k(candidates, index.vectors[candidates] @ query, self._candidate_pool)
+
+        # Weighted sum of min-max normalized scores over the union of both candidate lists
+        fused = {}
+        for row, score in zip(lexical_rows, _min_max(lexical_scores)):
+            fused[int(row)] = (1 - self._vector_weight) * float(score)
+        for row, score in zip(dense_rows, _min_max(dense_scores)):
+            fused[int(row)] = fused.get(int(row), 0.0) + self._vector_weight * float(score)
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:self._similarity_top_k]
+
+    def _nodes(self, query_str, query_vector):
+        results = []
+        for row, score in self.search_rows(query_str, query_vector):
+            document = self._index.document(row)
+            node = TextNode(text=document["text"], id_=document["id"], metadata=document["metadata"])
+            results.append(NodeWithScore(node=node, score=score))
+        return results
+
+    def _retrieve(self, query_bundle):
+        query_vector = self._index.embedding_service.embed_query(query_bundle.query_str)
+        return self._nodes(query_bundle.query_str, query_vector)
+
+    async def _aretrieve(self, query_bundle):
+        vectors = await self._index.embedding_service.aembed([query_bundle.query_str])
+        return self._nodes(query_bundle.query_str, vectors[0])
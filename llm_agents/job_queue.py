@@ -0,0 +1,328 @@
+import argparse
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import time
+
+# Durable document jobs and their stage outputs, shared by every worker process through SQLite
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(parent_dir, ".cache", "jobs.sqlite3"))
+
+# A claimed job is handed to another worker if its lease runs out; saving a stage output renews it,
+# and workers also renew it on a timer while a long download, extraction or model call runs
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "600"))
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+# Delay before a failed job is retried, doubled on every further attempt
+RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "30"))
+
+DEFAULT_BATCH = "default"
+STATUSES = ("pending", "running", "done", "failed")
+
+
+class LeaseLost(Exception):
+    # The job's lease expired and another worker took it over, so this worker must stop working on it
+    pass
+
+
+class Job:
+    def __init__(self, id, batch, source, stage, attempts):
+        self.id = id
+        self.batch = batch
+        self.source = source
+        self.stage = stage  # Last completed stage, or None
+        self.attempts = attempts
+
+
+def worker_id(index=0):
+    # host:pid:index, so a restarted run on the same host can tell its predecessors' workers are gone
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def _owner_alive(owner):
+    host, pid, _ = owner.rsplit(":", 2)
+    if host != socket.gethostname():
+        return True  # Only the lease can tell for workers on other hosts
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobQueue:
+    # Jobs move pending -> running -> done, or back to pending with a backoff when they fail, until
+    # MAX_ATTEMPTS is reached. Stage outputs are keyed by (job, stage, key) and written with
+    # INSERT OR REPLACE, so a retried stage overwrites rather than duplicates.
+    def __init__(self, path=QUEUE_PATH, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS,
+                 retry_backoff=RETRY_BACKOFF_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY, batch TEXT NOT NULL, source TEXT NOT NULL, "
+            "status TEXT NOT NULL DEFAULT 'pending', stage TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "available_at REAL NOT NULL, lease_owner TEXT, lease_expires REAL, error TEXT, "
+            "created REAL NOT NULL, updated REAL NOT NULL, UNIQUE (batch, source))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (batch, status, available_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outputs ("
+            "job_id INTEGER NOT NULL, stage TEXT NOT NULL, key TEXT NOT NULL, value BLOB, created REAL NOT NULL, "
+            "PRIMARY KEY (job_id, stage, key))"
+        )
+
+    def close(self):
+        self._conn.close()
+
+    def enqueue(self, sources, batch=DEFAULT_BATCH):
+        # Sources already in the batch are left alone, whatever their state; returns how many were added
+        now = time.time()
+        before = self._conn.total_changes
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO jobs (batch, source, available_at, created, updated) VALUES (?, ?, ?, ?, ?)",
+                [(batch, source, now, now, now) for source in sources],
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return self._conn.total_changes - before
+
+    def claim(self, owner, batch=DEFAULT_BATCH):
+        # Takes the oldest job that is due, or whose worker lost its lease or died; None when there is none
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            job = None
+            rows = self._conn.execute(
+                "SELECT id, source, stage, attempts, status, lease_owner, lease_expires FROM jobs "
+                "WHERE batch = ? AND ((status = 'pending' AND available_at <= ?) OR status = 'running') "
+                "ORDER BY id",
+                (batch, now),
+            ).fetchall()
+            for job_id, source, stage, attempts, status, lease_owner, lease_expires in rows:
+                if status == "running" and lease_expires > now and _owner_alive(lease_owner):
+                    continue
+                if attempts >= self.max_attempts:
+                    # Its last attempt died with the worker
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'failed', lease_owner = NULL, error = COALESCE(error, ?), "
+                        "updated = ? WHERE id = ?",
+                        ("worker lost during the last attempt", now, job_id),
+                    )
+                    continue
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', lease_owner = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, updated = ? WHERE id = ?",
+                    (owner, now + self.lease_seconds, now, job_id),
+                )
+                job = Job(job_id, batch, source, stage, attempts + 1)
+                break
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return job
+
+    def _update_owned(self, job, owner, assignments, params):
+        # Only the current lease holder may change a job, so a worker that lost its lease cannot
+        # overwrite the state of the worker that took over
+        cursor = self._conn.execute(
+            f"UPDATE jobs SET {assignments}, updated = ? WHERE id = ? AND lease_owner = ? AND status = 'running'",
+            (*params, time.time(), job.id, owner),
+        )
+        return cursor.rowcount == 1
+
+    def heartbeat(self, job, owner):
+        return self._update_owned(job, owner, "lease_expires = ?", (time.time() + self.lease_seconds,))
+
+    def mark_stage(self, job, owner, stage):
+        job.stage = stage
+        return self._update_owned(job, owner, "stage = ?, lease_expires = ?",
+                                  (stage, time.time() + self.lease_seconds))
+
+    def complete(self, job, owner):
+        return self._update_owned(job, owner, "status = 'done', stage = 'final', lease_owner = NULL, error = NULL",
+                                  ())
+
+    def fail(self, job, owner, error):
+        # Back to pending after a backoff, or failed for good once the attempts are used up
+        if job.attempts >= self.max_attempts:
+            return self._update_owned(job, owner, "status = 'failed', lease_owner = NULL, error = ?", (error,))
+        delay = self.retry_backoff * 2 ** (job.attempts - 1)
+        return self._update_owned(job, owner, "status = 'pending', lease_owner = NULL, error = ?, available_at = ?",
+                                  (error, time.time() + delay))
+
+    def put_output(self, job, owner, stage, value, key=""):
+        # Saves a stage output and renews the lease in one transaction; nothing is written, and False is
+        # returned, once the lease belongs to another worker. bytes are stored as they are; anything else as JSON.
+        stored = value if isinstance(value, bytes) else json.dumps(value)
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            if not self.heartbeat(job, owner):
+                self._conn.execute("ROLLBACK")
+                return False
+            self._conn.execute(
+                "INSERT OR REPLACE INTO outputs (job_id, stage, key, value, created) VALUES (?, ?, ?, ?, ?)",
+                (job.id, stage, key, stored, time.time()),
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return True
+
+    def get_output(self, job_id, stage, key=""):
+        row = self._conn.execute(
+            "SELECT value FROM outputs WHERE job_id = ? AND stage = ? AND key = ?", (job_id, stage, key)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0] if isinstance(row[0], bytes) else json.loads(row[0])
+
+    def delete_outputs(self, job_id, stage):
+        self._conn.execute("DELETE FROM outputs WHERE job_id = ? AND stage = ?", (job_id, stage))
+
+    def counts(self, batch=DEFAULT_BATCH):
+        counts = dict.fromkeys(STATUSES, 0)
+        for status, count in self._conn.execute(
+            "SELECT status, COUNT(*) FROM jobs WHERE batch = ? GROUP BY status", (batch,)
+        ):
+            counts[status] = count
+        return counts
+
+    def next_due(self, batch=DEFAULT_BATCH):
+        # Seconds until a pending job is due (0 if one already is), the lease time left when only running
+        # jobs remain, or None when the batch is finished
+        now = time.time()
+        (available_at,) = self._conn.execute(
+            "SELECT MIN(available_at) FROM jobs WHERE batch = ? AND status = 'pending'", (batch,)
+        ).fetchone()
+        if available_at is not None:
+            return max(0.0, available_at - now)
+        (lease_expires,) = self._conn.execute(
+            "SELECT MIN(lease_expires) FROM jobs WHERE batch = ? AND status = 'running'", (batch,)
+        ).fetchone()
+        if lease_expires is not None:
+            return max(0.0, lease_expires - now)
+        return None
+
+    def jobs(self, batch=DEFAULT_BATCH, status=None):
+        query = "SELECT id, source, status, stage, attempts, error FROM jobs WHERE batch = ?"
+        params = [batch]
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        return [
+            {"id": job_id, "source": source, "status": job_status, "stage": stage, "attempts": attempts,
+             "error": error}
+            for job_id, source, job_status, stage, attempts, error in self._conn.execute(query + " ORDER BY id", params)
+        ]
+
+    def retry_failed(self, batch=DEFAULT_BATCH):
+        # Failed jobs get a fresh set of attempts; their completed stages are kept
+        now = time.time()
+        cursor = self._conn.execute(
+            "UPDATE jobs SET status = 'pending', attempts = 0, available_at = ?, updated = ? "
+            "WHERE batch = ? AND status = 'failed'",
+            (now, now, batch),
+        )
+        return cursor.rowcount
+
+    def prune(self, batch=DEFAULT_BATCH):
+        # Drops the intermediate outputs of finished jobs, keeping their final summaries
+        cursor = self._conn.execute(
+            "DELETE FROM outputs WHERE stage != 'final' AND job_id IN "
+            "(SELECT id FROM jobs WHERE batch = ? AND status = 'done')",
+            (batch,),
+        )
+        return cursor.rowcount
+
+
+def renew_lease(path, job, owner, lease_seconds=LEASE_SECONDS):
+    # heartbeat() on a short-lived connection of its own, for calling from a worker thread:
+    # a sqlite3 connection may only be used by the thread that opened it
+    queue = JobQueue(path, lease_seconds)
+    try:
+        return queue.heartbeat(job, owner)
+    finally:
+        queue.close()
+
+
+class StageCheckpoint:
+    # Saves each LLM response of a job under its stage and a hash of the prompt, so a retried job
+    # gets the map (and reduce, stuff, compare) responses of earlier attempts back instead of paying again
+    def __init__(self, queue, job, owner):
+        self.queue = queue
+        self.job = job
+        self.owner = owner
+
+    @staticmethod
+    def _key(prompt):
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+    def get(self, stage, prompt):
+        return self.queue.get_output(self.job.id, stage, self._key(prompt))
+
+    def put(self, stage, prompt, response):
+        if not self.queue.put_output(self.job, self.owner, stage, response, self._key(prompt)):
+            raise LeaseLost(f"Lost the lease on {self.job.source}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and manage the document job queue.")
+    parser.add_argument("--path", default=QUEUE_PATH, help="Queue database")
+    parser.add_argument("--batch", default=DEFAULT_BATCH)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    status = subparsers.add_parser("status", help="Job counts, and every job with --jobs")
+    status.add_argument("--jobs", action="store_true")
+    subparsers.add_parser("retry-failed", help="Make failed jobs pending again, keeping their completed stages")
+    subparsers.add_parser("prune", help="Delete the intermediate outputs of finished jobs")
+    results = subparsers.add_parser("results", help="Write the final summaries as JSON lines")
+    results.add_argument("--output", default="-", help="JSONL file, or - for stdout")
+    args = parser.parse_args()
+
+    queue = JobQueue(args.path)
+    if args.command == "status":
+        counts = queue.counts(args.batch)
+        print(f"Batch {args.batch!r}: " + ", ".join(f"{count} {status}" for status, count in counts.items()))
+        if args.jobs:
+            for job in queue.jobs(args.batch):
+                error = f"  {job['error']}" if job["error"] else ""
+                print(f"{job['id']:>6} {job['status']:<8} {job['stage'] or '-':<9} {job['attempts']:>2}  "
+                      f"{job['source']}{error}")
+    elif args.command == "retry-failed":
+        print(f"Requeued {queue.retry_failed(args.batch)} failed jobs")
+    elif args.command == "prune":
+        print(f"Deleted {queue.prune(args.batch)} intermediate outputs")
+    else:
+        output = open(args.output, "w", encoding="utf-8") if args.output != "-" else None
+        try:
+            for job in queue.jobs(args.batch, "done"):
+                record = {"source": job["source"], **(queue.get_output(job["id"], "final") or {})}
+                line = json.dumps(record)
+                if output:
+                    output.write(line + "\n")
+                else:
+                    print(line)
+        finally:
+            if output:
+                output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,25 @@
+import argparse
 import asyncio
 import os
 import ssl
-from io import BytesIO
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
-import aiohttp
 import certifi
-import tiktoken
-from PyPDF2 import PdfReader
-from aiohttp import ClientTimeout
-from langchain.chains.summarize import load_summarize_chain
-from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from dotenv import load_dotenv
 
-# Load encoding
-tiktoken.get_encoding("o200k_base")
+from llm_agents.chunking import ChunkPlan, plan_chunks
+from llm_agents.job_queue import (DEFAULT_BATCH, QUEUE_PATH, JobQueue, LeaseLost, StageCheckpoint, renew_lease,
+                                  worker_id)
+from llm_agents.llm_cache import install_langchain_cache
+from llm_agents.map_reduce import REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE, RateLimiter
+from llm_agents.pdf_extraction import extract_pdf_text, extract_pdf_text_async
+from llm_agents.summary_planner import (COMPARE_SAMPLE_RATE, MAX_DOLLARS_PER_DOCUMENT, MAX_TOKENS_PER_DOCUMENT,
+                                        STRATEGIES, STRATEGY, summarize)
+from llm_agents.tracing import annotate, count_retry, span, traced
 
 # Load environment variables
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -27,14 +27,32 @@ parent_dir = os.path.dirname(script_dir)
 dotenv_path = os.path.join(parent_dir, '.env')
 load_dotenv(dotenv_path)
 
-# Set up OpenAI client
-openai_api_key = os.getenv('OPENAI_API_KEY')
-if not openai_api_key:
-    raise ValueError(f"No OpenAI API key found. Make sure it's set in your .env file at {dotenv_path}")
+MODEL_NAME = "gpt-4o"
+
+# Seconds an idle queue worker waits before checking for due or abandoned jobs again
+QUEUE_POLL_SECONDS = 5.0
+
+
+def _api_key():
+    openai_api_key = os.getenv('OPENAI_API_KEY')
+    if not openai_api_key:
+        raise ValueError(f"No OpenAI API key found. Make sure it's set in your .env file at {dotenv_path}")
+    return openai_api_key
+
+
+@lru_cache(maxsize=None)
+def get_llm():
+    # Created on first use, so importing this module needs neither LangChain nor an API key
+    from langchain_openai import ChatOpenAI
+
+    llm = ChatOpenAI(api_key=_api_key())
+    llm.temperature = 0
+    llm.model_name = MODEL_NAME
+
+    # Serve repeated prompts (this LLM runs at temperature 0) from the shared response cache
+    install_langchain_cache()
+    return llm
 
-llm = ChatOpenAI(api_key=openai_api_key)
-llm.temperature = 0
-llm.model_name = "gpt-4o"
 
 pdf_urls = [
     "https://www.stepstonegroup.com/wp-content/uploads/2022/11/Venture-Capital_-Partying-Like-Its-1999_.pdf",
@@ -50,110 +68,336 @@ ssl_context = ssl.create_default_context(cafile=certifi.where())
 ssl_context.check_hostname = False
 ssl_context.verify_mode = ssl.CERT_NONE
 
+# Ingestion limits: documents processed at once, and pooled connections in total / per host
+MAX_CONCURRENT_DOCUMENTS = int(os.getenv("PDF_MAX_CONCURRENCY", "4"))
+MAX_CONNECTIONS = int(os.getenv("PDF_MAX_CONNECTIONS", "32"))
+MAX_CONNECTIONS_PER_HOST = int(os.getenv("PDF_MAX_CONNECTIONS_PER_HOST", "4"))
+
+# Worker processes for CPU-bound PDF parsing (None lets the executor use every core)
+PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", "0")) or None
+
+# Response bodies are streamed to disk in chunks of this size
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+def create_session():
+    # One pooled session for the whole batch, so TLS connections are reused between documents
+    import aiohttp
+
+    connector = aiohttp.TCPConnector(
+        ssl=ssl_context,
+        limit=MAX_CONNECTIONS,
+        limit_per_host=MAX_CONNECTIONS_PER_HOST,
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60))
+
+
+@traced("fetch")
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10), before_sleep=count_retry)
 async def fetch_pdf(session, url):
+    # Stream the body into a spool file on disk and return its path (or None on HTTP errors)
     try:
-        timeout = ClientTimeout(total=60)  # 60 seconds timeout
-        async with session.get(url, ssl=ssl_context, timeout=timeout) as response:
-            if response.status == 200:
-                return await response.read()
-            else:
+        async with session.get(url, ssl=ssl_context) as response:
+            if response.status != 200:
                 print(f"Failed to fetch {url}: HTTP {response.status}")
                 return None
+
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as spool:
+                try:
+                    async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                        spool.write(chunk)
+                except BaseException:
+                    spool.close()
+                    os.remove(spool.name)
+                    raise
+                annotate(source=url, bytes=spool.tell())
+            return spool.name
     except Exception as e:
         print(f"Error fetching {url}: {str(e)}")
         raise  # Re-raise the exception to trigger a retry
 
 
-async def load_pdf(url_or_path):
+async def load_pdf(url_or_path, session, executor):
+    # Parsing is CPU-bound, so pages are extracted in the process pool instead of on the event loop
+    from langchain.schema import Document
+
     if url_or_path.startswith('http'):
-        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=ssl_context)) as session:
-            content = await fetch_pdf(session, url_or_path)
-            if content:
-                try:
-                    pdf = PdfReader(BytesIO(content))
-                    text = ""
-                    for page in pdf.pages:
-                        text += page.extract_text()
-                    return [Document(page_content=text, metadata={"source": url_or_path})]
-                except Exception as e:
-                    print(f"Error processing PDF from {url_or_path}: {str(e)}")
-                    return None
-            else:
-                return None
+        spool_path = await fetch_pdf(session, url_or_path)
+        if not spool_path:
+            return None
+        try:
+            with span("parse", source=url_or_path) as s:
+                text = await extract_pdf_text_async(spool_path, executor)
+                s.set(chars=len(text))
+            return [Document(page_content=text, metadata={"source": url_or_path})]
+        except Exception as e:
+            print(f"Error processing PDF from {url_or_path}: {str(e)}")
+            return None
+        finally:
+            os.remove(spool_path)
     else:
         try:
-            loader = PyPDFLoader(url_or_path)
-            return loader.load()
+            with span("parse", source=url_or_path) as s:
+                text = await extract_pdf_text_async(url_or_path, executor)
+                s.set(chars=len(text))
+            return [Document(page_content=text, metadata={"source": url_or_path})]
         except Exception as e:
             print(f"Error loading local PDF {url_or_path}: {str(e)}")
             return None
 
 
-def summarize_document(docs):
-    if not docs:
-        return "Unable to summarize document.", "Unable to summarize document."
-
-    # Split the document into chunks
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
-    splits = text_splitter.split_documents(docs)
+@traced("summarize")
+async def summarize_document(docs, source, summary_options=None):
+    # Runs the selected strategies through the planner; see llm_agents/summary_planner.py
+    text = "\n".join(doc.page_content for doc in docs)
+    return await summarize(complete, text, source, MODEL_NAME, **(summary_options or {}))
 
-    # Summarize using the "stuff" method
-    stuff_chain = load_summarize_chain(llm, chain_type="stuff")
-    stuff_summary = stuff_chain.invoke({"input_documents": splits})
 
-    # Summarize using the "map_reduce" method
-    map_reduce_chain = load_summarize_chain(llm, chain_type="map_reduce")
-    map_reduce_summary = map_reduce_chain.invoke({"input_documents": splits})
+async def complete(prompt):
+    from langchain_core.messages import HumanMessage
 
-    return stuff_summary['output_text'], map_reduce_summary['output_text']
+    response = await get_llm().ainvoke([HumanMessage(content=prompt)])
+    return response.content
 
 
-def compare_summaries(stuff_summary, map_reduce_summary):
-    comparison_prompt = f"""
-    Compare the following two summaries:
+async def process_pdf(url_or_path, session, semaphore, executor, summary_options=None):
+    async with semaphore:
+        with span("document", source=url_or_path):
+            await _process_pdf(url_or_path, session, executor, summary_options)
 
-    Stuff method summary:
-    {stuff_summary}
 
-    Map-reduce method summary:
-    {map_reduce_summary}
+def result_record(result):
+    # The parts of a SummaryResult worth keeping, as plain JSON-serializable values
+    return {
+        "stuff_summary": result.stuff_summary,
+        "map_reduce_summary": result.map_reduce_summary,
+        "comparison": result.comparison,
+        "stopped": result.stopped,
+        "usage": result.tracker.report(),
+    }
 
-    Analyze the differences in content, detail, and overall effectiveness for understanding the document.
-    """
 
-    message = HumanMessage(content=comparison_prompt)
-    response = llm.invoke([message])
-    return response.content
+def print_record(source, record):
+    if record["stuff_summary"] is not None:
+        print("\nSummary using 'stuff' method:")
+        print(record["stuff_summary"])
 
+    if record["map_reduce_summary"] is not None:
+        print("\nSummary using 'map-reduce' method:")
+        print(record["map_reduce_summary"])
 
-async def process_pdf(url_or_path):
-    print(f"\nProcessing: {url_or_path}")
-    try:
-        docs = await load_pdf(url_or_path)
-        if docs:
-            stuff_summary, map_reduce_summary = summarize_document(docs)
+    if record["comparison"] is not None:
+        print("\nComparison of methods:")
+        print(record["comparison"])
 
-            print("\nSummary using 'stuff' method:")
-            print(stuff_summary)
+    if record["stopped"]:
+        print(f"\nStopped early: {record['stopped']}")
 
-            print("\nSummary using 'map-reduce' method:")
-            print(map_reduce_summary)
+    print(f"\nLLM usage for {source}:")
+    print(record["usage"])
 
-            comparison = compare_summaries(stuff_summary, map_reduce_summary)
 
-            print("\nComparison of methods:")
-            print(comparison)
+async def _process_pdf(url_or_path, session, executor, summary_options=None):
+    print(f"\nProcessing: {url_or_path}")
+    try:
+        docs = await load_pdf(url_or_path, session, executor)
+        if docs:
+            result = await summarize_document(docs, url_or_path, summary_options)
+            print_record(url_or_path, result_record(result))
         else:
             print(f"Failed to load document: {url_or_path}")
     except Exception as e:
         print(f"Error processing {url_or_path}: {str(e)}")
 
 
-async def main():
-    tasks = [process_pdf(url_or_path) for url_or_path in pdf_urls]
-    await asyncio.gather(*tasks)
+async def main(urls=None, max_concurrency=MAX_CONCURRENT_DOCUMENTS, strategy=STRATEGY,
+               compare_sample_rate=COMPARE_SAMPLE_RATE, max_tokens=MAX_TOKENS_PER_DOCUMENT,
+               max_dollars=MAX_DOLLARS_PER_DOCUMENT):
+    summary_options = {
+        "strategy": strategy,
+        "compare_sample_rate": compare_sample_rate,
+        "max_tokens": max_tokens,
+        "max_dollars": max_dollars,
+    }
+    get_llm()  # Fail on a missing API key before downloading anything
+    semaphore = asyncio.Semaphore(max_concurrency)
+    with ProcessPoolExecutor(max_workers=PARSE_WORKERS) as executor:
+        async with create_session() as session:
+            tasks = [process_pdf(url_or_path, session, semaphore, executor, summary_options)
+                     for url_or_path in (urls or pdf_urls)]
+            await asyncio.gather(*tasks)
+
+
+# Durable mode: documents are jobs in llm_agents/job_queue.py and every stage output is saved, so a
+# restarted batch resumes each document after its last completed stage
+
+async def fetch_pdf_bytes(session, url):
+    spool_path = await fetch_pdf(session, url)
+    if not spool_path:
+        raise RuntimeError(f"Failed to fetch {url}")
+    try:
+        with open(spool_path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(spool_path)
+
+
+def extract_pdf_bytes(data):
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as spool:
+        spool.write(data)
+    try:
+        return extract_pdf_text(spool.name)
+    finally:
+        os.remove(spool.name)
+
+
+def _save_stage(queue, job, owner, stage, value):
+    # Every write checks the lease, so a worker that lost the job stops instead of racing the new owner
+    if not (queue.put_output(job, owner, stage, value) and queue.mark_stage(job, owner, stage)):
+        raise LeaseLost(f"Lost the lease on {job.source}")
+
+
+async def hold_lease(queue, job, owner, coro):
+    # Runs coro while renewing the job's lease on a timer, so a long download, extraction or model call
+    # does not let it expire. If a renewal fails, coro is cancelled and LeaseLost is raised.
+    task = asyncio.ensure_future(coro)
+    lost = False
+
+    async def renew():
+        nonlocal lost
+        while True:
+            await asyncio.sleep(queue.lease_seconds / 3)
+            # The SQLite write (which may wait on another worker's transaction) stays off the event loop
+            if not await asyncio.to_thread(renew_lease, queue.path, job, owner, queue.lease_seconds):
+                lost = True
+                task.cancel()
+                return
+
+    renewer = asyncio.create_task(renew())
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if lost:
+            raise LeaseLost(f"Lost the lease on {job.source}")
+        raise
+    finally:
+        renewer.cancel()
+
+
+async def run_job(queue, job, owner, session, summary_options, limiter):
+    # Stages: download (URLs only) -> extract -> split -> map and the other LLM calls -> final
+    source = job.source
+    text = queue.get_output(job.id, "extract")
+    if text is None:
+        # Parsing runs in a thread, so the event loop keeps renewing the lease meanwhile
+        if source.startswith("http"):
+            data = queue.get_output(job.id, "download")
+            if data is None:
+                data = await fetch_pdf_bytes(session, source)
+                _save_stage(queue, job, owner, "download", data)
+            with span("parse", source=source):
+                text = await asyncio.to_thread(extract_pdf_bytes, data)
+        else:
+            with span("parse", source=source):
+                text = await asyncio.to_thread(extract_pdf_text, source)
+        _save_stage(queue, job, owner, "extract", text)
+        queue.delete_outputs(job.id, "download")  # The text is all later stages need
+
+    saved_plan = queue.get_output(job.id, "split")
+    if saved_plan is None:
+        with span("split", source=source):
+            plan = plan_chunks(text, MODEL_NAME)
+        _save_stage(queue, job, owner, "split", vars(plan))
+    else:
+        plan = ChunkPlan(**saved_plan)
+
+    # Map, reduce, stuff and compare responses are saved one by one as they arrive
+    checkpoint = StageCheckpoint(queue, job, owner)
+    result = await summarize(complete, text, source, MODEL_NAME, limiter=limiter, plan=plan, checkpoint=checkpoint,
+                             **summary_options)
+    record = result_record(result)
+    if not (queue.put_output(job, owner, "final", record) and queue.complete(job, owner)):
+        raise LeaseLost(f"Lost the lease on {source}")
+    return record
+
+
+async def _queue_worker(queue_path, batch, index, summary_options, workers):
+    queue = JobQueue(queue_path)
+    owner = worker_id(index)
+    # The provider budgets are shared by all workers, so each one gets its slice
+    limiter = RateLimiter(REQUESTS_PER_MINUTE / workers, TOKENS_PER_MINUTE / workers)
+    processed = 0
+    async with create_session() as session:
+        while True:
+            job = queue.claim(owner, batch)
+            if job is None:
+                wait = queue.next_due(batch)
+                if wait is None:
+                    break
+                await asyncio.sleep(min(max(wait, 0.1), QUEUE_POLL_SECONDS))
+                continue
+
+            print(f"\nProcessing: {job.source} (attempt {job.attempts}, after stage {job.stage or 'none'})")
+            try:
+                with span("document", source=job.source, attempt=job.attempts):
+                    record = await hold_lease(queue, job, owner,
+                                              run_job(queue, job, owner, session, summary_options, limiter))
+                print_record(job.source, record)
+            except LeaseLost as e:
+                # The job belongs to another worker now, which records how it ends
+                print(f"{e}; another worker owns it now")
+            except Exception as e:
+                queue.fail(job, owner, f"{type(e).__name__}: {e}")
+                print(f"Error processing {job.source} (attempt {job.attempts}): {str(e)}")
+            processed += 1
+    queue.close()
+    return processed
+
+
+def queue_worker(queue_path, batch, index, summary_options, workers):
+    # Entry point of a worker process
+    return asyncio.run(_queue_worker(queue_path, batch, index, summary_options, workers))
+
+
+def run_queue(urls=None, queue_path=QUEUE_PATH, batch=DEFAULT_BATCH, workers=MAX_CONCURRENT_DOCUMENTS,
+              summary_options=None):
+    _api_key()  # Fail on a missing API key before starting workers
+    queue = JobQueue(queue_path)
+    added = queue.enqueue(urls or pdf_urls, batch)
+    print(f"Queued {added} new documents in batch {batch!r}: {queue.counts(batch)}")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(queue_worker, queue_path, batch, index, summary_options or {}, workers)
+                   for index in range(workers)]
+        processed = sum(future.result() for future in futures)
+    counts = queue.counts(batch)
+    print(f"\nProcessed {processed} jobs. Batch {batch!r}: {counts}")
+    for job in queue.jobs(batch, "failed"):
+        print(f"Failed after {job['attempts']} attempts: {job['source']} ({job['error']})")
+    queue.close()
+    return counts
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Summarize PDFs with the stuff and/or map-reduce methods.")
+    parser.add_argument("urls", nargs="*", help="PDF URLs or local paths (defaults to the built-in list)")
+    parser.add_argument("--strategy", choices=STRATEGIES, default=STRATEGY)
+    parser.add_argument("--compare-sample-rate", type=float, default=COMPARE_SAMPLE_RATE,
+                        help="Fraction of documents that get a comparison when both strategies run")
+    parser.add_argument("--max-tokens", type=int, default=MAX_TOKENS_PER_DOCUMENT, help="Per-document token cap")
+    parser.add_argument("--max-dollars", type=float, default=MAX_DOLLARS_PER_DOCUMENT, help="Per-document cost cap")
+    parser.add_argument("--queue", action="store_true",
+                        help="Run through the durable job queue, resuming unfinished documents of the batch")
+    parser.add_argument("--queue-path", default=QUEUE_PATH, help="Job queue database")
+    parser.add_argument("--batch", default=DEFAULT_BATCH, help="Queue batch name; sources are unique per batch")
+    parser.add_argument("--workers", type=int, default=MAX_CONCURRENT_DOCUMENTS, help="Queue worker processes")
+    args = parser.parse_args()
+    if args.queue:
+        run_queue(args.urls, args.queue_path, args.batch, args.workers, {
+            "strategy": args.strategy,
+            "compare_sample_rate": args.compare_sample_rate,
+            "max_tokens": args.max_tokens,
+            "max_dollars": args.max_dollars,
+        })
+    else:
+        asyncio.run(main(args.urls, strategy=args.strategy, compare_sample_rate=args.compare_sample_rate,
+                         max_tokens=args.max_tokens, max_dollars=args.max_dollars))
@@ -0,0 +1,273 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+from llm_agents.tracing import count, span
+
+# Responses are cached in SQLite, keyed by model, temperature, messages and request parameters
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(parent_dir, ".cache", "llm_responses.sqlite3"))
+CACHE_ENABLED = os.getenv("LLM_CACHE", "1") == "1"
+MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "100000"))
+TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "0")) or None  # 0 means entries never expire
+ZERO_TEMPERATURE_ONLY = os.getenv("LLM_CACHE_ZERO_TEMPERATURE_ONLY", "1") == "1"
+
+# Eviction needs a COUNT(*), so it only runs every few writes
+EVICT_EVERY = 100
+
+
+def make_key(model, temperature, messages, params=None):
+    payload = json.dumps(
+        {"model": model, "temperature": temperature, "messages": messages, "params": params or {}},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES, ttl_seconds=TTL_SECONDS,
+                 zero_temperature_only=ZERO_TEMPERATURE_ONLY, table="responses"):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.zero_temperature_only = zero_temperature_only
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed)")
+
+    def cacheable(self, temperature):
+        # Sampling at a non-zero temperature is meant to vary, so those responses are skipped unless allowed.
+        # An unknown temperature means the provider default, which is not zero.
+        return not self.zero_temperature_only or temperature == 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                count("cache_misses")
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        count("cache_hits")
+        return row[0]
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict()
+
+    def _evict(self):
+        # Drop expired entries, then the least recently used ones above the size limit
+        if self.ttl_seconds:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE created < ?", (time.time() - self.ttl_seconds,))
+        (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY accessed ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def stats(self):
+        with self._lock:
+            (entries,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_default_cache():
+    # One cache per process, or None when caching is switched off with LLM_CACHE=0
+    if not CACHE_ENABLED:
+        return None
+    return ResponseCache()
+
+
+# Raw openai client
+
+def _chat_completion_key(cache, kwargs):
+    # Cache key for a chat.completions.create request, or None when it must not be cached
+    temperature = kwargs.get("temperature")
+    if cache is None or kwargs.get("stream") or not cache.cacheable(temperature):
+        return None
+    params = {k: v for k, v in kwargs.items() if k not in ("model", "temperature", "messages")}
+    return make_key(kwargs.get("model"), temperature, kwargs.get("messages"), params)
+
+
+def create_chat_completion(client, cache=None, **kwargs):
+    # Drop-in for client.chat.completions.create(**kwargs) that serves repeated requests from the cache
+    from openai.types.chat import ChatCompletion
+
+    cache = cache or get_default_cache()
+    with span("llm", model=kwargs.get("model")) as s:
+        key = _chat_completion_key(cache, kwargs)
+        if key is None:
+            return client.chat.completions.create(**kwargs)
+
+        cached = cache.get(key)
+        if cached is not None:
+            return ChatCompletion.model_validate_json(cached)
+        response = client.chat.completions.create(**kwargs)
+        if response.usage:
+            s.set(tokens_in=response.usage.prompt_tokens, tokens_out=response.usage.completion_tokens)
+        cache.set(key, response.model_dump_json())
+        return response
+
+
+async def acreate_chat_completion(client, cache=None, **kwargs):
+    # create_chat_completion for an openai.AsyncOpenAI client
+    from openai.types.chat import ChatCompletion
+
+    cache = cache or get_default_cache()
+    with span("llm", model=kwargs.get("model")) as s:
+        key = _chat_completion_key(cache, kwargs)
+        cached = cache.get(key) if key else None
+        if cached is not None:
+            return ChatCompletion.model_validate_json(cached)
+        response = await client.chat.completions.create(**kwargs)
+        if response.usage:
+            s.set(tokens_in=response.usage.prompt_tokens, tokens_out=response.usage.completion_tokens)
+        if key:
+            cache.set(key, response.model_dump_json())
+        return response
+
+
+# LangChain (also covers crewAI agents, which call LangChain chat models)
+
+_TEMPERATURE_PATTERN = re.compile(r"""['"]temperature['"]\s*[:,]\s*([0-9.]+)""")
+
+
+@lru_cache(maxsize=None)
+def _langchain_cache_class():
+    # Defined on first use, so importing this module does not import LangChain
+    from langchain_core.caches import BaseCache
+    from langchain_core.load import dumps, loads
+
+    class LangChainCache(BaseCache):
+        def __init__(self, cache=None):
+            self.cache = cache or get_default_cache()
+
+        def _key(self, prompt, llm_string):
+            # LangChain's llm_string already serializes the model name and every invocation parameter
+            match = _TEMPERATURE_PATTERN.search(llm_string)
+            temperature = float(match.group(1)) if match else None
+            if self.cache is None or not self.cache.cacheable(temperature):
+                return None
+            return make_key(llm_string, temperature, prompt)
+
+        def lookup(self, prompt, llm_string):
+            key = self._key(prompt, llm_string)
+            if key is None:
+                return None
+            cached = self.cache.get(key)
+            if cached is None:
+                return None
+            return [loads(generation) for generation in json.loads(cached)]
+
+        def update(self, prompt, llm_string, return_val):
+            key = self._key(prompt, llm_string)
+            if key is not None:
+                self.cache.set(key, json.dumps([dumps(generation) for generation in return_val]))
+
+        def clear(self, **kwargs):
+            if self.cache is not None:
+                self.cache.clear()
+
+    return LangChainCache
+
+
+def __getattr__(name):
+    # `from llm_agents.llm_cache import LangChainCache` still works
+    if name == "LangChainCache":
+        return _langchain_cache_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def install_langchain_cache(cache=None):
+    from langchain_core.globals import set_llm_cache
+
+    set_llm_cache(_langchain_cache_class()(cache))
+
+
+# llama-index
+
+class CachedCompletionLLM:
+    # Wraps a llama-index LLM so complete/acomplete are served from the cache; everything else is delegated
+    def __init__(self, llm, cache=None):
+        self.llm = llm
+        self.cache = cache or get_default_cache()
+
+    def _key(self, prompt, kwargs):
+        temperature = getattr(self.llm, "temperature", None)
+        if self.cache is None or not self.cache.cacheable(temperature):
+            return None
+        params = {"max_tokens": getattr(self.llm, "max_tokens", None), **kwargs}
+        return make_key(getattr(self.llm, "model", None), temperature, [{"role": "user", "content": prompt}], params)
+
+    def complete(self, prompt, **kwargs):
+        from llama_index.core.base.llms.types import CompletionResponse
+
+        with span("llm", model=getattr(self.llm, "model", None)):
+            key = self._key(prompt, kwargs)
+            cached = self.cache.get(key) if key else None
+            if cached is not None:
+                return CompletionResponse(text=cached)
+            response = self.llm.complete(prompt, **kwargs)
+            if key:
+                self.cache.set(key, response.text)
+            return response
+
+    async def acomplete(self, prompt, **kwargs):
+        from llama_index.core.base.llms.types import CompletionResponse
+
+        with span("llm", model=getattr(self.llm, "model", None)):
+            key = self._key(prompt, kwargs)
+            cached = self.cache.get(key) if key else None
+            if cached is not None:
+                return CompletionResponse(text=cached)
+            response = await self.llm.acomplete(prompt, **kwargs)
+            if key:
+                self.cache.set(key, response.text)
+            return response
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
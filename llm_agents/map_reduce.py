@@ -0,0 +1,148 @@
+import asyncio
+import os
+import threading
+import time
+
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential
+
+from llm_agents.chunking import count_tokens
+from llm_agents.tracing import count_retry, span
+
+# Provider budgets shared by every map/reduce call in the process
+REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "30000"))
+MAX_CONCURRENT_CALLS = int(os.getenv("LLM_MAX_CONCURRENT_CALLS", "8"))
+
+# Tokens reserved for each completion when charging the token budget
+EXPECTED_OUTPUT_TOKENS = 256
+
+# Upper bound on the summaries combined by one reduce call
+REDUCE_GROUP_TOKENS = int(os.getenv("LLM_REDUCE_GROUP_TOKENS", "3000"))
+
+
+class RateLimiter:
+    # Two token buckets, refilled continuously: one for requests per minute, one for tokens per minute.
+    # Refill, check and consume happen under a thread lock, so event loops in different threads (worker
+    # thread fallbacks, crew thread pools) can share one limiter without overspending it.
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    async def acquire(self, tokens):
+        # A request larger than the whole budget waits for a full bucket rather than forever
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            # Never held across an await, so a waiting coroutine does not block other threads
+            with self._lock:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                request_wait = (1 - self._requests) * 60 / self.requests_per_minute
+                token_wait = (tokens - self._tokens) * 60 / self.tokens_per_minute
+            await asyncio.sleep(max(request_wait, token_wait, 0.01))
+
+
+default_limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+
+
+def is_rate_limit_error(exc):
+    # openai.RateLimitError and most HTTP client errors expose the status code
+    return getattr(exc, "status_code", None) == 429 or type(exc).__name__ == "RateLimitError"
+
+
+async def call_with_limits(call, prompt, limiter=None):
+    limiter = limiter or default_limiter
+    retrying = AsyncRetrying(
+        retry=retry_if_exception(is_rate_limit_error),
+        wait=wait_exponential(multiplier=1, min=4, max=60),
+        stop=stop_after_attempt(6),
+        before_sleep=count_retry,
+        reraise=True,
+    )
+    # The span covers rate limiter waits and 429 retries; the call itself is usually traced inside it
+    with span("limited_call") as s:
+        async for attempt in retrying:
+            with attempt:
+                start = time.perf_counter()
+                await limiter.acquire(count_tokens(prompt) + EXPECTED_OUTPUT_TOKENS)
+                s.add("limiter_wait", time.perf_counter() - start)
+                return await call(prompt)
+
+
+async def gather_or_cancel(*aws):
+    # Like asyncio.gather, but the first exception cancels the rest before it is re-raised as it is,
+    # so a failed or over-budget branch does not leave its siblings spending tokens
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def map_concurrently(call, prompts, limiter=None, max_concurrency=MAX_CONCURRENT_CALLS):
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(prompt):
+        async with semaphore:
+            return await call_with_limits(call, prompt, limiter)
+
+    return await gather_or_cancel(*(run(prompt) for prompt in prompts))
+
+
+def group_by_tokens(texts, max_group_tokens):
+    groups = []
+    current, current_tokens = [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and current_tokens + tokens > max_group_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+
+    # Oversized summaries would otherwise sit alone in their group forever, so force pairs
+    if len(groups) == len(texts) and len(texts) > 1:
+        groups = [texts[i:i + 2] for i in range(0, len(texts), 2)]
+    return groups
+
+
+async def hierarchical_reduce(call, summaries, combine_prompt, limiter=None,
+                              max_group_tokens=REDUCE_GROUP_TOKENS, max_concurrency=MAX_CONCURRENT_CALLS):
+    # Collapse summaries level by level in bounded groups until one call can combine the rest.
+    # Nothing to combine (e.g. an image-only PDF with no text) gives an empty summary.
+    if not summaries:
+        return ""
+    while True:
+        groups = group_by_tokens(summaries, max_group_tokens)
+        prompts = [combine_prompt.format(text="\n\n".join(group)) for group in groups]
+        if len(prompts) == 1:
+            return await call_with_limits(call, prompts[0], limiter)
+        summaries = await map_concurrently(call, prompts, limiter, max_concurrency)
+
+
+async def map_reduce_summarize(call, chunks, map_prompt, combine_prompt, limiter=None,
+                               max_group_tokens=REDUCE_GROUP_TOKENS, max_concurrency=MAX_CONCURRENT_CALLS):
+    # `call` is an async function taking a prompt string and returning the completion text.
+    # Prompts are format strings with a single {text} placeholder.
+    summaries = await map_concurrently(
+        call, [map_prompt.format(text=chunk) for chunk in chunks], limiter, max_concurrency
+    )
+    return await hierarchical_reduce(call, summaries, combine_prompt, limiter, max_group_tokens, max_concurrency)
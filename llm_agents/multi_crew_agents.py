@@ -1,137 +1,307 @@
-from crewai import Agent, Task, Crew, Process
-from langchain_community.tools import DuckDuckGoSearchRun
-from langchain_openai import ChatOpenAI
-from pydantic import ConfigDict
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from functools import lru_cache
+
+from llm_agents.llm_cache import install_langchain_cache
+from llm_agents.search_cache import get_search_cache
+from llm_agents.tracing import span, wrap_context
+
+# Analyst tasks running at once in parallel mode
+MAX_PARALLEL_TASKS = int(os.getenv("CREW_MAX_PARALLEL_TASKS", "5"))
+
+# Startups analyzed at once in batch mode
+MAX_CONCURRENT_STARTUPS = int(os.getenv("CREW_MAX_CONCURRENT_STARTUPS", "4"))
+
+
+# The LLM and search tool are built on first use, so importing this module does not import crewAI or LangChain
+@lru_cache(maxsize=None)
+def get_llm():
+    from langchain_openai import ChatOpenAI
+
+    llm = ChatOpenAI(temperature=0.7)
+    # Agents run at temperature 0.7, so their calls are only cached with LLM_CACHE_ZERO_TEMPERATURE_ONLY=0
+    install_langchain_cache()
+    return llm
+
+
+@lru_cache(maxsize=None)
+def get_search_tool():
+    # Search results are cached and shared across agents and startups
+    from llm_agents.search_cache import CachedDuckDuckGoSearchRun
+
+    return CachedDuckDuckGoSearchRun()
 
-# Initialize the LLM and search tool
-llm = ChatOpenAI(temperature=0.7)
-search_tool = DuckDuckGoSearchRun()
 
 # Define agents
-market_analyst = Agent(
-    role="Market Research Analyst",
-    goal="Analyze market trends, size, and potential for the startup's industry",
-    backstory="You're a seasoned market analyst with a keen eye for emerging trends and market dynamics.",
-    verbose=True,
-    llm=llm,
-    tools=[search_tool],
-    allow_delegation=False,
-    model_config=ConfigDict(populate_by_name=True),
-)
-
-financial_analyst = Agent(
-    role="Financial Analyst",
-    goal="Evaluate the startup's financial health, projections, and funding needs",
-    backstory="You're an experienced financial analyst specializing in startup valuations and financial modeling.",
-    verbose=True,
-    llm=llm,
-    tools=[search_tool],
-    allow_delegation=False,
-    model_config=ConfigDict(populate_by_name=True),
-)
-
-tech_expert = Agent(
-    role="Technology Expert",
-    goal="Assess the startup's technology, its uniqueness, and potential scalability",
-    backstory="You're a tech guru with extensive knowledge across various tech stacks and emerging technologies.",
-    verbose=True,
-    llm=llm,
-    tools=[search_tool],
-    allow_delegation=False,
-    model_config=ConfigDict(populate_by_name=True),
-)
-
-competitor_analyst = Agent(
-    role="Competitive Intelligence Specialist",
-    goal="Identify and analyze direct competitors, their strategies, and market positioning",
-    backstory="You're an expert in competitive analysis with a track record of uncovering hidden market players. You focus on direct competitors that offer similar products or services in the same target market.",
-    verbose=True,
-    llm=llm,
-    tools=[search_tool],
-    allow_delegation=False,
-    model_config=ConfigDict(populate_by_name=True),
-)
-
-contrarian_analyst = Agent(
-    role="Contrarian Analyst",
-    goal="Challenge assumptions and provide alternative viewpoints on the startup's potential",
-    backstory="You're a skeptical analyst known for identifying potential pitfalls and weaknesses in seemingly promising startups.",
-    verbose=True,
-    llm=llm,
-    tools=[search_tool],
-    allow_delegation=False,
-    model_config=ConfigDict(populate_by_name=True),
-)
-
-investment_strategist = Agent(
-    role="Investment Strategist",
-    goal="Synthesize all information, including contrarian views, to provide a balanced investment recommendation",
-    backstory="You're a veteran VC partner known for making well-informed, objective investment decisions by considering both positive and negative aspects.",
-    verbose=True,
-    llm=llm,
-    tools=[search_tool],
-    allow_delegation=False,
-    model_config=ConfigDict(populate_by_name=True),
-)
+def create_agents():
+    # Fresh agents per analysis, so crews running concurrently never share an agent executor
+    from crewai import Agent
+    from pydantic import ConfigDict
+
+    llm = get_llm()
+    search_tool = get_search_tool()
+
+    market_analyst = Agent(
+        role="Market Research Analyst",
+        goal="Analyze market trends, size, and potential for the startup's industry",
+        backstory="You're a seasoned market analyst with a keen eye for emerging trends and market dynamics.",
+        verbose=True,
+        llm=llm,
+        tools=[search_tool],
+        allow_delegation=False,
+        model_config=ConfigDict(populate_by_name=True),
+    )
+
+    financial_analyst = Agent(
+        role="Financial Analyst",
+        goal="Evaluate the startup's financial health, projections, and funding needs",
+        backstory="You're an experienced financial analyst specializing in startup valuations and financial modeling.",
+        verbose=True,
+        llm=llm,
+        tools=[search_tool],
+        allow_delegation=False,
+        model_config=ConfigDict(populate_by_name=True),
+    )
+
+    tech_expert = Agent(
+        role="Technology Expert",
+        goal="Assess the startup's technology, its uniqueness, and potential scalability",
+        backstory="You're a tech guru with extensive knowledge across various tech stacks and emerging technologies.",
+        verbose=True,
+        llm=llm,
+        tools=[search_tool],
+        allow_delegation=False,
+        model_config=ConfigDict(populate_by_name=True),
+    )
+
+    competitor_analyst = Agent(
+        role="Competitive Intelligence Specialist",
+        goal="Identify and analyze direct competitors, their strategies, and market positioning",
+        backstory="You're an expert in competitive analysis with a track record of uncovering hidden market players. You focus on direct competitors that offer similar products or services in the same target market.",
+        verbose=True,
+        llm=llm,
+        tools=[search_tool],
+        allow_delegation=False,
+        model_config=ConfigDict(populate_by_name=True),
+    )
+
+    contrarian_analyst = Agent(
+        role="Contrarian Analyst",
+        goal="Challenge assumptions and provide alternative viewpoints on the startup's potential",
+        backstory="You're a skeptical analyst known for identifying potential pitfalls and weaknesses in seemingly promising startups.",
+        verbose=True,
+        llm=llm,
+        tools=[search_tool],
+        allow_delegation=False,
+        model_config=ConfigDict(populate_by_name=True),
+    )
+
+    investment_strategist = Agent(
+        role="Investment Strategist",
+        goal="Synthesize all information, including contrarian views, to provide a balanced investment recommendation",
+        backstory="You're a veteran VC partner known for making well-informed, objective investment decisions by considering both positive and negative aspects.",
+        verbose=True,
+        llm=llm,
+        tools=[search_tool],
+        allow_delegation=False,
+        model_config=ConfigDict(populate_by_name=True),
+    )
+    return {
+        "market_analyst": market_analyst,
+        "financial_analyst": financial_analyst,
+        "tech_expert": tech_expert,
+        "competitor_analyst": competitor_analyst,
+        "contrarian_analyst": contrarian_analyst,
+        "investment_strategist": investment_strategist,
+    }
 
 
 # Define tasks
-def create_tasks(startup_name):
-    return [
+def create_tasks(startup_name, agents):
+    # The five analyst tasks are independent; the synthesis task takes all of them as context
+    from crewai import Task
+
+    analyst_tasks = [
         Task(
             description=f"Conduct a comprehensive market analysis for {startup_name}'s industry.",
-            agent=market_analyst,
+            agent=agents["market_analyst"],
             expected_output="A detailed market analysis report including market size, growth trends, and key players.",
         ),
         Task(
             description=f"Perform a detailed financial analysis of {startup_name}.",
-            agent=financial_analyst,
+            agent=agents["financial_analyst"],
             expected_output="A financial report including revenue projections, burn rate, and funding requirements.",
         ),
         Task(
             description=f"Evaluate the technological aspects and innovation potential of {startup_name}.",
-            agent=tech_expert,
+            agent=agents["tech_expert"],
             expected_output="A technology assessment report highlighting the startup's innovations and potential scalability.",
         ),
         Task(
             description=f"Analyze the direct competitive landscape for {startup_name}, focusing on companies offering similar products or services in the same target market.",
-            agent=competitor_analyst,
+            agent=agents["competitor_analyst"],
             expected_output="A focused competitive analysis report identifying direct competitors, their strategies, and market positioning.",
         ),
         Task(
             description=f"Provide a contrarian analysis of {startup_name}, challenging assumptions and identifying potential weaknesses or risks.",
-            agent=contrarian_analyst,
+            agent=agents["contrarian_analyst"],
             expected_output="A critical analysis report highlighting potential pitfalls, weaknesses, and alternative viewpoints on the startup's potential.",
         ),
-        Task(
-            description=f"Synthesize all findings, including contrarian views, and provide a balanced investment recommendation for {startup_name}.",
-            agent=investment_strategist,
-            expected_output="A comprehensive and objective investment recommendation that considers both positive aspects and potential risks.",
-        ),
     ]
+    synthesis_task = Task(
+        description=f"Synthesize all findings, including contrarian views, and provide a balanced investment recommendation for {startup_name}.",
+        agent=agents["investment_strategist"],
+        expected_output="A comprehensive and objective investment recommendation that considers both positive aspects and potential risks.",
+        context=analyst_tasks,
+    )
+    return analyst_tasks + [synthesis_task]
+
+
+def _run_task(task):
+    # A one-task crew; crewAI fills in the outputs of the task's context tasks, which have already run
+    from crewai import Crew, Process
+
+    start = time.perf_counter()
+    with span("task", role=task.agent.role):
+        Crew(agents=[task.agent], tasks=[task], verbose=True, process=Process.sequential).kickoff()
+    return time.perf_counter() - start
+
+
+def run_task_graph(tasks, max_workers=MAX_PARALLEL_TASKS, executor=None):
+    # Run each task as soon as every task in its context has finished, up to max_workers at a time.
+    # Graphs given the same executor share its workers, so together they never run more tasks than it has.
+    # Returns the seconds each task took, keyed by agent role.
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return run_task_graph(tasks, executor=executor)
+
+    timings = {}
+    finished = set()
+    pending = list(tasks)
+    running = {}
+    while pending or running:
+        for task in list(pending):
+            if all(id(dependency) in finished for dependency in task.context or []):
+                pending.remove(task)
+                running[executor.submit(wrap_context(_run_task), task)] = task
+        if not running:
+            raise ValueError("Task context dependencies contain a cycle or a task outside the graph.")
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            task = running.pop(future)
+            timings[task.agent.role] = future.result()
+            finished.add(id(task))
+    return timings
 
 
 # Create the crew
-def analyze_startup(startup_name):
+def analyze_startup(startup_name, parallel=False, max_workers=MAX_PARALLEL_TASKS, executor=None):
+    # Returns (final recommendation, {agent role: seconds}). The sequential mode runs one crew
+    # task after task; the parallel mode runs the analyst tasks concurrently, then the synthesis.
+    with span("analyze_startup", startup=startup_name, parallel=parallel):
+        return _analyze_startup(startup_name, parallel, max_workers, executor)
+
+
+def _analyze_startup(startup_name, parallel, max_workers, executor):
+    from crewai import Crew, Process
+
+    agents = create_agents()
+    tasks = create_tasks(startup_name, agents)
+
+    if parallel:
+        timings = run_task_graph(tasks, max_workers, executor)
+        return tasks[-1].output, timings
+
+    timings = {}
+    last_finish = time.perf_counter()
+
+    def record_timing(output):
+        nonlocal last_finish
+        now = time.perf_counter()
+        timings[output.agent] = now - last_finish
+        last_finish = now
+
     crew = Crew(
-        agents=[
-            market_analyst,
-            financial_analyst,
-            tech_expert,
-            competitor_analyst,
-            contrarian_analyst,
-            investment_strategist,
-        ],
-        tasks=create_tasks(startup_name),
+        agents=list(agents.values()),
+        tasks=tasks,
         verbose=True,
         process=Process.sequential,
+        task_callback=record_timing,
     )
-    return crew.kickoff()
+    return crew.kickoff(), timings
+
+
+def print_timings(timings):
+    print("\nTask timings:")
+    for role, seconds in timings.items():
+        print(f"  {role}: {seconds:.1f}s")
+
+
+def read_startup_names(path):
+    # One startup per line; blank lines and lines starting with # are skipped
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            name = line.strip()
+            if name and not name.startswith("#"):
+                yield name
+
+
+def analyze_batch(startup_names, output_path, max_concurrent_startups=MAX_CONCURRENT_STARTUPS, parallel=False,
+                  max_workers=MAX_PARALLEL_TASKS):
+    # Analyze many startups with at most max_concurrent_startups crews at once. Each result is
+    # appended to output_path as one JSON line as soon as its crew finishes. In parallel mode the
+    # startups share one pool of max_workers task threads, so no more than max_workers agent tasks
+    # (each an LLM and search chain) run at once across the whole batch.
+    task_workers = max_workers if parallel else 1
+    with ThreadPoolExecutor(max_workers=max_concurrent_startups) as executor, \
+            ThreadPoolExecutor(max_workers=task_workers) as task_executor, \
+            open(output_path, "a", encoding="utf-8") as output:
+        futures = {
+            executor.submit(analyze_startup, name, parallel, max_workers, task_executor): name
+            for name in startup_names
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result, timings = future.result()
+                record = {"startup": name, "result": str(result), "timings": timings}
+            except Exception as e:
+                record = {"startup": name, "error": str(e)}
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            print(f"Finished {name}" + (f" (error: {record['error']})" if "error" in record else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze a startup with a crew of AI analysts.")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Run the independent analyst tasks concurrently before the synthesis")
+    parser.add_argument("--max-workers", type=int, default=MAX_PARALLEL_TASKS,
+                        help="Maximum analyst tasks running at once in parallel mode, across all startups in a batch")
+    parser.add_argument("--batch", metavar="FILE", help="File with one startup name per line")
+    parser.add_argument("--output", default="startup_analyses.jsonl", help="JSONL file for batch results")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_STARTUPS,
+                        help="Maximum startups analyzed at once in batch mode")
+    args = parser.parse_args()
+
+    if args.batch:
+        analyze_batch(read_startup_names(args.batch), args.output, args.concurrency, args.parallel, args.max_workers)
+        print(f"Search cache: {get_search_cache().stats()}")
+        return
+
+    # Get user input for startup name
+    startup_name = input("Enter the name of the startup you want to analyze: ")
 
+    # Analyze the startup
+    start = time.perf_counter()
+    result, timings = analyze_startup(startup_name, parallel=args.parallel, max_workers=args.max_workers)
+    print(result)
+    print_timings(timings)
+    print(f"  total: {time.perf_counter() - start:.1f}s")
 
-# Get user input for startup name
-startup_name = input("Enter the name of the startup you want to analyze: ")
 
-# Analyze the startup
-result = analyze_startup(startup_name)
-print(result)
+if __name__ == "__main__":
+    main()
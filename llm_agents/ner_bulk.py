@@ -0,0 +1,83 @@
+import argparse
+import json
+import sys
+import time
+
+from llm_agents.spacy_test_chatbot import entities_from_doc, load_spacy_model
+
+DEFAULT_BATCH_SIZE = 256
+
+# Components NER never reads from, so they are not even loaded
+NER_EXCLUDE = ("tagger", "parser", "attribute_ruler", "lemmatizer", "senter")
+
+
+def ner_disabled_components(nlp):
+    # Everything but the NER component, and the shared tok2vec if NER listens to it
+    # (the en_core_web pipelines give NER its own embedding layer, so usually it does not)
+    needed = {"ner"}
+    if "tok2vec" in nlp.pipe_names and "ner" in getattr(nlp.get_pipe("tok2vec"), "listening_components", []):
+        needed.add("tok2vec")
+    return [name for name in nlp.pipe_names if name not in needed]
+
+
+def read_texts(paths, jsonl=False):
+    # Yields (id, text) pairs lazily. Each non-empty line is one text, or one {"id", "text"} object
+    # with jsonl=True; "-" reads stdin.
+    for path in paths or ["-"]:
+        f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+        try:
+            for line_number, line in enumerate(f, start=1):
+                line = line.rstrip("\n")
+                if not line.strip():
+                    continue
+                if jsonl:
+                    record = json.loads(line)
+                    yield record.get("id", f"{path}:{line_number}"), record["text"]
+                else:
+                    yield f"{path}:{line_number}", line
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+
+def extract_entities_bulk(records, nlp, batch_size=DEFAULT_BATCH_SIZE, n_process=1):
+    # Streams (id, entities) for (id, text) records through nlp.pipe with only NER enabled
+    docs = nlp.pipe(
+        ((text, record_id) for record_id, text in records),
+        as_tuples=True,
+        batch_size=batch_size,
+        n_process=n_process,
+        disable=ner_disabled_components(nlp),
+    )
+    for doc, record_id in docs:
+        yield record_id, entities_from_doc(doc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract named entities from many texts as JSONL.")
+    parser.add_argument("inputs", nargs="*", help="Input files, one text per line ('-' or none for stdin)")
+    parser.add_argument("--jsonl", action="store_true", help='Inputs are JSON lines with "id" and "text"')
+    parser.add_argument("--output", help="Output JSONL file (default: stdout)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--n-process", type=int, default=1, help="Worker processes for nlp.pipe")
+    args = parser.parse_args()
+
+    nlp = load_spacy_model(exclude=NER_EXCLUDE)
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    start = time.perf_counter()
+    count = 0
+    try:
+        for record_id, entities in extract_entities_bulk(read_texts(args.inputs, args.jsonl), nlp,
+                                                         args.batch_size, args.n_process):
+            output.write(json.dumps({"id": record_id, "entities": entities}) + "\n")
+            count += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start
+    print(f"Processed {count} texts in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f} docs/sec)",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+from llm_agents.ner_bulk import NER_EXCLUDE, ner_disabled_components
+from llm_agents.spacy_test_chatbot import entities_from_doc, load_spacy_model
+from llm_agents.tracing import percentile
+
+# A batch is sent to the model when it is full or its oldest request has waited this long
+MAX_BATCH_SIZE = int(os.getenv("NER_MAX_BATCH_SIZE", "64"))
+MAX_WAIT_MS = float(os.getenv("NER_MAX_WAIT_MS", "5"))
+# Texts waiting for a batch; requests that do not fit are refused with a 503 instead of queueing without limit
+MAX_QUEUE_SIZE = int(os.getenv("NER_MAX_QUEUE_SIZE", "1024"))
+
+# Latency samples kept for the percentiles
+LATENCY_WINDOW = 10000
+
+
+class Metrics:
+    def __init__(self):
+        self.latencies_ms = deque(maxlen=LATENCY_WINDOW)
+        self.batch_sizes = Counter()  # power-of-two bucket -> batches
+        self.requests = 0
+        self.rejected = 0  # Requests refused because the queue was full
+
+    def record_batch(self, size):
+        bucket = 1
+        while bucket < size:
+            bucket *= 2
+        self.batch_sizes[bucket] += 1
+
+    def record_latency(self, seconds):
+        self.requests += 1
+        self.latencies_ms.append(seconds * 1000)
+
+    def snapshot(self):
+        return {
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "latency_ms": {
+                "p50": percentile(self.latencies_ms, 0.5),
+                "p99": percentile(self.latencies_ms, 0.99),
+            },
+            "batch_size_histogram": {f"<={bucket}": count for bucket, count in sorted(self.batch_sizes.items())},
+        }
+
+
+class MicroBatcher:
+    # Gathers concurrent requests into batches and runs each batch through nlp.pipe on a worker
+    # thread, so the event loop keeps accepting requests while the model runs
+    def __init__(self, nlp, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, max_queue_size=MAX_QUEUE_SIZE):
+        self.nlp = nlp
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.metrics = Metrics()
+        self._queue = asyncio.Queue(maxsize=max_queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._disabled = ner_disabled_components(nlp)
+
+    async def submit_many(self, texts):
+        # A request is queued whole or not at all: asyncio.QueueFull when there is no room for all its texts
+        if self._queue.maxsize and self._queue.qsize() + len(texts) > self._queue.maxsize:
+            self.metrics.rejected += 1
+            raise asyncio.QueueFull
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._queue.put_nowait((text, future, start))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    async def submit(self, text):
+        (entities,) = await self.submit_many([text])
+        return entities
+
+    def _process(self, texts):
+        return [entities_from_doc(doc) for doc in
+                self.nlp.pipe(texts, batch_size=len(texts), disable=self._disabled)]
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _retry_one_by_one(self, batch):
+        # A failed batch is rerun item by item, so one bad text only fails its own request
+        loop = asyncio.get_running_loop()
+        for text, future, start in batch:
+            if future.done():
+                continue
+            try:
+                (entities,) = await loop.run_in_executor(self._executor, self._process, [text])
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            if not future.done():
+                future.set_result(entities)
+                self.metrics.record_latency(time.perf_counter() - start)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            self.metrics.record_batch(len(batch))
+            try:
+                results = await loop.run_in_executor(self._executor, self._process, [text for text, _, _ in batch])
+            except Exception:
+                await self._retry_one_by_one(batch)
+                continue
+            now = time.perf_counter()
+            for (_, future, start), entities in zip(batch, results):
+                if not future.done():
+                    future.set_result(entities)
+                    self.metrics.record_latency(now - start)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def handle_ner(request):
+    # {"text": "..."} -> {"entities": [...]}, or {"texts": [...]} -> {"results": [[...], ...]}.
+    # 503 with Retry-After when the queue is full.
+    batcher = request.app["batcher"]
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="Request body must be JSON")
+    # Validated before anything joins the shared batch, so a bad request cannot fail other clients'
+    if not isinstance(payload, dict):
+        raise web.HTTPBadRequest(text='Expected a JSON object with "text" or "texts"')
+    if "texts" in payload:
+        texts = payload["texts"]
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            raise web.HTTPBadRequest(text='"texts" must be a list of strings')
+    elif "text" in payload:
+        if not isinstance(payload["text"], str):
+            raise web.HTTPBadRequest(text='"text" must be a string')
+        texts = [payload["text"]]
+    else:
+        raise web.HTTPBadRequest(text='Expected "text" or "texts"')
+    try:
+        results = await batcher.submit_many(texts)
+    except asyncio.QueueFull:
+        raise web.HTTPServiceUnavailable(text="NER queue is full, retry later", headers={"Retry-After": "1"})
+    if "texts" in payload:
+        return web.json_response({"results": results})
+    return web.json_response({"entities": results[0]})
+
+
+async def handle_metrics(request):
+    return web.json_response(request.app["batcher"].metrics.snapshot())
+
+
+async def handle_health(request):
+    return web.json_response({"status": "ok"})
+
+
+async def _start_batcher(app):
+    # The model is loaded once per server, off the event loop
+    nlp = await asyncio.get_running_loop().run_in_executor(None, load_spacy_model, NER_EXCLUDE)
+    app["batcher"] = MicroBatcher(nlp, app["max_batch_size"], app["max_wait_ms"], app["max_queue_size"])
+    app["batcher_task"] = asyncio.create_task(app["batcher"].run())
+
+
+async def _stop_batcher(app):
+    app["batcher_task"].cancel()
+    try:
+        await app["batcher_task"]
+    except asyncio.CancelledError:
+        pass
+    app["batcher"].close()
+
+
+def create_app(max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, max_queue_size=MAX_QUEUE_SIZE):
+    app = web.Application()
+    app["max_batch_size"] = max_batch_size
+    app["max_wait_ms"] = max_wait_ms
+    app["max_queue_size"] = max_queue_size
+    app.on_startup.append(_start_batcher)
+    app.on_cleanup.append(_stop_batcher)
+    app.router.add_post("/ner", handle_ner)
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_get("/health", handle_health)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve spaCy NER over HTTP with micro-batching.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--max-queue-size", type=int, default=MAX_QUEUE_SIZE,
+                        help="Texts waiting for a batch before requests are refused with 503")
+    args = parser.parse_args()
+    web.run_app(create_app(args.max_batch_size, args.max_wait_ms, args.max_queue_size), host=args.host,
+                port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import os
+
+from llm_agents.tracing import span
+
+# Extracted page text is cached on disk, keyed by a hash of the page content and its page number
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+CACHE_DIR = os.getenv("PDF_PAGE_CACHE_DIR", os.path.join(parent_dir, ".cache", "pdf_pages"))
+
+# Pages handed to a worker process in one task
+PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+
+
+def _page_content_bytes(page):
+    from PyPDF2.generic import ArrayObject
+
+    contents = page.get("/Contents")
+    if contents is None:
+        return b""
+    contents = contents.get_object()
+    streams = contents if isinstance(contents, ArrayObject) else [contents]
+    return b"".join(stream.get_object().get_data() for stream in streams)
+
+
+def _font_names(resources):
+    # Fonts decide how glyphs map to text, so a page that only swaps fonts must not hit the cache
+    fonts = resources.get("/Font")
+    if fonts is None:
+        return b""
+    fonts = fonts.get_object()
+    names = [f"{name}={fonts[name].get_object().get('/BaseFont')}" for name in sorted(fonts)]
+    return ";".join(names).encode()
+
+
+def _hash_resources(digest, resources, seen):
+    # Adds the fonts and Form XObjects a content stream can draw with ("/Fm0 Do"), recursing into
+    # each form's own resources. Images carry no text, so only their names are hashed.
+    if resources is None:
+        return
+    resources = resources.get_object()
+    digest.update(_font_names(resources))
+    xobjects = resources.get("/XObject")
+    if xobjects is None:
+        return
+    xobjects = xobjects.get_object()
+    for name in sorted(xobjects):
+        reference = xobjects.raw_get(name)
+        xobject = xobjects[name].get_object()
+        digest.update(f"{name}={xobject.get('/Subtype')};".encode())
+        # Forms shared between pages, or drawing each other, are hashed once per page
+        key = getattr(reference, "idnum", None)
+        if xobject.get("/Subtype") != "/Form" or (key is not None and key in seen):
+            continue
+        if key is not None:
+            seen.add(key)
+        digest.update(xobject.get_data())
+        _hash_resources(digest, xobject.get("/Resources"), seen)
+
+
+# The next two functions run inside worker processes, so they take plain paths and return picklable results
+
+def page_fingerprints(path):
+    from PyPDF2 import PdfReader
+
+    pdf = PdfReader(path)
+    keys = []
+    for number, page in enumerate(pdf.pages):
+        digest = hashlib.sha256(_page_content_bytes(page))
+        _hash_resources(digest, page.get("/Resources"), set())
+        keys.append(f"{digest.hexdigest()}-{number}")
+    return keys
+
+
+def extract_pages(path, page_numbers):
+    from PyPDF2 import PdfReader
+
+    with span("parse_pages", pages=len(page_numbers)):
+        pdf = PdfReader(path)
+        return [(number, pdf.pages[number].extract_text()) for number in page_numbers]
+
+
+def _cache_path(key, cache_dir):
+    return os.path.join(cache_dir, key[:2], f"{key}.txt")
+
+
+def _read_cached_pages(keys, cache_dir):
+    texts = []
+    for key in keys:
+        try:
+            with open(_cache_path(key, cache_dir), encoding="utf-8") as f:
+                texts.append(f.read())
+        except FileNotFoundError:
+            texts.append(None)
+    return texts
+
+
+def _write_cached_page(key, text, cache_dir):
+    path = _cache_path(key, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _missing_page_batches(texts, pages_per_task):
+    missing = [number for number, text in enumerate(texts) if text is None]
+    return [missing[i:i + pages_per_task] for i in range(0, len(missing), pages_per_task)]
+
+
+def _store_and_join(keys, texts, results, cache_dir):
+    for batch in results:
+        for number, text in batch:
+            texts[number] = text
+            _write_cached_page(keys[number], text, cache_dir)
+    return "\n".join(texts)
+
+
+def extract_pdf_text(path, executor=None, cache_dir=CACHE_DIR, pages_per_task=PAGES_PER_TASK):
+    # Synchronous variant; pages are fanned out to the executor when one is given
+    keys = page_fingerprints(path)
+    texts = _read_cached_pages(keys, cache_dir)
+    batches = _missing_page_batches(texts, pages_per_task)
+    if executor is None:
+        results = [extract_pages(path, batch) for batch in batches]
+    else:
+        results = executor.map(extract_pages, [path] * len(batches), batches)
+    return _store_and_join(keys, texts, results, cache_dir)
+
+
+async def extract_pdf_text_async(path, executor, cache_dir=CACHE_DIR, pages_per_task=PAGES_PER_TASK):
+    # Only pages missing from the cache are extracted, in batches spread across the process pool
+    loop = asyncio.get_running_loop()
+    keys = await loop.run_in_executor(executor, page_fingerprints, path)
+    texts = _read_cached_pages(keys, cache_dir)
+    batches = _missing_page_batches(texts, pages_per_task)
+    results = await asyncio.gather(
+        *(loop.run_in_executor(executor, extract_pages, path, batch) for batch in batches)
+    )
+    return _store_and_join(keys, texts, results, cache_dir)
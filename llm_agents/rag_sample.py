@@ -1,56 +1,79 @@
-import csv
+import asyncio
+import io
 import os
 import textwrap
 import ssl
-from io import StringIO
 
-import requests
-import nltk
-from llama_index.core import Document, VectorStoreIndex
-from llama_index.core.node_parser import SimpleNodeParser
-from llama_index.core.text_splitter import TokenTextSplitter
-from llama_index.llms.openai import OpenAI
+from llm_agents.chunking import plan_chunks, split_text
+from llm_agents.llm_cache import CachedCompletionLLM
+from llm_agents.map_reduce import map_reduce_summarize
+from llm_agents.tracing import annotate, span, traced
 
 # Set up OpenAI API key
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Ensure the API key is loaded
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise ValueError("OPENAI_API_KEY not found in environment variables")
 
-# Set up custom SSL context for NLTK
-try:
-    _create_unverified_https_context = ssl._create_unverified_context
-except AttributeError:
-    pass
-else:
-    ssl._create_default_https_context = _create_unverified_https_context
+def _api_key():
+    # Ensure the API key is loaded
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        raise ValueError("OPENAI_API_KEY not found in environment variables")
+    return openai_api_key
 
-# Download NLTK data
-nltk.download('punkt', quiet=True)
+
+def prepare_nltk():
+    import nltk
+
+    # Set up custom SSL context for NLTK
+    try:
+        _create_unverified_https_context = ssl._create_unverified_context
+    except AttributeError:
+        pass
+    else:
+        ssl._create_default_https_context = _create_unverified_https_context
+
+    # Download NLTK data
+    nltk.download('punkt', quiet=True)
 
 # Part 1: Summarization using llama-index
+@traced("summarize")
 def summarize_text(text, method="stuff"):
-    llm = OpenAI(temperature=0, model="gpt-3.5-turbo", api_key=openai_api_key)
-    
+    # method="auto" uses "stuff" when the text fits in one prompt and "map_reduce" otherwise
+    from llama_index.llms.openai import OpenAI
+
+    model = "gpt-3.5-turbo"
+    llm = CachedCompletionLLM(OpenAI(temperature=0, model=model, api_key=_api_key()))
+
+    if method == "auto":
+        method = plan_chunks(text, model).method
+    annotate(method=method)
+
     if method == "stuff":
         response = llm.complete(f"Summarize the following text:\n\n{text}")
     elif method == "map_reduce":
-        # For map_reduce, we'll split the text and summarize each part, then combine
-        splitter = TokenTextSplitter(chunk_size=500, chunk_overlap=50)
-        chunks = splitter.split_text(text)
-        summaries = [str(llm.complete(f"Provide a concise summary of the following text, focusing on key points:\n\n{chunk}")) for chunk in chunks]
-        response = llm.complete(f"Combine the following summaries into a coherent, comprehensive summary. Ensure all key points are included and the summary flows well:\n\n{''.join(summaries)}")
+        # For map_reduce, we'll split the text and summarize the parts concurrently, then combine
+        with span("split") as s:
+            chunks = split_text(text, chunk_tokens=500, overlap_tokens=50, model=model)
+            s.set(chunks=len(chunks))
+
+        async def complete(prompt):
+            return str(await llm.acomplete(prompt))
+
+        response = asyncio.run(map_reduce_summarize(
+            complete,
+            chunks,
+            "Provide a concise summary of the following text, focusing on key points:\n\n{text}",
+            "Combine the following summaries into a coherent, comprehensive summary. Ensure all key points are included and the summary flows well:\n\n{text}",
+        ))
     else:
-        raise ValueError("Invalid method. Choose 'stuff' or 'map_reduce'.")
+        raise ValueError("Invalid method. Choose 'stuff', 'map_reduce' or 'auto'.")
 
     return str(response)
 
-# Example usage
-text = """
+# Example text for the summaries
+SAMPLE_TEXT = """
 Artificial Intelligence (AI) is a rapidly evolving field of computer science focused on creating intelligent machines that can perform tasks that typically require human intelligence. These tasks include visual perception, speech recognition, decision-making, and language translation. AI systems are designed to learn from experience, adjust to new inputs, and perform human-like tasks.
 
 The field of AI can be divided into two main categories: narrow AI and general AI. Narrow AI, also known as weak AI, is designed to perform a specific task, such as voice recognition or playing chess. General AI, also called strong AI or artificial general intelligence (AGI), refers to machines that possess the ability to understand, learn, and apply knowledge across a wide range of tasks at a level equal to or exceeding human capabilities.
@@ -60,54 +83,95 @@ Machine Learning (ML) is a subset of AI that focuses on the development of algor
 AI has numerous applications across various industries, including healthcare (for diagnosis and treatment recommendations), finance (for fraud detection and algorithmic trading), automotive (for self-driving cars), and many more. As AI continues to advance, it promises to revolutionize many aspects of our lives and work, while also raising important ethical and societal questions about its impact and governance.
 """
 
-print("Stuff method summary:")
-print(textwrap.fill(summarize_text(text, "stuff"), width=80))
-
-print("\nMap-reduce method summary:")
-print(textwrap.fill(summarize_text(text, "map_reduce"), width=80))
-
 # Part 2: Simple RAG system using Crunchbase Open Data Map
 
-def fetch_crunchbase_data():
-    url = "https://gist.githubusercontent.com/jmperez/5791045/raw/295862e4b91a93157f84b050bb169940b7f4042d/crunchbase-companies.csv"
-    response = requests.get(url)
-    return response.text
+# URL or local path of the Crunchbase export
+CRUNCHBASE_CSV = os.getenv(
+    "CRUNCHBASE_CSV",
+    "https://gist.githubusercontent.com/jmperez/5791045/raw/295862e4b91a93157f84b050bb169940b7f4042d/crunchbase-companies.csv",
+)
+
+def _read_local_lines(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from f
+
+def fetch_crunchbase_data(source=CRUNCHBASE_CSV, etag=None):
+    # Returns (lazy iterator of CSV lines, etag), or None when the data is unchanged since `etag`.
+    # Nothing is read until the lines are consumed, so the export never has to fit in memory.
+    if not source.startswith("http"):
+        stat = os.stat(source)
+        local_etag = f"{stat.st_size}-{stat.st_mtime_ns}"
+        if local_etag == etag:
+            return None
+        return _read_local_lines(source), local_etag
+
+    import requests
+
+    headers = {"If-None-Match": etag} if etag else {}
+    response = requests.get(source, headers=headers, stream=True)
+    if response.status_code == 304:
+        response.close()
+        return None
+    response.raise_for_status()
+    # Decoded as a text stream with newline="", like the local file, so line endings reach csv unchanged
+    # (including \r\n split across network chunks). gzip transfer encoding is undone first, and auto_close
+    # is off so the wrapper does not see the stream as closed before it has drained its buffer
+    response.raw.decode_content = True
+    response.raw.auto_close = False
+    lines = io.TextIOWrapper(response.raw, encoding=response.encoding or "utf-8", newline="")
+    return lines, response.headers.get("ETag")
 
 def create_rag_system():
-    # Fetch and process the Crunchbase lookup_data
-    csv_data = fetch_crunchbase_data()
-    csv_file = StringIO(csv_data)
-    csv_reader = csv.DictReader(csv_file)
+    from llm_agents.crunchbase_index import CrunchbaseIndex, read_csv_batches
+
+    # Load the persisted index; only rows that are new or changed since the last run get embedded
+    index = CrunchbaseIndex()
+    # Times the request only; the body streams in while the index is updated
+    with span("fetch", source=CRUNCHBASE_CSV):
+        fetched = fetch_crunchbase_data(etag=index.etag if len(index) else None)
+    if fetched is None:
+        print(f"Crunchbase data unchanged, loaded {len(index)} companies from disk.")
+        return index
+
+    lines, etag = fetched
+    stats = index.update(read_csv_batches(lines), etag=etag)
+    print(f"Indexed {len(index)} companies ({stats['embedded']} embedded, {stats['reused']} reused, {stats['removed']} removed).")
+    if stats["duplicates"]:
+        print(f"{stats['duplicates']} rows shared an id with an earlier row and were indexed under a numbered id.")
+    embedding_stats = index.embedding_service.stats()
+    print(f"Embedding: {embedding_stats['texts_embedded']} new, {embedding_stats['cache_hits']} from cache, {embedding_stats['texts_per_sec']:.0f} texts/sec.")
+    return index
 
-    documents = []
-    for row in csv_reader:
-        content = f"Company: {row['name']}\nCategory: {row['category']}\nDescription: {row['description']}"
-        documents.append(Document(text=content))
+def main():
+    from llama_index.llms.openai import OpenAI
 
-    # Parse nodes
-    parser = SimpleNodeParser.from_defaults()
-    nodes = parser.get_nodes_from_documents(documents)
+    _api_key()  # Fail on a missing API key before any work
+    prepare_nltk()
 
-    # Create index
-    index = VectorStoreIndex.from_documents(documents)
+    print("Stuff method summary:")
+    print(textwrap.fill(summarize_text(SAMPLE_TEXT, "stuff"), width=80))
+
+    print("\nMap-reduce method summary:")
+    print(textwrap.fill(summarize_text(SAMPLE_TEXT, "map_reduce"), width=80))
+
+    print("Creating RAG system from Crunchbase lookup_data...")
+    index = create_rag_system()
+
+    # Query the index
+    query_engine = index.as_query_engine()
+    try:
+        response = query_engine.query("What are some popular AI startups?")
+        print("\nRAG Query Result:")
+        print(textwrap.fill(str(response), width=80))
+    except Exception as e:
+        print(f"\nError querying the index: {e}")
+
+    # Example of using chat with the OpenAI model directly
+    llm = CachedCompletionLLM(OpenAI(api_key=_api_key()))
+    chat_response = llm.complete("Tell me about Paul Graham.")
+    print("\nChat Response about Paul Graham:")
+    print(textwrap.fill(str(chat_response), width=80))
 
-    return index
 
-# Example usage
-print("Creating RAG system from Crunchbase lookup_data...")
-index = create_rag_system()
-
-# Query the index
-query_engine = index.as_query_engine()
-try:
-    response = query_engine.query("What are some popular AI startups?")
-    print("\nRAG Query Result:")
-    print(textwrap.fill(str(response), width=80))
-except Exception as e:
-    print(f"\nError querying the index: {e}")
-
-# Example of using chat with the OpenAI model directly
-llm = OpenAI(api_key=openai_api_key)
-chat_response = llm.complete("Tell me about Paul Graham.")
-print("\nChat Response about Paul Graham:")
-print(textwrap.fill(str(chat_response), width=80))
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import os
+import re
+import threading
+from functools import lru_cache
+
+from llm_agents.llm_cache import CACHE_PATH, ResponseCache
+
+# Search results live next to the LLM responses, in their own table, and expire after a day by default
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "86400"))
+
+# Identical searches serialize on one of a fixed set of locks, so memory does not grow with the queries seen
+LOCK_STRIPES = 64
+_key_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+# What the DuckDuckGo wrapper returns when a search finds nothing, often because it was throttled
+NO_RESULT = "No good DuckDuckGo Search Result was found"
+
+
+def normalize_query(query):
+    # Queries that differ only in case, punctuation or spacing share one entry. Word order is kept:
+    # "X acquires Y" and "Y acquires X" are different searches.
+    return " ".join(re.findall(r"\w+", query.lower()))
+
+
+@lru_cache(maxsize=None)
+def get_search_cache():
+    return ResponseCache(path=CACHE_PATH, ttl_seconds=SEARCH_CACHE_TTL_SECONDS, zero_temperature_only=False,
+                         table="search_results")
+
+
+def _lock_for(key):
+    return _key_locks[hash(key) % LOCK_STRIPES]
+
+
+def cacheable_result(result):
+    # Empty and "no result" answers are retried next time instead of being kept for the whole TTL
+    return bool(result and result.strip()) and not result.startswith(NO_RESULT)
+
+
+@lru_cache(maxsize=None)
+def _search_tool_class():
+    # Defined on first use, so importing this module does not import langchain_community
+    from langchain_community.tools import DuckDuckGoSearchRun
+
+    class CachedDuckDuckGoSearchRun(DuckDuckGoSearchRun):
+        # DuckDuckGo search shared by every agent and crew in the process. Concurrent identical
+        # searches wait for the first one instead of all hitting DuckDuckGo.
+        def _run(self, query, run_manager=None):
+            key = f"duckduckgo:{normalize_query(query)}"
+            cache = get_search_cache()
+            with _lock_for(key):
+                cached = cache.get(key)
+                if cached is not None:
+                    return cached
+                result = super()._run(query, run_manager)
+                if cacheable_result(result):
+                    cache.set(key, result)
+                return result
+
+    return CachedDuckDuckGoSearchRun
+
+
+def __getattr__(name):
+    if name == "CachedDuckDuckGoSearchRun":
+        return _search_tool_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,127 @@
+import gc
+import os
+import resource
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import spacy
+
+# Least recently used pipelines are evicted once their combined RSS exceeds this (0 means no limit)
+MEMORY_BUDGET_MB = float(os.getenv("SPACY_MEMORY_BUDGET_MB", "0"))
+
+
+def current_rss_bytes():
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # No /proc (macOS): fall back to the peak RSS, which getrusage reports in bytes there
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _uses_static_vectors(config):
+    if isinstance(config, dict):
+        if config.get("include_static_vectors") is True:
+            return True
+        return any(_uses_static_vectors(value) for value in config.values())
+    return False
+
+
+class LoadedModel:
+    def __init__(self, name, nlp, load_seconds, rss_bytes, vectors_loaded):
+        self.name = name
+        self.nlp = nlp
+        self.load_seconds = load_seconds
+        self.rss_bytes = rss_bytes
+        self.vectors_loaded = vectors_loaded
+
+
+class ModelRegistry:
+    # Loads each (pipeline, excluded components, lazy vectors) combination once per process
+    def __init__(self, memory_budget_mb=MEMORY_BUDGET_MB):
+        self.memory_budget_bytes = memory_budget_mb * 1024 * 1024 if memory_budget_mb else None
+        self._models = OrderedDict()  # key -> LoadedModel, least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, name, exclude=(), lazy_vectors=False):
+        # With lazy_vectors the static vectors stay on disk until ensure_vectors() is called.
+        # Pipelines whose components need the vectors always load them.
+        key = (name, tuple(sorted(exclude)), lazy_vectors)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key].nlp
+
+            rss_before = current_rss_bytes()
+            start = time.perf_counter()
+            nlp = _load(name, [*exclude, "vectors"] if lazy_vectors else list(exclude))
+            vectors_loaded = not lazy_vectors
+            if lazy_vectors and _uses_static_vectors(
+                    {component: nlp.config["components"].get(component) for component in nlp.pipe_names}):
+                _load_vectors(nlp)
+                vectors_loaded = True
+            model = LoadedModel(name, nlp, time.perf_counter() - start,
+                                max(0, current_rss_bytes() - rss_before), vectors_loaded)
+            self._models[key] = model
+            self._evict_over_budget()
+            return nlp
+
+    def ensure_vectors(self, nlp):
+        with self._lock:
+            for model in self._models.values():
+                if model.nlp is nlp and not model.vectors_loaded:
+                    rss_before = current_rss_bytes()
+                    _load_vectors(nlp)
+                    model.rss_bytes += max(0, current_rss_bytes() - rss_before)
+                    model.vectors_loaded = True
+        return nlp
+
+    def _evict_over_budget(self):
+        # The newest model is never evicted, even when it alone is over budget.
+        # Freed memory may stay in the allocator, so RSS can lag behind evictions.
+        if self.memory_budget_bytes is None:
+            return
+        while len(self._models) > 1 and sum(m.rss_bytes for m in self._models.values()) > self.memory_budget_bytes:
+            _, evicted = self._models.popitem(last=False)
+            print(f"Evicting spaCy model {evicted.name} to stay within the memory budget")
+            del evicted
+            gc.collect()
+
+    def stats(self):
+        with self._lock:
+            return [
+                {
+                    "model": model.name,
+                    "exclude": list(key[1]),
+                    "load_seconds": model.load_seconds,
+                    "rss_mb": model.rss_bytes / (1024 * 1024),
+                    "vectors_loaded": model.vectors_loaded,
+                }
+                for key, model in self._models.items()
+            ]
+
+
+def _load(name, exclude):
+    try:
+        return spacy.load(name, exclude=exclude)
+    except OSError:
+        print(f"Model {name} not found. Downloading...")
+        spacy.cli.download(name)
+        return spacy.load(name, exclude=exclude)
+
+
+def _load_vectors(nlp):
+    nlp.vocab.vectors.from_disk(nlp._path / "vocab", exclude=["strings"])
+
+
+registry = ModelRegistry()
+
+
+def get_model(name, exclude=(), lazy_vectors=False):
+    return registry.get(name, exclude, lazy_vectors)
@@ -1,17 +1,16 @@
-import spacy
+from llm_agents.spacy_models import get_model
 
 
-def load_spacy_model():
-    try:
-        return spacy.load("en_core_web_md")
-    except OSError:
-        print("Model 'en_core_web_md' not found. Downloading...")
-        spacy.cli.download("en_core_web_md")
-        return spacy.load("en_core_web_md")
+def load_spacy_model(exclude=()):
+    # Loaded once per process through the shared model registry
+    return get_model("en_core_web_md", exclude=exclude)
+
+def entities_from_doc(doc):
+    return [{"text": ent.text, "label": ent.label_} for ent in doc.ents]
 
 def get_named_entities(text, nlp, entity_type):
     doc = nlp(text)
-    entities = [{"text": ent.text, "label": ent.label_} for ent in doc.ents]
+    entities = entities_from_doc(doc)
     return entities
 
 def main():
@@ -1,52 +1,129 @@
+import argparse
+import os
+
 import numpy as np
-import spacy
+from spacy.attrs import ORTH
+
+from llm_agents.spacy_models import get_model, registry
+from llm_agents.vector_neighbors import get_index
+
+# Columns of the per-token statistics matrix
+STAT_COLUMNS = ("min", "max", "mean", "std")
 
 
 def load_model(model_name):
-    try:
-        return spacy.load(model_name)
-    except OSError:
-        print(f"Model {model_name} not found. Downloading...")
-        spacy.cli.download(model_name)
-        return spacy.load(model_name)
-
-def process_text(nlp, text):
+    # Loaded once per process through the shared model registry (set SPACY_MEMORY_BUDGET_MB to evict)
+    return get_model(model_name)
+
+def token_vector_matrix(doc):
+    # (n_tokens, dim) float32 matrix equal to stacking token.vector, built with one table lookup
+    vectors = doc.vocab.vectors
+    if vectors.size == 0:
+        # Pipelines without static vectors (e.g. en_core_web_sm) fall back to the context tensor, like Token.vector
+        if doc.tensor.size == 0:
+            return np.zeros((len(doc), 0), dtype=np.float32)
+        return np.asarray(doc.tensor, dtype=np.float32)
+
+    rows = np.asarray(vectors.find(keys=doc.to_array([ORTH]).ravel()))
+    table = vectors.data
+    table = table.get() if hasattr(table, "get") else table  # cupy arrays live on the GPU
+    matrix = np.zeros((len(doc), table.shape[1]), dtype=np.float32)
+    found = rows >= 0
+    matrix[found] = table[rows[found]]
+    return matrix
+
+def vector_statistics(matrix):
+    # Per-token statistics as an (n_tokens, 4) matrix in STAT_COLUMNS order, plus global ones
+    if not matrix.size:
+        zeros = np.zeros(matrix.shape[1], dtype=np.float32)
+        return np.zeros((len(matrix), len(STAT_COLUMNS)), dtype=np.float32), zeros, dict.fromkeys(STAT_COLUMNS, 0.0)
+    token_stats = np.stack(
+        [matrix.min(axis=1), matrix.max(axis=1), matrix.mean(axis=1), matrix.std(axis=1)], axis=1
+    )
+    global_stats = {
+        "min": float(matrix.min()),
+        "max": float(matrix.max()),
+        "mean": float(matrix.mean()),
+        "std": float(matrix.std()),
+    }
+    return token_stats, matrix.mean(axis=0), global_stats
+
+def write_report(output_dir, model_name, tokens, matrix, token_stats, output_format="npy"):
+    # Writes the numbers as arrays instead of formatted text; returns the paths written
+    os.makedirs(output_dir, exist_ok=True)
+    prefix = os.path.join(output_dir, model_name)
+    if output_format == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output needs pyarrow: pip install pyarrow")
+        columns = {"token": pa.array(tokens)}
+        for i, name in enumerate(STAT_COLUMNS):
+            columns[name] = pa.array(token_stats[:, i])
+        columns["vector"] = pa.FixedSizeListArray.from_arrays(pa.array(matrix.ravel()), matrix.shape[1])
+        path = f"{prefix}_tokens.parquet"
+        pq.write_table(pa.table(columns), path)
+        return [path]
+
+    paths = [f"{prefix}_token_vectors.npy", f"{prefix}_token_stats.npy", f"{prefix}_tokens.txt"]
+    np.save(paths[0], matrix)
+    np.save(paths[1], token_stats)
+    with open(paths[2], "w", encoding="utf-8") as f:
+        f.writelines(f"{token}\n" for token in tokens)
+    return paths
+
+def process_text(nlp, text, report="full", output_dir=None, output_format="npy", neighbors=0):
+    # report="full" prints every vector as before; report="compact" prints only the global statistics
     doc = nlp(text)
+    matrix = token_vector_matrix(doc)
+    token_stats, doc_vector, global_stats = vector_statistics(matrix)
+
     print(f"\nModel: {nlp.meta['name']}")
     print(f"Model name: {nlp.meta['name']}")
     print(f"Vector dimension: {nlp.vocab.vectors.shape[1]}")
-    
-    print("\nTokens (index: token):")
-    for i, token in enumerate(doc):
-        print(f"{i}: {token.text}")
-    
-    print("\nToken vectors:")
-    all_vectors = []
-    for token in doc:
-        vector = token.vector
-        all_vectors.append(vector)
-        vector_rounded = [round(float(x), 4) for x in vector]
-        print(f"{token.text}: {vector_rounded}")
-        
-        # Print vector statistics
-        print(f"  Min: {np.min(vector):.4f}")
-        print(f"  Max: {np.max(vector):.4f}")
-        print(f"  Mean: {np.mean(vector):.4f}")
-        print(f"  Standard deviation: {np.std(vector):.4f}")
-    
-    doc_vector = doc.vector
-    mean_vector = [round(float(x), 4) for x in doc_vector]
-    print("\nMean document vector:")
-    print(mean_vector)
-    
+
+    if report == "full":
+        print("\nTokens (index: token):")
+        for i, token in enumerate(doc):
+            print(f"{i}: {token.text}")
+
+        print("\nToken vectors:")
+        rounded = np.round(matrix.astype(np.float64), 4).tolist()
+        for token, vector_rounded, (low, high, mean, std) in zip(doc, rounded, token_stats):
+            print(f"{token.text}: {vector_rounded}")
+
+            # Print vector statistics
+            print(f"  Min: {low:.4f}")
+            print(f"  Max: {high:.4f}")
+            print(f"  Mean: {mean:.4f}")
+            print(f"  Standard deviation: {std:.4f}")
+
+        print("\nMean document vector:")
+        print(np.round(doc_vector.astype(np.float64), 4).tolist())
+    else:
+        print(f"Tokens: {len(doc)}")
+
     # Print overall statistics
-    all_vectors = np.array(all_vectors)
     print("\nOverall vector statistics:")
-    print(f"Global min: {np.min(all_vectors):.4f}")
-    print(f"Global max: {np.max(all_vectors):.4f}")
-    print(f"Global mean: {np.mean(all_vectors):.4f}")
-    print(f"Global standard deviation: {np.std(all_vectors):.4f}")
-    
+    print(f"Global min: {global_stats['min']:.4f}")
+    print(f"Global max: {global_stats['max']:.4f}")
+    print(f"Global mean: {global_stats['mean']:.4f}")
+    print(f"Global standard deviation: {global_stats['std']:.4f}")
+
+    if output_dir:
+        paths = write_report(output_dir, nlp.meta['name'], [token.text for token in doc], matrix, token_stats,
+                             output_format)
+        print(f"\nWrote {', '.join(paths)}")
+
+    if neighbors and nlp.vocab.vectors.size:
+        # Closest vocabulary words to each token and to the mean document vector
+        index = get_index(nlp)
+        print(f"\nNearest vocabulary words (top {neighbors}):")
+        results = index.search(np.vstack([matrix, doc_vector]), neighbors)
+        for label, neighbours in zip([token.text for token in doc] + ["<document>"], results):
+            print(f"{label}: " + ", ".join(f"{word} ({score:.3f})" for word, score in neighbours))
+
     print("\nVectorization method:")
     if "word2vec" in nlp.meta['description'].lower():
         print("Word2Vec")
@@ -54,23 +131,35 @@ def process_text(nlp, text):
         print("GloVe")
     else:
         print("Unknown (check model description)")
-    
+
     print(f"\nModel description: {nlp.meta['description']}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Report spaCy token vectors and their statistics.")
+    parser.add_argument("--models", nargs="+", default=["en_core_web_sm", "en_core_web_md", "en_core_web_lg"])
+    parser.add_argument("--report", choices=["full", "compact"], default="full",
+                        help="'compact' skips printing tokens and vectors")
+    parser.add_argument("--output-dir", help="Write token vectors and statistics as arrays to this directory")
+    parser.add_argument("--format", choices=["npy", "parquet"], default="npy")
+    parser.add_argument("--neighbors", type=int, default=0,
+                        help="Print this many nearest vocabulary words per token (models with vectors only)")
+    args = parser.parse_args()
+
     # Define the text
     text = "The patient presents with acute myocardial infarction."
-    
+
     print("Original text:")
     print(text)
-    
-    # Load and process with all three models
-    models = ["en_core_web_sm", "en_core_web_md", "en_core_web_lg"]
-    
-    for model_name in models:
+
+    # Load and process with each model
+    for model_name in args.models:
         nlp = load_model(model_name)
-        process_text(nlp, text)
+        process_text(nlp, text, args.report, args.output_dir, args.format, args.neighbors)
         print("\n" + "="*50 + "\n")
 
+    print("Model load statistics:")
+    for stats in registry.stats():
+        print(f"{stats['model']}: {stats['load_seconds']:.2f}s, {stats['rss_mb']:.0f} MB RSS")
+
 if __name__ == "__main__":
     main()
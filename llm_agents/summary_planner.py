@@ -0,0 +1,312 @@
+import hashlib
+import os
+import time
+
+from llm_agents.chunking import count_tokens, plan_chunks
+from llm_agents.map_reduce import (EXPECTED_OUTPUT_TOKENS, REDUCE_GROUP_TOKENS, gather_or_cancel, group_by_tokens,
+                                   map_concurrently)
+from llm_agents.tracing import span
+
+# "stuff", "map_reduce", "both", or "auto" (stuff when the document fits in one prompt, else map_reduce)
+STRATEGY = os.getenv("SUMMARY_STRATEGY", "both")
+STRATEGIES = ("stuff", "map_reduce", "both", "auto")
+
+# Fraction of documents that get the stuff vs map-reduce comparison when both strategies run
+COMPARE_SAMPLE_RATE = float(os.getenv("SUMMARY_COMPARE_SAMPLE_RATE", "1.0"))
+
+# Per-document caps; 0 means no cap. Work stops before a call that could exceed either one.
+MAX_TOKENS_PER_DOCUMENT = int(os.getenv("SUMMARY_MAX_TOKENS", "0"))
+MAX_DOLLARS_PER_DOCUMENT = float(os.getenv("SUMMARY_MAX_DOLLARS", "0"))
+
+# USD per million (input, output) tokens
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4": (30.00, 60.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+# Same prompt LangChain's summarize chains use, applied to the stuff, map and combine steps
+SUMMARY_PROMPT = """Write a concise summary of the following:
+
+
+"{text}"
+
+
+CONCISE SUMMARY:"""
+
+# Writes the stuff summary and compares it with the map-reduce one in a single call
+COMPARATIVE_PROMPT = """Write a concise summary of the following document. Then compare your summary with the \
+map-reduce summary below, which was written by summarizing the document in chunks and combining the results. \
+Analyze the differences in content, detail, and overall effectiveness for understanding the document.
+
+Document:
+"{text}"
+
+Map-reduce summary:
+{map_reduce_summary}
+
+Answer in exactly this format:
+SUMMARY:
+<your summary>
+COMPARISON:
+<your comparison>"""
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+class StageStats:
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.seconds = 0.0
+        self.resumed = 0  # Responses taken from a checkpoint instead of calling the model
+
+
+class UsageTracker:
+    # Counts calls, tokens and latency per stage, and enforces the per-document budget.
+    # Each call reserves its estimated cost first, so concurrent map calls cannot overshoot together.
+    # With a checkpoint (see job_queue.StageCheckpoint), resume() returns saved responses and tracked calls save new ones.
+    def __init__(self, model, max_tokens=MAX_TOKENS_PER_DOCUMENT, max_dollars=MAX_DOLLARS_PER_DOCUMENT, limiter=None,
+                 checkpoint=None):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.max_dollars = max_dollars
+        self.limiter = limiter
+        self.checkpoint = checkpoint
+        self.stages = {}
+        self._reserved_tokens = 0
+        self._reserved_dollars = 0.0
+
+    def cost(self, input_tokens, output_tokens):
+        input_price, output_price = MODEL_PRICES.get(self.model, (0.0, 0.0))
+        return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+    @property
+    def total_tokens(self):
+        return sum(stats.input_tokens + stats.output_tokens for stats in self.stages.values())
+
+    @property
+    def total_dollars(self):
+        return sum(self.cost(stats.input_tokens, stats.output_tokens) for stats in self.stages.values())
+
+    def estimate(self, input_tokens, calls=1):
+        # Tokens and dollars of `calls` calls sending this many prompt tokens in total
+        output_tokens = calls * EXPECTED_OUTPUT_TOKENS
+        return input_tokens + output_tokens, self.cost(input_tokens, output_tokens)
+
+    def fits(self, input_tokens, calls=1):
+        tokens, dollars = self.estimate(input_tokens, calls)
+        if self.max_tokens and self.total_tokens + self._reserved_tokens + tokens > self.max_tokens:
+            return False
+        if self.max_dollars and self.total_dollars + self._reserved_dollars + dollars > self.max_dollars:
+            return False
+        return True
+
+    def check(self, input_tokens, calls=1):
+        if not self.fits(input_tokens, calls):
+            limits = [f"{self.max_tokens} tokens" if self.max_tokens else None,
+                      f"${self.max_dollars:.4f}" if self.max_dollars else None]
+            raise BudgetExceeded(f"per-document budget of {' / '.join(filter(None, limits))} reached")
+        return self.estimate(input_tokens, calls)
+
+    def tracked(self, stage, call):
+        stats = self.stages.setdefault(stage, StageStats())
+
+        async def tracked_call(prompt):
+            input_tokens = count_tokens(prompt, self.model)
+            tokens, dollars = self.check(input_tokens)
+            self._reserved_tokens += tokens
+            self._reserved_dollars += dollars
+            start = time.perf_counter()
+            with span(stage, model=self.model, tokens_in=input_tokens) as s:
+                try:
+                    response = await call(prompt)
+                finally:
+                    self._reserved_tokens -= tokens
+                    self._reserved_dollars -= dollars
+                output_tokens = count_tokens(response, self.model)
+                s.set(tokens_out=output_tokens)
+            stats.seconds += time.perf_counter() - start
+            stats.calls += 1
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+            if self.checkpoint is not None:
+                self.checkpoint.put(stage, prompt, response)
+            return response
+
+        return tracked_call
+
+    def resume(self, stage, prompts):
+        # Saved responses for `prompts`, None where the model still has to be called
+        if self.checkpoint is None:
+            return [None] * len(prompts)
+        saved = [self.checkpoint.get(stage, prompt) for prompt in prompts]
+        self.stages.setdefault(stage, StageStats()).resumed += sum(response is not None for response in saved)
+        return saved
+
+    def report(self):
+        lines = [f"{'stage':<12} {'calls':>6} {'in tokens':>10} {'out tokens':>11} {'latency s':>10}"]
+        for stage, stats in self.stages.items():
+            if not stats.calls:
+                continue
+            lines.append(f"{stage:<12} {stats.calls:>6} {stats.input_tokens:>10} {stats.output_tokens:>11} "
+                         f"{stats.seconds:>10.2f}")
+        lines.append(f"Total: {sum(s.calls for s in self.stages.values())} calls, {self.total_tokens} tokens, "
+                     f"${self.total_dollars:.4f}")
+        resumed = sum(s.resumed for s in self.stages.values())
+        if resumed:
+            lines.append(f"Resumed: {resumed} responses from the checkpoint")
+        return "\n".join(lines)
+
+
+class SummaryResult:
+    def __init__(self, tracker):
+        self.stuff_summary = None
+        self.map_reduce_summary = None
+        self.comparison = None
+        self.stopped = None  # Why work stopped early, if it did
+        self.tracker = tracker
+
+
+def should_compare(source, sample_rate=COMPARE_SAMPLE_RATE):
+    # Deterministic per source, so re-runs compare the same documents
+    digest = int(hashlib.sha256(source.encode("utf-8")).hexdigest()[:8], 16)
+    return digest < sample_rate * 0x100000000
+
+
+def parse_comparative(response):
+    summary, marker, comparison = response.partition("COMPARISON:")
+    summary = summary.strip()
+    if summary.startswith("SUMMARY:"):
+        summary = summary[len("SUMMARY:"):].strip()
+    return summary, comparison.strip() if marker else None
+
+
+def _fit_budget(tracker, plan, run_stuff, run_map_reduce, compare):
+    # Drops work, most expensive combination first, until the estimated cost fits the budget
+    overhead = count_tokens(SUMMARY_PROMPT.format(text=""), tracker.model)
+    stuff = (plan.total_tokens + overhead, 1)
+    chunk_count = len(plan.chunks)
+    reduce_calls = 1 if chunk_count > 1 else 0
+    map_reduce = (sum(plan.chunk_tokens) + chunk_count * overhead
+                  + reduce_calls * (chunk_count * EXPECTED_OUTPUT_TOKENS + overhead), chunk_count + reduce_calls)
+    if chunk_count == 1:
+        both = stuff  # One shared call, see summarize()
+    else:
+        # The comparison replaces the stuff call and also sends the map-reduce summary
+        both = (stuff[0] + map_reduce[0] + (EXPECTED_OUTPUT_TOKENS if compare else 0), stuff[1] + map_reduce[1])
+
+    candidates = []
+    if run_stuff and run_map_reduce:
+        candidates.append(((True, True, compare), both))
+    if run_stuff:
+        candidates.append(((True, False, False), stuff))
+    if run_map_reduce:
+        candidates.append(((False, True, False), map_reduce))
+    for choice, (input_tokens, calls) in candidates:
+        if tracker.fits(input_tokens, calls):
+            return choice
+    return False, False, False
+
+
+async def _call_stage(tracker, stage, call, prompts, responses=None):
+    # Checkpointed prompts are answered before the rate limiter is asked for tokens,
+    # so a resumed job spends neither model calls nor limiter capacity on them
+    if responses is None:
+        responses = tracker.resume(stage, prompts)
+    missing = [i for i, response in enumerate(responses) if response is None]
+    calls = await map_concurrently(tracker.tracked(stage, call), [prompts[i] for i in missing], tracker.limiter)
+    for i, response in zip(missing, calls):
+        responses[i] = response
+    return responses
+
+
+async def _call_once(tracker, stage, call, prompt):
+    (response,) = await _call_stage(tracker, stage, call, [prompt])
+    return response
+
+
+async def _map_reduce(tracker, call, plan):
+    if not plan.chunks:
+        return ""
+    prompts = [SUMMARY_PROMPT.format(text=chunk) for chunk in plan.chunks]
+    summaries = tracker.resume("map", prompts)
+    missing = [i for i, summary in enumerate(summaries) if summary is None]
+    tracker.check(sum(plan.chunk_tokens[i] for i in missing)
+                  + len(missing) * count_tokens(SUMMARY_PROMPT.format(text=""), tracker.model), calls=len(missing))
+    summaries = await _call_stage(tracker, "map", call, prompts, summaries)
+    # A single chunk needs no combine step: its map summary is the result.
+    # Otherwise reduce level by level as map_reduce.hierarchical_reduce does, resuming each level from the checkpoint.
+    while len(summaries) > 1:
+        groups = group_by_tokens(summaries, REDUCE_GROUP_TOKENS)
+        summaries = await _call_stage(tracker, "reduce", call,
+                                      [SUMMARY_PROMPT.format(text="\n\n".join(group)) for group in groups])
+    return summaries[0]
+
+
+async def summarize(call, text, source, model, strategy=STRATEGY, compare_sample_rate=COMPARE_SAMPLE_RATE,
+                    max_tokens=MAX_TOKENS_PER_DOCUMENT, max_dollars=MAX_DOLLARS_PER_DOCUMENT, limiter=None,
+                    plan=None, checkpoint=None):
+    # `call` is an async function taking a prompt string and returning the completion text.
+    # Runs only the requested strategies, shares work between them where the prompts coincide,
+    # and folds the comparison into the stuff call for sampled documents.
+    # A saved `plan` skips re-tokenizing the text; `checkpoint` makes LLM responses resumable.
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy!r}; choose one of {', '.join(STRATEGIES)}")
+    tracker = UsageTracker(model, max_tokens, max_dollars, limiter, checkpoint)
+    result = SummaryResult(tracker)
+    if not text.strip():
+        # Nothing to summarize, e.g. a scanned PDF without a text layer
+        result.stopped = "the document has no text"
+        return result
+    if plan is None:
+        with span("split", source=source) as s:
+            plan = plan_chunks(text, model)
+            s.set(chunks=len(plan.chunks), tokens=plan.total_tokens, method=plan.method)
+
+    run_stuff = strategy in ("stuff", "both") or (strategy == "auto" and plan.method == "stuff")
+    run_map_reduce = strategy in ("map_reduce", "both") or (strategy == "auto" and plan.method == "map_reduce")
+    if run_stuff and plan.method != "stuff":
+        print(f"{source}: {plan.total_tokens} tokens is too many for the 'stuff' method; using map-reduce")
+        run_stuff, run_map_reduce = False, True
+
+    compare = run_stuff and run_map_reduce and len(plan.chunks) > 1 and should_compare(source, compare_sample_rate)
+    if max_tokens or max_dollars:
+        planned = (run_stuff, run_map_reduce, compare)
+        run_stuff, run_map_reduce, compare = _fit_budget(tracker, plan, *planned)
+        if not (run_stuff or run_map_reduce):
+            result.stopped = "no strategy fits the per-document budget"
+            return result
+        if (run_stuff, run_map_reduce, compare) != planned:
+            print(f"{source}: reduced the plan to fit the per-document budget")
+
+    stuff_prompt = SUMMARY_PROMPT.format(text=text)
+    try:
+        if run_stuff and run_map_reduce and len(plan.chunks) == 1:
+            # The stuff prompt and the only map prompt are identical, so one call serves both
+            result.map_reduce_summary = await _map_reduce(tracker, call, plan)
+            result.stuff_summary = result.map_reduce_summary
+        elif run_stuff and run_map_reduce and compare:
+            result.map_reduce_summary = await _map_reduce(tracker, call, plan)
+            response = await _call_once(
+                tracker, "compare", call,
+                COMPARATIVE_PROMPT.format(text=text, map_reduce_summary=result.map_reduce_summary),
+            )
+            result.stuff_summary, result.comparison = parse_comparative(response)
+        elif run_stuff and run_map_reduce:
+            result.stuff_summary, result.map_reduce_summary = await gather_or_cancel(
+                _call_once(tracker, "stuff", call, stuff_prompt),
+                _map_reduce(tracker, call, plan),
+            )
+        elif run_stuff:
+            result.stuff_summary = await _call_once(tracker, "stuff", call, stuff_prompt)
+        else:
+            result.map_reduce_summary = await _map_reduce(tracker, call, plan)
+    except BudgetExceeded as e:
+        result.stopped = str(e)
+    return result
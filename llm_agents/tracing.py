@@ -0,0 +1,307 @@
+import argparse
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import os
+import threading
+import time
+
+# Spans are appended as JSON lines to the file named by LLM_TRACE; tracing is off when it is unset.
+# Worker processes inherit the variable and append to the same file.
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+TRACE_PATH = os.getenv("LLM_TRACE", "")
+
+# Comma-separated span names to profile while tracing, e.g. "parse_pages,split"
+PROFILE_STAGES = frozenset(filter(None, os.getenv("LLM_TRACE_PROFILE", "").split(",")))
+PROFILER = os.getenv("LLM_TRACE_PROFILER", "cprofile")  # "cprofile" or "pyinstrument"
+PROFILE_DIR = os.getenv("LLM_TRACE_PROFILE_DIR", os.path.join(parent_dir, ".cache", "profiles"))
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_ids = itertools.count(1)
+_tracer = None
+
+
+class Tracer:
+    def __init__(self, path, profile_stages=PROFILE_STAGES, profiler=PROFILER, profile_dir=PROFILE_DIR):
+        self.path = path
+        self.profile_stages = profile_stages
+        self.profiler = profiler
+        self.profile_dir = profile_dir
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None
+        self._profiling = threading.local()
+
+    def write(self, record):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            # Reopened after a fork, so each process appends whole lines through its own handle
+            if self._pid != os.getpid():
+                directory = os.path.dirname(os.path.abspath(self.path))
+                os.makedirs(directory, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+                self._pid = os.getpid()
+            self._file.write(line)
+            self._file.flush()
+
+    def start_profile(self, span):
+        # Only one profiler per thread; a nested profiled span is traced but not profiled
+        if span.name not in self.profile_stages or getattr(self._profiling, "active", False):
+            return None
+        self._profiling.active = True
+        if self.profiler == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                self._profiling.active = False
+                raise ImportError("LLM_TRACE_PROFILER=pyinstrument needs pyinstrument: pip install pyinstrument")
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+        else:
+            import cProfile
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profiler
+
+    def stop_profile(self, span, profiler):
+        # cProfile output opens with `python -m pstats` or snakeviz; pyinstrument's is a standalone HTML page
+        self._profiling.active = False
+        os.makedirs(self.profile_dir, exist_ok=True)
+        prefix = os.path.join(self.profile_dir, f"{span.name}-{span.id}")
+        if self.profiler == "pyinstrument":
+            profiler.stop()
+            path = f"{prefix}.html"
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+        else:
+            profiler.disable()
+            path = f"{prefix}.prof"
+            profiler.dump_stats(path)
+        span.attrs["profile"] = path
+
+
+class Span:
+    # Wall time of one stage, plus attributes such as tokens_in, tokens_out, retries and cache_hits
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        # Unique across processes, so spans from pool workers can be merged into one trace
+        self.id = f"{os.getpid()}-{next(_ids)}"
+        self.parent = None
+        self.started = None
+        self._token = None
+        self._start = None
+        self._profiler = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key, value=1):
+        self.attrs[key] = self.attrs.get(key, 0) + value
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.parent = parent.id if parent else None
+        self._token = _current_span.set(self)
+        self._profiler = self.tracer.start_profile(self)
+        self.started = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        if self._profiler is not None:
+            self.tracer.stop_profile(self, self._profiler)
+        _current_span.reset(self._token)
+        record = {
+            "name": self.name,
+            "id": self.id,
+            "parent": self.parent,
+            "start": self.started,
+            "duration": duration,
+            "pid": os.getpid(),
+            "thread": threading.get_ident(),
+            "attrs": self.attrs,
+        }
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        self.tracer.write(record)
+        return False
+
+
+class _NoopSpan:
+    # Returned while tracing is off, so instrumented code pays one function call per span
+    def set(self, **attrs):
+        pass
+
+    def add(self, key, value=1):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def enable(path=TRACE_PATH, **options):
+    global _tracer
+    _tracer = Tracer(path, **options) if path else None
+    return _tracer
+
+
+def enabled():
+    return _tracer is not None
+
+
+def span(name, **attrs):
+    # with span("fetch", source=url) as s: ...; s.set(bytes=n)
+    if _tracer is None:
+        return NOOP_SPAN
+    return Span(_tracer, name, attrs)
+
+
+def traced(name=None, **attrs):
+    # Decorator form of span() for plain and async functions; the name defaults to the function's
+    def decorate(func):
+        span_name = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _tracer is None:
+                    return await func(*args, **kwargs)
+                with Span(_tracer, span_name, dict(attrs)):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with Span(_tracer, span_name, dict(attrs)):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def annotate(**attrs):
+    # Sets attributes on the innermost open span, if any
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def count(key, value=1):
+    # Adds to a counter on the innermost open span, if any
+    current = _current_span.get()
+    if current is not None:
+        current.add(key, value)
+
+
+def count_retry(retry_state):
+    # tenacity before_sleep hook: counts retries on the span the retried call runs in
+    count("retries")
+
+
+def wrap_context(func):
+    # Carries the current span into a thread pool task, so its spans keep their parent
+    context = contextvars.copy_context()
+    return functools.partial(context.run, func)
+
+
+# Reading traces back
+
+def read_spans(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(samples, fraction):
+    # Nearest-rank percentile, e.g. percentile(latencies, 0.99); 0.0 when there are no samples
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def to_chrome_trace(spans):
+    # Complete ("X") events for chrome://tracing and Perfetto; times are in microseconds
+    events = []
+    for record in spans:
+        events.append({
+            "name": record["name"],
+            "cat": "llm_agents",
+            "ph": "X",
+            "ts": record["start"] * 1e6,
+            "dur": record["duration"] * 1e6,
+            "pid": record["pid"],
+            "tid": record["thread"],
+            "args": dict(record["attrs"], **({"error": record["error"]} if "error" in record else {})),
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+SUMMARY_COUNTERS = ("tokens_in", "tokens_out", "retries", "cache_hits", "limiter_wait")
+
+
+def summarize_spans(spans):
+    # Per span name: count, errors, total/p50/p95 seconds and the summed counters, slowest total first
+    by_name = {}
+    for record in spans:
+        by_name.setdefault(record["name"], []).append(record)
+    rows = []
+    for name, records in by_name.items():
+        durations = sorted(record["duration"] for record in records)
+        row = {
+            "name": name,
+            "count": len(records),
+            "errors": sum("error" in record for record in records),
+            "total": sum(durations),
+            "p50": durations[int(0.5 * (len(durations) - 1))],
+            "p95": durations[int(0.95 * (len(durations) - 1))],
+        }
+        for key in SUMMARY_COUNTERS:
+            row[key] = sum(record["attrs"].get(key) or 0 for record in records)
+        rows.append(row)
+    return sorted(rows, key=lambda row: row["total"], reverse=True)
+
+
+def print_summary(rows):
+    print(f"{'span':<20} {'count':>6} {'errors':>6} {'total s':>9} {'p50 s':>8} {'p95 s':>8} {'tokens in':>10} "
+          f"{'tokens out':>10} {'retries':>7} {'cache hits':>10} {'wait s':>8}")
+    for row in rows:
+        print(f"{row['name']:<20} {row['count']:>6} {row['errors']:>6} {row['total']:>9.2f} {row['p50']:>8.3f} "
+              f"{row['p95']:>8.3f} {row['tokens_in']:>10} {row['tokens_out']:>10} {row['retries']:>7} "
+              f"{row['cache_hits']:>10} {row['limiter_wait']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a span trace written with LLM_TRACE.")
+    parser.add_argument("trace", help="JSONL trace file")
+    parser.add_argument("--chrome", metavar="JSON", help="Also write the spans in Chrome trace format")
+    args = parser.parse_args()
+
+    spans = read_spans(args.trace)
+    print_summary(summarize_spans(spans))
+    if args.chrome:
+        with open(args.chrome, "w", encoding="utf-8") as f:
+            json.dump(to_chrome_trace(spans), f)
+        print(f"\nWrote {len(spans)} spans to {args.chrome}; open it in chrome://tracing or ui.perfetto.dev")
+
+
+enable()
+
+if __name__ == "__main__":
+    main()
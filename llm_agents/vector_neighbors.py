@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from llm_agents.spacy_models import get_model, registry
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+INDEX_DIR = os.getenv("SPACY_NEIGHBORS_DIR", os.path.join(parent_dir, ".cache", "spacy_vectors"))
+# Queries per matrix product; the score block is QUERY_BATCH_SIZE x vocabulary rows of float32
+QUERY_BATCH_SIZE = int(os.getenv("SPACY_NEIGHBORS_QUERY_BATCH", "64"))
+BUILD_CHUNK_ROWS = 65536
+
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.f32"
+WORDS_FILE = "words.json"
+
+
+def index_path(nlp, index_dir=INDEX_DIR):
+    meta = nlp.meta
+    return os.path.join(index_dir, f"{meta['lang']}_{meta['name']}-{meta['version']}")
+
+
+def _row_words(nlp):
+    # One word per vectors row. Pruned tables (e.g. en_core_web_md) map many keys to a row;
+    # the first key is the word the row was trained for, the rest were remapped onto it.
+    vectors = nlp.vocab.vectors
+    words = [None] * vectors.shape[0]
+    for key, row in vectors.key2row.items():
+        if words[row] is None:
+            try:
+                words[row] = nlp.vocab.strings[key]
+            except KeyError:
+                words[row] = str(key)
+    return [word or "" for word in words]
+
+
+def build_index(nlp, path):
+    # L2-normalized float32 copy of the vectors table, written in chunks so it is never held twice in memory
+    vectors = nlp.vocab.vectors
+    if vectors.mode != "default":
+        raise ValueError(f"Nearest-neighbour search needs a default vectors table, not {vectors.mode!r}")
+    table = vectors.data
+    table = table.get() if hasattr(table, "get") else table
+    rows, dim = table.shape
+    os.makedirs(path, exist_ok=True)
+    matrix = np.memmap(os.path.join(path, VECTORS_FILE), dtype=np.float32, mode="w+", shape=(rows, dim))
+    for start in range(0, rows, BUILD_CHUNK_ROWS):
+        chunk = np.asarray(table[start:start + BUILD_CHUNK_ROWS], dtype=np.float32)
+        norms = np.linalg.norm(chunk, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        matrix[start:start + len(chunk)] = chunk / norms
+    matrix.flush()
+    del matrix
+    with open(os.path.join(path, WORDS_FILE), "w", encoding="utf-8") as f:
+        json.dump(_row_words(nlp), f)
+    # Written last, so a half-built index is rebuilt on the next run
+    with open(os.path.join(path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump({"rows": rows, "dim": dim}, f)
+
+
+def get_index(nlp, index_dir=INDEX_DIR):
+    # Builds the index for this pipeline version once, then memory-maps it
+    registry.ensure_vectors(nlp)
+    if nlp.vocab.vectors.size == 0:
+        raise ValueError(f"{nlp.meta['lang']}_{nlp.meta['name']} has no static vectors")
+    path = index_path(nlp, index_dir)
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if (manifest["rows"], manifest["dim"]) == tuple(nlp.vocab.vectors.shape):
+            return VectorNeighbors(path)
+    build_index(nlp, path)
+    return VectorNeighbors(path)
+
+
+class VectorNeighbors:
+    def __init__(self, path):
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+        with open(os.path.join(path, WORDS_FILE), encoding="utf-8") as f:
+            self.words = json.load(f)
+        self.matrix = np.memmap(os.path.join(path, VECTORS_FILE), dtype=np.float32, mode="r",
+                                shape=(manifest["rows"], manifest["dim"]))
+
+    def __len__(self):
+        return len(self.words)
+
+    def search(self, queries, top_k=10, exclude_rows=None, batch_size=QUERY_BATCH_SIZE):
+        # Cosine neighbours for each query vector: one matrix product per batch, then a partial sort.
+        # exclude_rows gives a row per query to leave out (the query word itself), or -1 for none.
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        queries = queries / norms
+        top_k = min(top_k, len(self))
+        results = []
+        for start in range(0, len(queries), batch_size):
+            scores = queries[start:start + batch_size] @ self.matrix.T
+            if exclude_rows is not None:
+                excluded = np.asarray(exclude_rows[start:start + batch_size])
+                hits = np.flatnonzero(excluded >= 0)
+                scores[hits, excluded[hits]] = -np.inf
+            candidates = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+            candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+            order = np.argsort(-candidate_scores, axis=1)
+            ranked = np.take_along_axis(candidates, order, axis=1)
+            ranked_scores = np.take_along_axis(candidate_scores, order, axis=1)
+            for rows, row_scores in zip(ranked, ranked_scores):
+                results.append([(self.words[row], float(score)) for row, score in zip(rows, row_scores)])
+        return results
+
+    def most_similar(self, nlp, terms, top_k=10):
+        # Synonym candidates for each term; terms without a vector get an empty list
+        vectors = nlp.vocab.vectors
+        rows = np.asarray(vectors.find(keys=list(terms)))
+        found = np.flatnonzero(rows >= 0)
+        results = [[] for _ in terms]
+        if len(found):
+            neighbours = self.search(self.matrix[rows[found]], top_k, exclude_rows=rows[found])
+            for i, neighbour in zip(found, neighbours):
+                results[i] = neighbour
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nearest vocabulary words by spaCy vector similarity.")
+    parser.add_argument("terms", nargs="+")
+    parser.add_argument("--model", default="en_core_web_md")
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    nlp = get_model(args.model, lazy_vectors=True)
+    index = get_index(nlp)
+    for term, neighbours in zip(args.terms, index.most_similar(nlp, args.terms, args.top_k)):
+        if not neighbours:
+            print(f"{term}: no vector")
+            continue
+        print(f"{term}: " + ", ".join(f"{word} ({score:.3f})" for word, score in neighbours))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import pytest
+
+from llm_agents import chunking
+from llm_agents.chunking import chunk_offsets, plan_chunks
+
+
+class CharEncoding:
+    # One token per character, so offsets are easy to reason about and no tiktoken download is needed
+    def encode(self, text, disallowed_special=()):
+        return [ord(char) for char in text]
+
+    def decode(self, tokens):
+        return "".join(chr(token) for token in tokens)
+
+    def decode_single_token_bytes(self, token):
+        return chr(token).encode("utf-8")
+
+
+@pytest.fixture
+def char_encoding(monkeypatch):
+    encoding = CharEncoding()
+    monkeypatch.setattr(chunking, "get_encoding", lambda model=None: encoding)
+    return encoding
+
+
+def test_chunks_cover_the_text_with_overlap(char_encoding):
+    tokens = char_encoding.encode("x" * 250)
+    offsets = chunk_offsets(char_encoding, tokens, chunk_tokens=100, overlap_tokens=10)
+    assert offsets == [(0, 100), (90, 190), (180, 250)]
+
+
+def test_overlap_is_capped_at_half_a_chunk(char_encoding):
+    tokens = char_encoding.encode("x" * 100)
+    offsets = chunk_offsets(char_encoding, tokens, chunk_tokens=40, overlap_tokens=35)
+    assert all(start == previous_end - 20 for (_, previous_end), (start, _) in zip(offsets, offsets[1:]))
+
+
+def test_chunk_ends_early_on_a_nearby_sentence_break(char_encoding):
+    # The break 5 tokens before the budget is within the 10% lookback; one 20 tokens back is not
+    near = "x" * 94 + "." + "y" * 105
+    assert chunk_offsets(char_encoding, char_encoding.encode(near), 100, 0)[0] == (0, 95)
+    far = "x" * 79 + "." + "y" * 120
+    assert chunk_offsets(char_encoding, char_encoding.encode(far), 100, 0)[0] == (0, 100)
+
+
+def test_plan_chunks_picks_stuff_for_short_text(char_encoding):
+    plan = plan_chunks("a short document.", "gpt-4o", chunk_tokens=10, overlap_tokens=0, stuff_max_tokens=100)
+    assert plan.method == "stuff"
+    assert plan.total_tokens == len("a short document.")
+    assert "".join(plan.chunks) == "a short document."
+    assert plan.chunk_tokens == [len(chunk) for chunk in plan.chunks]
+
+
+def test_plan_chunks_maps_long_text_and_respects_the_context_window(char_encoding):
+    text = "word " * 2000
+    plan = plan_chunks(text, "gpt-4", chunk_tokens=100000, overlap_tokens=0, stuff_max_tokens=1000)
+    assert plan.method == "map_reduce"
+    # gpt-4's 8192-token window minus the prompt and output reserves bounds every chunk
+    assert max(plan.chunk_tokens) <= 8192 - chunking.PROMPT_RESERVE_TOKENS - chunking.OUTPUT_RESERVE_TOKENS
+    assert "".join(plan.chunks) == text
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("llama_index.core")
+
+from llm_agents.crunchbase_index import CrunchbaseIndex
+
+
+class CountingEmbeddings:
+    # Stands in for EmbeddingService: a distinct random vector per call, and a record of what was embedded
+    def __init__(self):
+        self.embedded = []
+        self._random = np.random.default_rng(0)
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return self._random.random((len(texts), 4), dtype=np.float32)
+
+
+def _row(name, description, category="software"):
+    return {"permalink": f"/company/{name.lower()}", "name": name, "category": category,
+            "description": description}
+
+
+def _vectors_by_id(index):
+    return {index.document(row)["id"]: np.array(index.vectors[row]) for row in range(len(index))}
+
+
+def test_update_only_embeds_new_and_changed_rows(tmp_path):
+    embeddings = CountingEmbeddings()
+    index = CrunchbaseIndex(str(tmp_path / "index"), embeddings)
+    stats = index.update([[_row("Acme", "anvils"), _row("Globex", "software")], [_row("Initech", "printers")]],
+                         etag="v1")
+    assert stats == {"reused": 0, "embedded": 3, "duplicates": 0, "removed": 0}
+    before = _vectors_by_id(index)
+
+    embeddings.embedded.clear()
+    stats = index.update([[_row("Acme", "anvils"), _row("Globex", "cloud software"), _row("Hooli", "search")]],
+                         etag="v2")
+    assert stats == {"reused": 1, "embedded": 2, "duplicates": 0, "removed": 1}
+    assert len(embeddings.embedded) == 2 and all("Acme" not in text for text in embeddings.embedded)
+    after = _vectors_by_id(index)
+    np.testing.assert_array_equal(after["/company/acme"], before["/company/acme"])
+    assert "/company/initech" not in after
+
+    # The rebuilt index is what a later process loads from disk
+    reloaded = CrunchbaseIndex(str(tmp_path / "index"), embeddings)
+    assert (len(reloaded), reloaded.etag) == (3, "v2")
+    assert reloaded.document(2)["metadata"] == {"name": "Hooli", "category": "software"}
+
+
+def test_rows_with_a_repeated_id_are_kept(tmp_path):
+    index = CrunchbaseIndex(str(tmp_path / "index"), CountingEmbeddings())
+    rows = [_row("Acme", "anvils"), _row("Acme", "rockets"), _row("Acme", "traps")]
+    stats = index.update([rows[:2], rows[2:]])
+    assert stats["duplicates"] == 2
+    assert [index.document(row)["id"] for row in range(3)] == ["/company/acme", "/company/acme#2",
+                                                                "/company/acme#3"]
+    # Numbered ids are stable, so an unchanged export reuses every vector
+    assert index.update([rows])["reused"] == 3
@@ -0,0 +1,19 @@
+import asyncio
+
+import numpy as np
+
+from llm_agents.embedding_service import EmbeddingService, FakeEmbedder, text_key
+
+
+def test_embed_works_inside_a_running_loop(tmp_path):
+    embedder = FakeEmbedder(dim=8)
+    service = EmbeddingService(embedder, cache_dir=str(tmp_path))
+    # Served from the cache, so no batches are packed (packing needs the tokenizer)
+    expected = np.asarray([embedder.embed_text("Acme makes anvils")], dtype=np.float32)
+    service.cache.put([text_key(embedder.model, "Acme makes anvils")], expected)
+
+    async def sync_call_from_async_code():
+        return service.embed(["Acme makes anvils"])
+
+    np.testing.assert_array_equal(asyncio.run(sync_call_from_async_code()), expected)
+    np.testing.assert_array_equal(service.embed(["Acme makes anvils"]), expected)
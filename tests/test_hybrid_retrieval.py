@@ -0,0 +1,83 @@
+import math
+
+import numpy as np
+import pytest
+
+pytest.importorskip("llama_index.core")
+
+from llm_agents.hybrid_retrieval import B, K1, HybridRetriever, InvertedIndex, build_inverted_index, tokenize
+
+TEXTS = [
+    "Acme makes anvils",
+    "Globex makes software and more software",
+    "Initech builds software",
+]
+
+
+@pytest.fixture
+def bm25(tmp_path):
+    build_inverted_index(iter(TEXTS), str(tmp_path / "bm25"))
+    return InvertedIndex(str(tmp_path / "bm25"))
+
+
+def test_postings_hold_term_frequencies_and_lengths(bm25):
+    assert bm25.doc_count == 3
+    assert list(bm25.doc_lengths) == [3, 6, 3]
+    term = bm25.vocab["software"]
+    start, end = bm25.indptr[term], bm25.indptr[term + 1]
+    assert list(bm25.posting_docs[start:end]) == [1, 2]
+    assert list(bm25.posting_tfs[start:end]) == [2, 1]
+
+
+def test_bm25_scores_match_the_formula(bm25):
+    docs, scores = bm25.scores(["anvils"])
+    idf = math.log(1 + (3 - 1 + 0.5) / (1 + 0.5))
+    norm = K1 * (1 - B + B * 3 / 4)
+    assert list(docs) == [0]
+    assert scores[0] == pytest.approx(idf * (K1 + 1) / (1 + norm), rel=1e-6)
+
+
+def test_bm25_mask_and_unknown_terms(bm25):
+    docs, _ = bm25.scores(["software"], mask=np.array([True, False, True]))
+    assert list(docs) == [2]
+    docs, scores = bm25.scores(["unicorn"])
+    assert len(docs) == 0 and len(scores) == 0
+
+
+class FakeIndex:
+    # The parts of CrunchbaseIndex that HybridRetriever reads
+    def __init__(self, bm25, vectors, categories):
+        self.bm25 = bm25
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def category_mask(self, category):
+        if category not in self.categories:
+            return None
+        return np.asarray([value == category for value in self.categories])
+
+
+@pytest.fixture
+def index(bm25):
+    # Dense vectors point Acme at the query direction, the others away from it
+    return FakeIndex(bm25, [[0.0, 1.0], [1.0, 0.0], [0.7, 0.7]], ["tools", "software", "software"])
+
+
+def test_fusion_weights_lexical_and_dense_scores(index):
+    query, vector = tokenize("software"), [1.0, 0.0]
+    lexical = HybridRetriever(index, similarity_top_k=3, vector_weight=0.0).search_rows(" ".join(query), vector)
+    dense = HybridRetriever(index, similarity_top_k=3, vector_weight=1.0).search_rows("anvils", [0.0, 1.0])
+    assert lexical[0][0] == 1  # Most "software" occurrences
+    assert dense[0][0] == 0  # Closest vector, whatever the words
+    fused = HybridRetriever(index, similarity_top_k=3).search_rows("software", [1.0, 0.0])
+    # Globex is top on both lists, so it gets the full fused score
+    assert fused[0] == (1, pytest.approx(1.0))
+
+
+def test_category_filter_limits_both_rankings(index):
+    rows = HybridRetriever(index, similarity_top_k=3, category="software").search_rows("anvils", [0.0, 1.0])
+    assert {row for row, _ in rows} <= {1, 2}
+    assert HybridRetriever(index, category="unknown").search_rows("anvils", [0.0, 1.0]) == []
@@ -0,0 +1,100 @@
+import asyncio
+import socket
+import time
+
+import pytest
+
+from llm_agents.job_queue import JobQueue, LeaseLost, StageCheckpoint, renew_lease
+from llm_agents.langchain_comprehension import hold_lease
+
+
+def _take_over(queue, job):
+    # Expire the first worker's lease so a second worker claims the job
+    queue._conn.execute("UPDATE jobs SET lease_expires = 0 WHERE id = ?", (job.id,))
+    return queue.claim("other-host:1:0")
+
+
+def test_put_output_refused_after_lease_is_lost(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    queue.enqueue(["doc.pdf"])
+    job = queue.claim("other-host:1:1")
+    assert queue.put_output(job, "other-host:1:1", "extract", "text")
+    assert _take_over(queue, job) is not None
+
+    assert not queue.put_output(job, "other-host:1:1", "extract", "stale text")
+    assert queue.get_output(job.id, "extract") == "text"
+    with pytest.raises(LeaseLost):
+        StageCheckpoint(queue, job, "other-host:1:1").put("map", "prompt", "response")
+    assert queue.get_output(job.id, "map", StageCheckpoint._key("prompt")) is None
+
+
+def test_hold_lease_renews_and_cancels_when_lost(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.3)
+    queue.enqueue(["doc.pdf"])
+    job = queue.claim("other-host:1:1")
+
+    async def long_call():
+        await asyncio.sleep(0.5)
+        return "done"
+
+    # Longer than the lease, but the timer keeps renewing it
+    assert asyncio.run(hold_lease(queue, job, "other-host:1:1", long_call())) == "done"
+
+    _take_over(queue, job)
+    with pytest.raises(LeaseLost):
+        asyncio.run(hold_lease(queue, job, "other-host:1:1", long_call()))
+
+
+def test_claim_takes_due_jobs_in_order_once(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    assert queue.enqueue(["a.pdf", "b.pdf"]) == 2
+    assert queue.enqueue(["a.pdf", "c.pdf"]) == 1  # Sources already in the batch are left alone
+
+    claimed = [queue.claim(f"other-host:1:{i}") for i in range(4)]
+    assert [job.source for job in claimed[:3]] == ["a.pdf", "b.pdf", "c.pdf"]
+    assert claimed[3] is None  # Every job is leased to a live worker
+    assert claimed[0].attempts == 1 and claimed[0].stage is None
+    assert queue.counts() == {"pending": 0, "running": 3, "done": 0, "failed": 0}
+
+
+def test_failed_jobs_back_off_then_fail_for_good(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), max_attempts=2, retry_backoff=0.2)
+    queue.enqueue(["a.pdf"])
+    job = queue.claim("other-host:1:1")
+    assert queue.mark_stage(job, "other-host:1:1", "extract")
+    assert queue.fail(job, "other-host:1:1", "RuntimeError: boom")
+
+    # Not due again until the backoff has passed, and it resumes after its last completed stage
+    assert queue.claim("other-host:1:1") is None
+    assert 0 < queue.next_due() <= 0.2
+    time.sleep(0.25)
+    job = queue.claim("other-host:1:1")
+    assert (job.attempts, job.stage) == (2, "extract")
+
+    assert queue.fail(job, "other-host:1:1", "RuntimeError: boom again")
+    assert queue.jobs(status="failed")[0]["error"] == "RuntimeError: boom again"
+    assert queue.next_due() is None
+
+    assert queue.retry_failed() == 1
+    assert queue.claim("other-host:1:1").attempts == 1
+
+
+def test_expired_or_orphaned_leases_are_taken_over(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.2)
+    queue.enqueue(["a.pdf", "b.pdf"])
+    first = queue.claim("other-host:1:1")
+    # Same host, and no process has this pid, so the job is taken over without waiting for the lease
+    orphan = queue.claim(f"{socket.gethostname()}:999999999:0")
+    assert orphan.source == "b.pdf"
+    taken = queue.claim("other-host:2:0")
+    assert taken.source == "b.pdf" and taken.attempts == 2
+    assert queue.complete(taken, "other-host:2:0")
+
+    # Renewing keeps a lease alive; once it runs out, another worker gets the job
+    time.sleep(0.15)
+    assert renew_lease(queue.path, first, "other-host:1:1", queue.lease_seconds)
+    time.sleep(0.1)
+    assert queue.claim("other-host:3:0") is None
+    time.sleep(0.15)
+    assert queue.claim("other-host:3:0").source == "a.pdf"
+    assert not queue.complete(first, "other-host:1:1")
@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from llm_agents import llm_cache
+from llm_agents.llm_cache import ResponseCache, make_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(path=str(tmp_path / "responses.sqlite3"))
+
+
+def test_round_trip_and_hit_rate(cache):
+    key = make_key("gpt-4o", 0, [{"role": "user", "content": "hi"}])
+    assert cache.get(key) is None
+    cache.set(key, "hello")
+    assert cache.get(key) == "hello"
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 1}
+    # Any change to the request is a different entry
+    assert key != make_key("gpt-4o", 0, [{"role": "user", "content": "hi"}], {"max_tokens": 5})
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "EVICT_EVERY", 1)
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite3"), max_entries=2)
+    cache.set("a", "1")
+    time.sleep(0.01)
+    cache.set("b", "2")
+    time.sleep(0.01)
+    cache.get("a")  # "a" is now more recent than "b"
+    time.sleep(0.01)
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("1", "3")
+
+
+def test_expired_entries_are_dropped(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite3"), ttl_seconds=0.05)
+    cache.set("a", "1")
+    assert cache.get("a") == "1"
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_only_zero_temperature_is_cacheable_by_default(cache):
+    assert cache.cacheable(0)
+    assert not cache.cacheable(0.7)
+    assert not cache.cacheable(None)  # The provider default is not zero
+    assert ResponseCache(path=":memory:", zero_temperature_only=False).cacheable(0.7)
+
+
+def test_langchain_cache_keys_on_the_temperature_in_llm_string(cache):
+    pytest.importorskip("langchain_core")
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration
+
+    langchain_cache = llm_cache.LangChainCache(cache)
+    serialized = '{"lc": 1, "kwargs": {"model_name": "gpt-4o", "temperature": 0.0}}---[(\'stop\', None)]'
+    repr_style = "[('_type', 'openai-chat'), ('model', 'gpt-4o'), ('temperature', 0.0)]"
+    sampled = '{"lc": 1, "kwargs": {"model_name": "gpt-4o", "temperature": 0.7}}'
+
+    assert langchain_cache._key("prompt", serialized) is not None
+    assert langchain_cache._key("prompt", repr_style) is not None
+    assert langchain_cache._key("prompt", sampled) is None
+    assert langchain_cache._key("prompt", "[('_type', 'openai-chat')]") is None
+
+    generation = ChatGeneration(message=AIMessage(content="cached answer"))
+    langchain_cache.update("prompt", serialized, [generation])
+    assert langchain_cache.lookup("prompt", serialized)[0].message.content == "cached answer"
+    langchain_cache.update("prompt", sampled, [generation])
+    assert langchain_cache.lookup("prompt", sampled) is None
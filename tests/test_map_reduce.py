@@ -0,0 +1,37 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_agents.map_reduce import RateLimiter, hierarchical_reduce, map_reduce_summarize
+
+
+async def _never_called(prompt):
+    raise AssertionError("no LLM call expected for empty input")
+
+
+def test_hierarchical_reduce_empty_returns_without_calls():
+    result = asyncio.run(asyncio.wait_for(hierarchical_reduce(_never_called, [], "{text}"), timeout=5))
+    assert result == ""
+
+
+def test_map_reduce_summarize_empty_chunks():
+    result = asyncio.run(asyncio.wait_for(map_reduce_summarize(_never_called, [], "{text}", "{text}"), timeout=5))
+    assert result == ""
+
+
+def test_rate_limiter_shared_across_threads_does_not_overspend():
+    limiter = RateLimiter(requests_per_minute=1e9, tokens_per_minute=600)
+
+    def spend():
+        async def run():
+            await asyncio.wait_for(limiter.acquire(10), timeout=0.5)
+        try:
+            asyncio.run(run())
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    # A full bucket holds 600 tokens and refills at 10 per second, so while every thread waits at most
+    # half a second only about 60 calls of 10 tokens can be granted, however the threads interleave
+    with ThreadPoolExecutor(max_workers=100) as executor:
+        granted = sum(executor.map(lambda _: spend(), range(100)))
+    assert 60 <= granted <= 70
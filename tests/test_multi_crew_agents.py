@@ -0,0 +1,85 @@
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from llm_agents.multi_crew_agents import run_task_graph
+
+TASK_SECONDS = 0.2
+
+
+class FakeCrew:
+    # Mirrors what crewAI's Crew does with a task: read the outputs of its context tasks, then run it
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def __init__(self, agents, tasks, **kwargs):
+        self.tasks = tasks
+
+    def kickoff(self):
+        (task,) = self.tasks
+        context = [dependency.output for dependency in task.context or []]
+        assert all(output is not None for output in context), "context task has not finished"
+        with FakeCrew.lock:
+            FakeCrew.running += 1
+            FakeCrew.peak = max(FakeCrew.peak, FakeCrew.running)
+        time.sleep(TASK_SECONDS)
+        with FakeCrew.lock:
+            FakeCrew.running -= 1
+        task.received = context
+        task.output = f"{task.agent.role} report"
+        return task.output
+
+
+def _task(role, context=None):
+    return types.SimpleNamespace(agent=types.SimpleNamespace(role=role), context=context, output=None)
+
+
+@pytest.fixture
+def fake_crewai(monkeypatch):
+    module = types.ModuleType("crewai")
+    module.Crew = FakeCrew
+    module.Process = types.SimpleNamespace(sequential="sequential")
+    monkeypatch.setitem(sys.modules, "crewai", module)
+    FakeCrew.running = FakeCrew.peak = 0
+
+
+def test_analysts_overlap_and_synthesis_gets_their_outputs(fake_crewai):
+    analysts = [_task(f"analyst {i}") for i in range(5)]
+    synthesis = _task("strategist", context=analysts)
+
+    start = time.perf_counter()
+    timings = run_task_graph(analysts + [synthesis], max_workers=5)
+    elapsed = time.perf_counter() - start
+
+    assert FakeCrew.peak == 5
+    # Five overlapping analysts, then the synthesis: about two task lengths, not six
+    assert elapsed < 4 * TASK_SECONDS
+    assert synthesis.received == [f"analyst {i} report" for i in range(5)]
+    assert set(timings) == {f"analyst {i}" for i in range(5)} | {"strategist"}
+    assert all(seconds >= TASK_SECONDS for seconds in timings.values())
+
+
+def test_cycle_is_rejected(fake_crewai):
+    first = _task("first")
+    second = _task("second", context=[first])
+    first.context = [second]
+    with pytest.raises(ValueError):
+        run_task_graph([first, second])
+
+
+def test_graphs_sharing_an_executor_share_its_cap(fake_crewai):
+    graphs = []
+    for startup in range(3):
+        analysts = [_task(f"{startup} analyst {i}") for i in range(5)]
+        graphs.append(analysts + [_task(f"{startup} strategist", context=analysts)])
+
+    with ThreadPoolExecutor(max_workers=4) as task_executor, ThreadPoolExecutor(max_workers=3) as startups:
+        results = list(startups.map(lambda tasks: run_task_graph(tasks, executor=task_executor), graphs))
+
+    assert FakeCrew.peak == 4
+    assert all(len(timings) == 6 for timings in results)
@@ -0,0 +1,93 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("PyPDF2")
+
+from PyPDF2 import PdfWriter
+from PyPDF2.generic import ArrayObject, DecodedStreamObject, DictionaryObject, NameObject, NumberObject
+
+from llm_agents import pdf_extraction
+from llm_agents.pdf_extraction import extract_pdf_text, extract_pdf_text_async, page_fingerprints
+
+
+def _stream(writer, data, **entries):
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    stream.update({NameObject(key): value for key, value in entries.items()})
+    return writer._add_object(stream)
+
+
+def write_pdf(path, pages, form_text=None):
+    # One page per text, drawn with Helvetica; with form_text, the last page also draws a Form XObject
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    fonts = DictionaryObject({NameObject("/F1"): font})
+    for text in pages:
+        writer.add_blank_page(200, 200)
+        page = writer.pages[-1]
+        resources = DictionaryObject({NameObject("/Font"): fonts})
+        content = f"BT /F1 12 Tf 10 100 Td ({text}) Tj ET".encode()
+        if form_text is not None and text is pages[-1]:
+            form = _stream(writer, f"BT /F1 12 Tf 10 50 Td ({form_text}) Tj ET".encode(),
+                           **{"/Type": NameObject("/XObject"), "/Subtype": NameObject("/Form"),
+                              "/BBox": ArrayObject([NumberObject(0), NumberObject(0), NumberObject(200),
+                                                    NumberObject(200)]),
+                              "/Resources": DictionaryObject({NameObject("/Font"): fonts})})
+            resources[NameObject("/XObject")] = DictionaryObject({NameObject("/Fm0"): form})
+            content += b" /Fm0 Do"
+        page[NameObject("/Resources")] = resources
+        page[NameObject("/Contents")] = _stream(writer, content)
+    writer.write(str(path))
+    return str(path)
+
+
+def test_second_extraction_is_served_from_the_page_cache(tmp_path, monkeypatch):
+    pdf = write_pdf(tmp_path / "doc.pdf", ["first page", "second page"])
+    cache_dir = str(tmp_path / "pages")
+    text = extract_pdf_text(pdf, cache_dir=cache_dir)
+    assert "first page" in text and "second page" in text
+
+    def no_parsing(path, page_numbers):
+        raise AssertionError(f"pages {page_numbers} were parsed again")
+
+    monkeypatch.setattr(pdf_extraction, "extract_pages", no_parsing)
+    assert extract_pdf_text(pdf, cache_dir=cache_dir) == text
+
+
+def test_only_changed_pages_are_parsed_again(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "pages")
+    extract_pdf_text(write_pdf(tmp_path / "v1.pdf", ["first page", "second page"]), cache_dir=cache_dir)
+    edited = write_pdf(tmp_path / "v2.pdf", ["first page", "edited page"])
+
+    parsed = []
+    original = pdf_extraction.extract_pages
+
+    def recording(path, page_numbers):
+        parsed.extend(page_numbers)
+        return original(path, page_numbers)
+
+    monkeypatch.setattr(pdf_extraction, "extract_pages", recording)
+    assert "edited page" in extract_pdf_text(edited, cache_dir=cache_dir)
+    assert parsed == [1]
+
+
+def test_fingerprint_includes_form_xobjects(tmp_path):
+    hello = page_fingerprints(write_pdf(tmp_path / "a.pdf", ["page"], form_text="hello"))
+    world = page_fingerprints(write_pdf(tmp_path / "b.pdf", ["page"], form_text="world"))
+    assert hello != world
+
+
+def test_async_extraction_matches_and_fills_the_same_cache(tmp_path):
+    pdf = write_pdf(tmp_path / "doc.pdf", [f"page {i}" for i in range(5)])
+    cache_dir = str(tmp_path / "pages")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        text = asyncio.run(extract_pdf_text_async(pdf, executor, cache_dir=cache_dir, pages_per_task=2))
+    assert text == extract_pdf_text(pdf, cache_dir=str(tmp_path / "other"))
+    keys = page_fingerprints(pdf)
+    assert pdf_extraction._read_cached_pages(keys, cache_dir) == text.split("\n")
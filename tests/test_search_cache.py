@@ -0,0 +1,20 @@
+from llm_agents.search_cache import LOCK_STRIPES, NO_RESULT, _lock_for, cacheable_result, normalize_query
+
+
+def test_empty_and_no_result_answers_are_not_cached():
+    assert not cacheable_result("")
+    assert not cacheable_result("  \n")
+    assert not cacheable_result(NO_RESULT)
+    assert cacheable_result("Acme makes anvils.")
+
+
+def test_locks_are_striped():
+    locks = {id(_lock_for(f"duckduckgo:query {i}")) for i in range(10 * LOCK_STRIPES)}
+    assert len(locks) <= LOCK_STRIPES
+    assert _lock_for("duckduckgo:acme") is _lock_for("duckduckgo:acme")
+
+
+def test_normalize_query_keeps_word_order():
+    assert normalize_query("  Acme, Inc.  funding? ") == normalize_query("acme inc funding")
+    assert normalize_query("python to java migration") != normalize_query("java to python migration")
+    assert normalize_query("X acquires Y") != normalize_query("Y acquires X")
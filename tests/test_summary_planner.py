@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from llm_agents import chunking
+from llm_agents.chunking import ChunkPlan
+from llm_agents.map_reduce import gather_or_cancel
+from llm_agents.summary_planner import BudgetExceeded, summarize
+
+
+async def _never_called(prompt):
+    raise AssertionError("no LLM call expected for empty text")
+
+
+@pytest.mark.parametrize("strategy", ["stuff", "map_reduce", "both", "auto"])
+def test_summarize_empty_text_returns_without_calls(strategy):
+    result = asyncio.run(asyncio.wait_for(summarize(_never_called, "  \n", "src", "gpt-4o", strategy), timeout=5))
+    assert result.stopped == "the document has no text"
+    assert result.stuff_summary is None and result.map_reduce_summary is None
+
+
+def test_gather_or_cancel_cancels_sibling_on_budget_exceeded():
+    finished = []
+
+    async def over_budget():
+        raise BudgetExceeded("budget reached")
+
+    async def slow_branch():
+        await asyncio.sleep(10)
+        finished.append(True)
+
+    async def run():
+        sibling = asyncio.ensure_future(slow_branch())
+        with pytest.raises(BudgetExceeded):
+            await gather_or_cancel(over_budget(), sibling)
+        return sibling
+
+    sibling = asyncio.run(asyncio.wait_for(run(), timeout=5))
+    assert sibling.cancelled()
+    assert not finished
+
+
+class CharEncoding:
+    # One token per character, so no tiktoken download is needed
+    def encode(self, text, disallowed_special=()):
+        return list(text)
+
+
+class DictCheckpoint:
+    def __init__(self):
+        self.saved = {}
+
+    def get(self, stage, prompt):
+        return self.saved.get((stage, prompt))
+
+    def put(self, stage, prompt, response):
+        self.saved[(stage, prompt)] = response
+
+
+class CountingLimiter:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.acquired = 0
+
+    async def acquire(self, tokens):
+        if self.fail:
+            raise AssertionError("a checkpointed call asked the rate limiter for tokens")
+        self.acquired += 1
+
+
+@pytest.mark.parametrize("strategy", ["stuff", "both"])
+def test_checkpointed_calls_skip_the_rate_limiter(monkeypatch, strategy):
+    # One token per character; stuff, map, reduce and compare all resume without touching the limiter
+    monkeypatch.setattr(chunking, "get_encoding", lambda model=None: CharEncoding())
+    text = "alpha. beta. gamma."
+    plan = ChunkPlan("stuff", ["alpha.", "beta.", "gamma."], [6, 5, 6], len(text))
+    checkpoint = DictCheckpoint()
+
+    async def complete(prompt):
+        return f"summary {len(prompt)}"
+
+    async def never_called(prompt):
+        raise AssertionError("a checkpointed prompt reached the model")
+
+    def run(call, limiter):
+        return asyncio.run(asyncio.wait_for(
+            summarize(call, text, "src", "gpt-4o", strategy, compare_sample_rate=1.0, limiter=limiter, plan=plan,
+                      checkpoint=checkpoint),
+            timeout=5,
+        ))
+
+    first_limiter = CountingLimiter()
+    first = run(complete, first_limiter)
+    assert first_limiter.acquired == len(checkpoint.saved) > 0
+    resumed = run(never_called, CountingLimiter(fail=True))
+    assert (resumed.stuff_summary, resumed.map_reduce_summary) == (first.stuff_summary, first.map_reduce_summary)
+    assert sum(stats.resumed for stats in resumed.tracker.stages.values()) == len(checkpoint.saved)